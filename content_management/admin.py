@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Subject, Lesson, Topic, BaseContent, VideoContent, DynamicContent, RevisionContent
+from .models import Subject, Lesson, Topic, BaseContent, VideoContent, DynamicContent, RevisionContent, CurriculumSnapshot, UploadSession, MediaBlob
 
 # Registering models with default admin interface
 admin.site.register(Subject)
@@ -9,3 +9,6 @@ admin.site.register(BaseContent)
 admin.site.register(VideoContent)
 admin.site.register(DynamicContent)
 admin.site.register(RevisionContent)
+admin.site.register(CurriculumSnapshot)
+admin.site.register(UploadSession)
+admin.site.register(MediaBlob)
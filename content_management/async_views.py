@@ -0,0 +1,107 @@
+# content_management/async_views.py
+#
+# Async versions of the hot list endpoints, mounted under cms/async/. They
+# answer with the same bodies, ETags and cursors as the DRF views, through
+# the async ORM and the async side of the content cache, so one ASGI worker
+# can keep many slow connections open without a thread for each.
+from django.utils.cache import get_conditional_response
+from rest_framework.settings import api_settings
+
+from users.tokens import aget_student_claims
+from utils.async_views import AsyncAPIView
+
+from .cache import content_cache
+from .conditional import list_etag, patch_validator_headers, validator_aggregates, validators_from_aggregates
+from .models import BaseContent, Lesson, RevisionContent, Subject
+from .pagination import LessonPagination
+from .serializers import ContentListSerializer, LessonSerializer, RevisionContentSerializer, SubjectSerializer
+
+
+class AsyncCachedListView(AsyncAPIView):
+    serializer_class = None
+    pagination_class = api_settings.DEFAULT_PAGINATION_CLASS
+    cache_scope = None
+    validator_fields = ('updated_at',)
+
+    async def get_cache_scope_id(self):
+        raise NotImplementedError("AsyncCachedListView subclasses must define get_cache_scope_id()")
+
+    async def get_queryset(self):
+        raise NotImplementedError("AsyncCachedListView subclasses must define get_queryset()")
+
+    async def get_list_validators(self):
+        queryset = (await self.get_queryset()).order_by()
+        aggregates = await queryset.aaggregate(**validator_aggregates(self.validator_fields))
+        return validators_from_aggregates(aggregates, self.validator_fields)
+
+    async def get_page_data(self):
+        queryset = await self.get_queryset()
+        paginator = self.pagination_class()
+        paginator.prepare(self.request, queryset.model)
+        rows = paginator.paginate_rows([row async for row in paginator.get_page_queryset(queryset)])
+        data = self.serializer_class(rows, many=True).data
+        return paginator.get_paginated_response(data).data
+
+    async def respond(self, request, *args, **kwargs):
+        scope_id = await self.get_cache_scope_id()
+        count, last_modified = await content_cache.aget_or_set(
+            self.cache_scope, scope_id, ('validators', request.path), self.get_list_validators
+        )
+        etag, timestamp = list_etag(request.get_full_path(), count, last_modified)
+
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            data = await content_cache.aget_or_set(
+                self.cache_scope, scope_id, request.build_absolute_uri(), self.get_page_data
+            )
+            response = self.render(data)
+        return patch_validator_headers(response, etag, timestamp)
+
+
+class AsyncSubjectListView(AsyncCachedListView):
+    serializer_class = SubjectSerializer
+    cache_scope = 'year'
+
+    async def get_cache_scope_id(self):
+        return (await aget_student_claims(self.request))['academic_year']
+
+    async def get_queryset(self):
+        academic_year = await self.get_cache_scope_id()
+        return Subject.objects.filter(academic_year=academic_year, is_active=True)
+
+
+class AsyncLessonListView(AsyncCachedListView):
+    serializer_class = LessonSerializer
+    pagination_class = LessonPagination
+    cache_scope = 'subject'
+
+    async def get_cache_scope_id(self):
+        return self.kwargs['subject_id']
+
+    async def get_queryset(self):
+        return Lesson.objects.filter(subject_id=self.kwargs['subject_id'], is_active=True).order_by('order')
+
+
+class AsyncLessonContentView(AsyncCachedListView):
+    serializer_class = ContentListSerializer
+    cache_scope = 'lesson'
+
+    async def get_cache_scope_id(self):
+        return self.kwargs['lesson_id']
+
+    async def get_queryset(self):
+        return BaseContent.objects.filter(lesson_id=self.kwargs['lesson_id']).select_related(
+            'video_content', 'dynamic_content'
+        )
+
+
+class AsyncRevisionContentView(AsyncCachedListView):
+    serializer_class = RevisionContentSerializer
+    cache_scope = 'topic'
+    validator_fields = ('updated_at', 'topic__updated_at')
+
+    async def get_cache_scope_id(self):
+        return self.kwargs['topic_id']
+
+    async def get_queryset(self):
+        return RevisionContent.objects.filter(topic_id=self.kwargs['topic_id']).select_related('topic')
@@ -0,0 +1,222 @@
+# content_management/bulk.py
+#
+# Batch create/upsert for subjects, lessons and topics. A batch is validated
+# as a whole and written with one bulk_create and one bulk_update in a single
+# transaction, so either every item is saved or none is. Bulk writes send no
+# model signals; the cache scopes and snapshots the handlers in signals.py
+# would have touched are invalidated here instead, once per batch.
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from . import feeds, search, snapshots
+from .models import Lesson, SearchKind, Subject, Topic
+from .serializers import (
+    LessonBulkSerializer, LessonSerializer, SubjectBulkSerializer, SubjectSerializer,
+    TopicBulkSerializer, TopicSerializer,
+)
+from .signals import bump_scopes
+
+CREATED = 'created'
+UPDATED = 'updated'
+
+
+class BulkWriter:
+    model = None
+    serializer_class = None
+    result_serializer_class = None
+    # Fields an item is matched to an existing row on
+    key_fields = ()
+    # Stored values kept before an update, so the scope a row moved out of
+    # is invalidated too (as _remember_previous does for single saves)
+    tracked_fields = ()
+
+    def key(self, values):
+        return tuple(values[field] for field in self.key_fields)
+
+    def describe_key(self, key):
+        return ', '.join(f'{field}={value}' for field, value in zip(self.key_fields, key))
+
+    def find_existing(self, keys):
+        raise NotImplementedError("BulkWriter subclasses must define find_existing()")
+
+    def check_references(self, items, errors):
+        pass
+
+    def invalidate(self, created, updated, previous):
+        raise NotImplementedError("BulkWriter subclasses must define invalidate()")
+
+    def validate(self, data):
+        if not isinstance(data, list):
+            raise ValidationError({'non_field_errors': ['Expected a list of items.']})
+        if not data:
+            raise ValidationError({'non_field_errors': ['The list is empty.']})
+        if len(data) > settings.CMS_BULK_MAX_ITEMS:
+            raise ValidationError({'non_field_errors': [
+                f'At most {settings.CMS_BULK_MAX_ITEMS} items can be sent at once.'
+            ]})
+
+        serializer = self.serializer_class(data=data, many=True)
+        if not serializer.is_valid():
+            raise ValidationError(serializer.errors)
+        items = serializer.validated_data
+
+        errors = [{} for _ in items]
+        first_index = {}
+        for index, values in enumerate(items):
+            key = self.key(values)
+            if key in first_index:
+                errors[index] = {'non_field_errors': [
+                    f'Duplicates item {first_index[key]} ({self.describe_key(key)}).'
+                ]}
+            first_index.setdefault(key, index)
+        self.check_references(items, errors)
+        if any(errors):
+            raise ValidationError(errors)
+        return items
+
+    def save(self, data, upsert):
+        # Returns one {status, data} result per item, in request order
+        items = self.validate(data)
+        with transaction.atomic():
+            existing = {}
+            for row in self.find_existing({self.key(values) for values in items}):
+                existing.setdefault(self.key(row.__dict__), []).append(row)
+
+            errors = [{} for _ in items]
+            for index, values in enumerate(items):
+                matches = existing.get(self.key(values), [])
+                if len(matches) > 1:
+                    errors[index] = {'non_field_errors': [
+                        f'{len(matches)} existing rows match {self.describe_key(self.key(values))}; '
+                        f'update them one at a time.'
+                    ]}
+                elif matches and not upsert:
+                    errors[index] = {'non_field_errors': [
+                        f'A row with {self.describe_key(self.key(values))} already exists.'
+                    ]}
+            if any(errors):
+                raise ValidationError(errors)
+
+            now = timezone.now()
+            created, updated, previous, statuses = [], [], {}, []
+            update_fields = {'updated_at'}
+            for values in items:
+                matches = existing.get(self.key(values))
+                if matches:
+                    instance = matches[0]
+                    previous[instance.pk] = {field: getattr(instance, field) for field in self.tracked_fields}
+                    for field, value in values.items():
+                        setattr(instance, field, value)
+                    # bulk_update bypasses auto_now
+                    instance.updated_at = now
+                    update_fields.update(values)
+                    updated.append(instance)
+                    statuses.append((UPDATED, instance))
+                else:
+                    instance = self.model(**values)
+                    created.append(instance)
+                    statuses.append((CREATED, instance))
+
+            self.model.objects.bulk_create(created)
+            if updated:
+                self.model.objects.bulk_update(updated, sorted(update_fields))
+            self.invalidate(created, updated, previous)
+
+        return [
+            {'status': status, 'data': self.result_serializer_class(instance).data}
+            for status, instance in statuses
+        ]
+
+
+class SubjectChildWriter(BulkWriter):
+    # Lessons and topics: the subject is sent as a bare id and every id in the
+    # batch is checked with one query. The subject is part of the key, so an
+    # update never moves a row to another subject.
+
+    def check_references(self, items, errors):
+        subject_ids = {values['subject_id'] for values in items}
+        found = set(Subject.objects.filter(pk__in=subject_ids).values_list('pk', flat=True))
+        for index, values in enumerate(items):
+            if values['subject_id'] not in found:
+                errors[index].setdefault('subject', []).append(
+                    f'Invalid pk "{values["subject_id"]}" - object does not exist.'
+                )
+
+    def find_existing(self, keys):
+        subject_ids = {key[0] for key in keys}
+        rows = self.model.objects.select_for_update().filter(subject_id__in=subject_ids, **{
+            f'{self.key_fields[1]}__in': {key[1] for key in keys}
+        })
+        return [row for row in rows if self.key(row.__dict__) in keys]
+
+    def invalidate(self, created, updated, previous):
+        subject_ids = {instance.subject_id for instance in created + updated}
+        self.bump(created, updated)
+        # One rebuild per subject instead of a patch per row
+        for subject_id in subject_ids:
+            snapshots.schedule(snapshots.rebuild_subject, subject_id)
+        search.schedule(search.reindex, self.search_kind, [instance.pk for instance in created + updated])
+
+    def bump(self, created, updated):
+        raise NotImplementedError("SubjectChildWriter subclasses must define bump()")
+
+
+class SubjectWriter(BulkWriter):
+    model = Subject
+    serializer_class = SubjectBulkSerializer
+    result_serializer_class = SubjectSerializer
+    key_fields = ('code',)
+    tracked_fields = ('academic_year',)
+
+    def find_existing(self, keys):
+        return Subject.objects.select_for_update().filter(code__in=[key[0] for key in keys])
+
+    def invalidate(self, created, updated, previous):
+        bump_scopes(*(
+            ('year', year)
+            for instance in created + updated
+            for year in (instance.academic_year, previous.get(instance.pk, {}).get('academic_year'))
+        ), *(('topics', instance.pk) for instance in updated))
+        for instance in created + updated:
+            snapshots.schedule(snapshots.refresh_subject_fields, instance.pk)
+        search.schedule(search.reindex, SearchKind.SUBJECT, [instance.pk for instance in created])
+        for instance in updated:
+            search.schedule(search.reindex_subject, instance.pk)
+            snapshots.schedule(feeds.refresh_subject, instance.pk)
+
+
+class LessonWriter(SubjectChildWriter):
+    model = Lesson
+    serializer_class = LessonBulkSerializer
+    result_serializer_class = LessonSerializer
+    key_fields = ('subject_id', 'order')
+    tracked_fields = ('is_active',)
+    search_kind = SearchKind.LESSON
+
+    def invalidate(self, created, updated, previous):
+        super().invalidate(created, updated, previous)
+        # The feeds of a lesson shown or hidden; new lessons build theirs on first read
+        for instance in updated:
+            if previous[instance.pk]['is_active'] != instance.is_active:
+                snapshots.schedule(feeds.rebuild_lesson, instance.pk)
+
+    def bump(self, created, updated):
+        bump_scopes(*(('subject', instance.subject_id) for instance in created + updated))
+
+
+class TopicWriter(SubjectChildWriter):
+    model = Topic
+    serializer_class = TopicBulkSerializer
+    result_serializer_class = TopicSerializer
+    # Topics have no order; a topic's name is unique enough within a subject
+    key_fields = ('subject_id', 'name')
+    search_kind = SearchKind.TOPIC
+
+    def bump(self, created, updated):
+        # Revision content embeds its topic; new topics have nothing cached yet
+        bump_scopes(
+            *(('topic', instance.pk) for instance in updated),
+            *(('topics', instance.subject_id) for instance in created + updated),
+        )
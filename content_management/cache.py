@@ -0,0 +1,160 @@
+# content_management/cache.py
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.response import Response
+
+from utils.async_views import acache_call
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe, size-bounded LRU that lives inside a single process."""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TwoTierCache:
+    """
+    Per-process LRU in front of the shared Django cache.
+
+    Every entry belongs to a scope (e.g. ``("subject", <subject_id>)``) whose
+    version number lives in the shared cache. Data keys embed that version, so
+    bumping it invalidates the scope in every process at once without having
+    to find and delete the individual entries. A builder that returns None
+    (nothing found) is not cached, so the row can be created later.
+    """
+
+    def __init__(self, alias='default', prefix='cms', local_maxsize=1024, shared_timeout=None):
+        self.alias = alias
+        self.prefix = prefix
+        self.shared_timeout = shared_timeout
+        self.local = LRUCache(local_maxsize)
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def _version_key(self, scope, ident):
+        return f"{self.prefix}:v:{scope}:{quote(str(ident))}"
+
+    def _data_key(self, scope, ident, version, key):
+        digest = hashlib.md5(str(key).encode()).hexdigest()
+        return f"{self.prefix}:{scope}:{quote(str(ident))}:{version}:{digest}"
+
+    def get_version(self, scope, ident):
+        version_key = self._version_key(scope, ident)
+        version = self.shared.get(version_key)
+        if version is None:
+            # Seed with the clock rather than 1 so that a version key evicted
+            # from the shared cache can never resurrect entries from before
+            # the eviction.
+            self.shared.add(version_key, time.time_ns(), timeout=None)
+            version = self.shared.get(version_key)
+        return version
+
+    def bump(self, scope, ident):
+        version_key = self._version_key(scope, ident)
+        try:
+            self.shared.incr(version_key)
+        except ValueError:
+            self.shared.set(version_key, time.time_ns(), timeout=None)
+
+    def get_or_set(self, scope, ident, key, builder):
+        data_key = self._data_key(scope, ident, self.get_version(scope, ident), key)
+        value = self.local.get(data_key, _MISSING)
+        if value is not _MISSING:
+            return value
+        value = self.shared.get(data_key, _MISSING)
+        if value is _MISSING:
+            value = builder()
+            if value is None:
+                return None
+            self.shared.set(data_key, value, timeout=self.shared_timeout)
+        self.local.set(data_key, value)
+        return value
+
+    # Async counterparts for the async views; the local LRU is only a dict
+    # lookup and is used as is
+
+    async def aget_version(self, scope, ident):
+        version_key = self._version_key(scope, ident)
+        version = await acache_call(self.shared, 'get', version_key)
+        if version is None:
+            await acache_call(self.shared, 'add', version_key, time.time_ns(), timeout=None)
+            version = await acache_call(self.shared, 'get', version_key)
+        return version
+
+    async def aget_or_set(self, scope, ident, key, builder):
+        # builder is a coroutine function
+        data_key = self._data_key(scope, ident, await self.aget_version(scope, ident), key)
+        value = self.local.get(data_key, _MISSING)
+        if value is not _MISSING:
+            return value
+        value = await acache_call(self.shared, 'get', data_key, _MISSING)
+        if value is _MISSING:
+            value = await builder()
+            if value is None:
+                return None
+            await acache_call(self.shared, 'set', data_key, value, timeout=self.shared_timeout)
+        self.local.set(data_key, value)
+        return value
+
+    def clear_local(self):
+        self.local.clear()
+
+
+content_cache = TwoTierCache(
+    alias=getattr(settings, 'CMS_CACHE_ALIAS', 'default'),
+    local_maxsize=getattr(settings, 'CMS_CACHE_LOCAL_MAXSIZE', 1024),
+    shared_timeout=getattr(settings, 'CMS_CACHE_SHARED_TIMEOUT', 60 * 60),
+)
+
+
+# Caches the response body of a list view under a versioned scope
+class CachedListMixin:
+    cache_scope = None
+
+    def get_cache_scope_id(self):
+        raise NotImplementedError("CachedListMixin views must define get_cache_scope_id()")
+
+    def list(self, request, *args, **kwargs):
+        # The absolute URI covers the query string and any host-dependent links
+        data = content_cache.get_or_set(
+            self.cache_scope,
+            self.get_cache_scope_id(),
+            request.build_absolute_uri(),
+            lambda: super(CachedListMixin, self).list(request, *args, **kwargs).data,
+        )
+        return Response(data)
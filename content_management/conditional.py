@@ -0,0 +1,67 @@
+# content_management/conditional.py
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from .cache import content_cache
+
+
+def validator_aggregates(fields):
+    return {
+        'count': Count('pk'),
+        **{f'max_{index}': Max(field) for index, field in enumerate(fields)},
+    }
+
+
+def validators_from_aggregates(aggregates, fields):
+    stamps = [
+        aggregates[f'max_{index}'] for index in range(len(fields))
+        if aggregates[f'max_{index}'] is not None
+    ]
+    return aggregates['count'], max(stamps) if stamps else None
+
+
+def list_etag(path, count, last_modified):
+    # Returns the ETag and the Last-Modified timestamp for a list response
+    stamp = last_modified.isoformat() if last_modified else ''
+    etag = quote_etag(hashlib.md5(f'{path}|{count}|{stamp}'.encode()).hexdigest())
+    return etag, int(last_modified.timestamp()) if last_modified else None
+
+
+def patch_validator_headers(response, etag, timestamp):
+    response['ETag'] = etag
+    if timestamp is not None:
+        response['Last-Modified'] = http_date(timestamp)
+    # Let clients keep the body but always come back to revalidate it
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ('Authorization',))
+    return response
+
+
+# Answers If-None-Match / If-Modified-Since on list views with a 304.
+# The validators are MAX(updated_at) and COUNT(*) over the filtered rows; they
+# are kept in the content cache under the view's scope, so a repeat visit to
+# an unchanged list is answered without touching the database.
+class ConditionalListMixin:
+    validator_fields = ('updated_at',)
+
+    def get_list_validators(self):
+        queryset = self.filter_queryset(self.get_queryset()).order_by()
+        aggregates = queryset.aggregate(**validator_aggregates(self.validator_fields))
+        return validators_from_aggregates(aggregates, self.validator_fields)
+
+    def list(self, request, *args, **kwargs):
+        count, last_modified = content_cache.get_or_set(
+            self.cache_scope,
+            self.get_cache_scope_id(),
+            ('validators', request.path),
+            self.get_list_validators,
+        )
+        etag, timestamp = list_etag(request.get_full_path(), count, last_modified)
+
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+        return patch_validator_headers(response, etag, timestamp)
@@ -0,0 +1,101 @@
+# content_management/feeds.py
+#
+# Lesson content filtered and ordered for one learning type. Each lesson has
+# a LessonFeed row per learning type, all four built from one query when the
+# lesson's content changes, so serving a student's feed is a single-row read
+# (or a cache hit) with no filtering on the request path.
+from django.db import transaction
+
+from .cache import content_cache
+from .models import BaseContent, LearningType, Lesson, LessonFeed, Subject
+from .serializers import ContentListSerializer
+
+# The types a learner is served, best first, when the lesson has nothing in
+# their own type
+FALLBACK_ORDER = {
+    LearningType.VISUAL: [
+        LearningType.VISUAL, LearningType.KINESTHETIC, LearningType.READING_WRITING, LearningType.AUDITORY,
+    ],
+    LearningType.AUDITORY: [
+        LearningType.AUDITORY, LearningType.READING_WRITING, LearningType.VISUAL, LearningType.KINESTHETIC,
+    ],
+    LearningType.KINESTHETIC: [
+        LearningType.KINESTHETIC, LearningType.VISUAL, LearningType.AUDITORY, LearningType.READING_WRITING,
+    ],
+    LearningType.READING_WRITING: [
+        LearningType.READING_WRITING, LearningType.AUDITORY, LearningType.VISUAL, LearningType.KINESTHETIC,
+    ],
+}
+
+
+def select_items(contents, learning_type):
+    # Returns (served type, items) for the first type in the fallback order
+    # the lesson has content in
+    for candidate in FALLBACK_ORDER[learning_type]:
+        items = [content for content in contents if content.learning_type == candidate]
+        if items:
+            return candidate, items
+    return None, []
+
+
+def rebuild_lesson(lesson_id):
+    lesson = Lesson.objects.filter(pk=lesson_id).values_list(
+        'subject__academic_year', 'subject__is_active', 'is_active',
+    ).first()
+    if lesson is None:
+        content_cache.bump('feed', lesson_id)
+        return None
+    academic_year, subject_active, lesson_active = lesson
+    is_active = subject_active and lesson_active
+    contents = list(
+        BaseContent.objects.filter(lesson_id=lesson_id).select_related('video_content', 'dynamic_content')
+        .order_by('created_at', 'id')
+    )
+    serialized = dict(zip((content.pk for content in contents), ContentListSerializer(contents, many=True).data))
+
+    feeds = []
+    for learning_type in LearningType.values:
+        served_type, items = select_items(contents, learning_type)
+        feeds.append(LessonFeed(
+            lesson_id=lesson_id, learning_type=learning_type, served_type=served_type,
+            items=[serialized[content.pk] for content in items],
+            academic_year=academic_year, is_active=is_active,
+        ))
+    LessonFeed.objects.bulk_create(
+        feeds, update_conflicts=True, unique_fields=['lesson', 'learning_type'],
+        update_fields=['served_type', 'items', 'academic_year', 'is_active', 'updated_at'],
+    )
+    transaction.on_commit(lambda: content_cache.bump('feed', lesson_id))
+    return {feed.learning_type: feed for feed in feeds}
+
+
+def refresh_subject(subject_id):
+    # Copies a subject's year and active flag onto its lessons' feeds
+    subject = Subject.objects.filter(pk=subject_id).values('academic_year', 'is_active').first()
+    if subject is None:
+        return  # its lessons went with it
+    lesson_ids = list(Lesson.objects.filter(subject_id=subject_id).values_list('pk', flat=True))
+    lesson_feeds = LessonFeed.objects.filter(lesson_id__in=lesson_ids)
+    lesson_feeds.filter(lesson__is_active=True).update(**subject)
+    # Hidden lessons stay hidden whatever the subject does
+    lesson_feeds.filter(lesson__is_active=False).update(academic_year=subject['academic_year'], is_active=False)
+    transaction.on_commit(lambda: [content_cache.bump('feed', lesson_id) for lesson_id in lesson_ids])
+
+
+def get_feed(lesson_id, learning_type):
+    feed = LessonFeed.objects.filter(lesson_id=lesson_id, learning_type=learning_type).first()
+    if feed is None:
+        # Lessons from before feeds existed are built on first read
+        feeds = rebuild_lesson(lesson_id)
+        if feeds is None:
+            return None
+        feed = feeds[learning_type]
+    return {
+        'served_type': feed.served_type, 'items': feed.items,
+        'academic_year': feed.academic_year, 'is_active': feed.is_active,
+    }
+
+
+def get_cached_feed(lesson_id, learning_type):
+    # Unknown lessons come back as None, which is not cached
+    return content_cache.get_or_set('feed', lesson_id, learning_type, lambda: get_feed(lesson_id, learning_type))
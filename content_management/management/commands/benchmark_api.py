@@ -0,0 +1,441 @@
+# content_management/management/commands/benchmark_api.py
+#
+# Requests every URL in content_management/urls.py and users/urls.py against
+# the data seed_data generates and reports latency percentiles, SQL queries
+# per request and throughput, optionally saved as JSON and compared with a
+# saved baseline (the command fails on a regression, for CI).
+#
+# Requests go through Django's test client in this process, one at a time,
+# so the numbers cover middleware, authentication, views and the database
+# but no network, and throughput is for a single client. Every request runs
+# in a transaction that is rolled back afterwards, with its set-up, so
+# writes can be repeated and the database is left as it was; on-commit work
+# (cache bumps, snapshot refreshes) is therefore not part of the timings.
+# Files go to a temporary MEDIA_ROOT and UPLOAD_SESSION_ROOT.
+import hashlib
+import io
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+import uuid
+import zipfile
+from collections import Counter, namedtuple
+from datetime import datetime, timezone as dt_timezone
+
+from django.contrib.auth.models import User
+from django.contrib.auth.tokens import default_token_generator
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import override_settings
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from rest_framework.test import APIClient
+
+from content_management import uploads
+from content_management.management.commands.benchmark_asgi import percentile
+from content_management.models import (
+    BaseContent, ContentType, LearningType, Lesson, RevisionContent, Subject, Topic, UploadKind, UploadSession,
+)
+from users.models import ImportStatus, RosterImportJob
+from users.tokens import StudentRefreshToken
+
+# The URL modules every url name of which must have a case below
+URL_MODULES = ('content_management.urls', 'users.urls')
+
+# auth is 'student', 'admin' or None; prepare is the name of a Command
+# method returning (reverse kwargs, client options) for one request
+Case = namedtuple('Case', 'url_name method auth expected prepare')
+
+CASES = (
+    # Content
+    Case('subject-list', 'GET', 'student', 200, 'no_arguments'),
+    Case('subject-create', 'POST', 'student', 201, 'subject_create'),
+    Case('subject-bulk', 'POST', 'student', 201, 'subject_bulk'),
+    Case('subject-tree', 'GET', 'student', 200, 'subject_kwargs'),
+    Case('search', 'GET', 'student', 200, 'search'),
+    Case('lesson-list', 'GET', 'student', 200, 'subject_kwargs'),
+    Case('lesson-create', 'POST', 'student', 201, 'lesson_create'),
+    Case('lesson-bulk', 'POST', 'student', 201, 'lesson_bulk'),
+    Case('topic-list', 'GET', 'student', 200, 'subject_kwargs'),
+    Case('topic-create', 'POST', 'student', 201, 'topic_create'),
+    Case('topic-bulk', 'POST', 'student', 201, 'topic_bulk'),
+    Case('lesson-content-list', 'GET', 'student', 200, 'lesson_kwargs'),
+    Case('lesson-feed', 'GET', 'student', 200, 'lesson_kwargs'),
+    Case('content-create', 'POST', 'student', 201, 'content_create'),
+    Case('content-package', 'POST', 'student', 201, 'content_package'),
+    Case('media-token', 'POST', 'student', 200, 'media_token'),
+    Case('revision-content-list', 'GET', 'student', 200, 'topic_kwargs'),
+    Case('revision-content-create', 'POST', 'student', 201, 'revision_content_create'),
+    Case('upload-create', 'POST', 'student', 201, 'upload_create'),
+    Case('upload-detail', 'GET', 'student', 200, 'upload_detail'),
+    Case('upload-detail', 'PUT', 'student', 200, 'upload_chunk'),
+    Case('upload-detail', 'DELETE', 'student', 204, 'upload_detail'),
+    Case('upload-complete', 'POST', 'student', 201, 'upload_complete'),
+    Case('async-subject-list', 'GET', 'student', 200, 'no_arguments'),
+    Case('async-lesson-list', 'GET', 'student', 200, 'subject_kwargs'),
+    Case('async-lesson-content-list', 'GET', 'student', 200, 'lesson_kwargs'),
+    Case('async-revision-content-list', 'GET', 'student', 200, 'topic_kwargs'),
+    # Users
+    Case('register', 'POST', None, 201, 'register'),
+    Case('login', 'POST', None, 200, 'login'),
+    Case('logout', 'POST', 'student', 205, 'refresh_token'),
+    Case('user-detail', 'GET', 'student', 200, 'no_arguments'),
+    Case('async-user-detail', 'GET', 'student', 200, 'no_arguments'),
+    Case('forgot-password', 'POST', None, 200, 'forgot_password'),
+    Case('reset-password-confirm', 'POST', None, 200, 'reset_password'),
+    Case('change-password', 'POST', 'student', 200, 'change_password'),
+    Case('token_refresh', 'POST', None, 200, 'refresh_token'),
+    Case('token_blacklist', 'POST', None, 200, 'refresh_token'),
+    Case('roster-import', 'POST', 'admin', 202, 'roster_import'),
+    Case('roster-import-status', 'GET', 'admin', 200, 'roster_import_status'),
+)
+
+UPLOAD_BODY = b'<html><body>benchmark</body></html>'
+
+
+def url_names():
+    names = set()
+    for module in URL_MODULES:
+        for pattern in get_resolver(module).url_patterns:
+            if isinstance(pattern, URLPattern) and pattern.name:
+                names.add(pattern.name)
+            elif isinstance(pattern, URLResolver):
+                names.update(name for name in pattern.reverse_dict if isinstance(name, str))
+    return names
+
+
+def case_name(case):
+    return f'{case.method} {case.url_name}'
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks every content and users endpoint against seed_data data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100, help='Timed requests per endpoint')
+        parser.add_argument('--warmup', type=int, default=5, help='Untimed requests per endpoint first')
+        parser.add_argument('--username', default='seed-student-000001', help='Student the requests act as')
+        parser.add_argument('--admin', default='seed-admin', help='Staff user for the admin endpoints')
+        parser.add_argument('--password', default='seed-password', help="The student's password")
+        parser.add_argument('--only', nargs='+', metavar='URL_NAME', help='Only these url names')
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument('--baseline', help='Compare with results saved by an earlier --output')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.25,
+            help='Allowed p95 slowdown against the baseline, as a fraction',
+        )
+        parser.add_argument(
+            '--min-slowdown-ms', type=float, default=2.0,
+            help='p95 slowdowns smaller than this are never regressions',
+        )
+
+    def handle(self, *args, **options):
+        missing = url_names() - {case.url_name for case in CASES}
+        if missing:
+            raise CommandError(f"No benchmark case for: {', '.join(sorted(missing))}")
+        cases = [case for case in CASES if not options['only'] or case.url_name in options['only']]
+        self.fixtures = self.load_fixtures(options)
+        self.client = APIClient(raise_request_exception=False)
+
+        scratch = tempfile.mkdtemp(prefix='benchmark-')
+        results = {}
+        try:
+            with override_settings(
+                MEDIA_ROOT=os.path.join(scratch, 'media'),
+                UPLOAD_SESSION_ROOT=os.path.join(scratch, 'upload_sessions'),
+            ):
+                self.stdout.write(
+                    f"{'endpoint':<36} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+                    f"{'queries':>7} {'errors':>6}"
+                )
+                for case in cases:
+                    result = self.run_case(case, options['requests'], options['warmup'])
+                    results[case_name(case)] = result
+                    self.stdout.write(
+                        f"{case_name(case):<36} {result['throughput']:>8.1f} {result['p50_ms']:>8.2f} "
+                        f"{result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f} {result['queries']:>7.1f} "
+                        f"{result['errors']:>6}"
+                    )
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+        report = {
+            'created_at': datetime.now(dt_timezone.utc).isoformat(),
+            'environment': {
+                'python': platform.python_version(), 'database': connection.vendor, 'machine': platform.machine(),
+            },
+            'requests': options['requests'],
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2, sort_keys=True)
+            self.stdout.write(f"Saved to {options['output']}")
+
+        failures = [f'{name}: {result["errors"]} unexpected response(s)' for name, result in results.items()
+                    if result['errors']]
+        if options['baseline']:
+            with open(options['baseline']) as baseline:
+                failures += self.compare(json.load(baseline)['results'], results, options)
+        if failures:
+            raise CommandError('Benchmark failed:\n  ' + '\n  '.join(failures))
+        self.stdout.write(self.style.SUCCESS('No regressions' if options['baseline'] else 'Done'))
+
+    def compare(self, baseline, results, options):
+        regressions = []
+        for name, result in results.items():
+            before = baseline.get(name)
+            if before is None:
+                continue
+            if result['queries'] > before['queries']:
+                regressions.append(f"{name}: {before['queries']:g} -> {result['queries']:g} queries per request")
+            slowdown = result['p95_ms'] - before['p95_ms']
+            if slowdown > options['min_slowdown_ms'] and slowdown > before['p95_ms'] * options['tolerance']:
+                regressions.append(f"{name}: p95 {before['p95_ms']:.2f} -> {result['p95_ms']:.2f} ms")
+        return regressions
+
+    def load_fixtures(self, options):
+        student = User.objects.filter(username=options['username']).select_related('student_profile').first()
+        admin = User.objects.filter(username=options['admin'], is_staff=True).first()
+        if student is None or not hasattr(student, 'student_profile') or admin is None:
+            raise CommandError('Seed the database first (manage.py seed_data), or pass --username and --admin.')
+        if not student.check_password(options['password']):
+            raise CommandError(f'--password is not the password of {student.username}.')
+
+        academic_year = student.student_profile.academic_year
+        lesson = Lesson.objects.filter(
+            subject__academic_year=academic_year, subject__is_active=True,
+            pk__in=BaseContent.objects.values('lesson_id'),
+        ).order_by('subject__code', 'order').first()
+        topic = Topic.objects.filter(
+            subject__academic_year=academic_year, pk__in=RevisionContent.objects.values('topic_id'),
+        ).order_by('subject__code', 'name').first()
+        if lesson is None or topic is None:
+            raise CommandError(f'No lesson with content, or topic with revision content, in {academic_year}.')
+        word = Subject.objects.filter(pk=lesson.subject_id).values_list('name', flat=True).first().split()[0]
+        return {
+            'student': student, 'password': options['password'], 'academic_year': academic_year,
+            'subject_id': lesson.subject_id, 'lesson': lesson, 'topic': topic, 'search': word[:4],
+            'authorization': {
+                'student': f'Bearer {StudentRefreshToken.for_user(student).access_token}',
+                'admin': f'Bearer {StudentRefreshToken.for_user(admin).access_token}',
+            },
+        }
+
+    def run_case(self, case, count, warmup):
+        latencies, queries, statuses = [], [], Counter()
+        for number in range(warmup + count):
+            with transaction.atomic():
+                kwargs, request = getattr(self, case.prepare)()
+                url = reverse(case.url_name, kwargs=kwargs)
+                query = request.pop('query', None)
+                if query:
+                    url = f'{url}?{query}'
+                if case.auth:
+                    request['HTTP_AUTHORIZATION'] = self.fixtures['authorization'][case.auth]
+                counter = QueryCounter()
+                with connection.execute_wrapper(counter):
+                    started = time.perf_counter()
+                    response = getattr(self.client, case.method.lower())(url, **request)
+                    elapsed = time.perf_counter() - started
+                transaction.set_rollback(True)
+            if number >= warmup:
+                latencies.append(elapsed * 1000)
+                queries.append(counter.count)
+                statuses[response.status_code] += 1
+
+        total = sum(latencies) / 1000
+        return {
+            'url_name': case.url_name,
+            'method': case.method,
+            'p50_ms': round(percentile(latencies, 0.5), 3),
+            'p95_ms': round(percentile(latencies, 0.95), 3),
+            'p99_ms': round(percentile(latencies, 0.99), 3),
+            'mean_ms': round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+            'queries': round(sum(queries) / len(queries), 2) if queries else 0.0,
+            'max_queries': max(queries, default=0),
+            'throughput': round(len(latencies) / total, 1) if total else 0.0,
+            'statuses': {str(code): number for code, number in sorted(statuses.items())},
+            'errors': count - statuses[case.expected],
+        }
+
+    # Request builders. They run inside the rolled-back transaction, so
+    # whatever they create is gone after the request.
+
+    def no_arguments(self):
+        return {}, {}
+
+    def subject_kwargs(self):
+        return {'subject_id': self.fixtures['subject_id']}, {}
+
+    def lesson_kwargs(self):
+        return {'lesson_id': self.fixtures['lesson'].pk}, {}
+
+    def topic_kwargs(self):
+        return {'topic_id': self.fixtures['topic'].pk}, {}
+
+    def search(self):
+        return {}, {'query': f"q={self.fixtures['search']}"}
+
+    def media_token(self):
+        return {}, {'format': 'json', 'data': {'url': '/media/seed/benchmark.mp4'}}
+
+    def subject_data(self):
+        return {
+            'name': 'Benchmark', 'code': f'BENCH-{uuid.uuid4().hex[:12]}', 'description': '-',
+            'academic_year': self.fixtures['academic_year'],
+        }
+
+    def subject_create(self):
+        return {}, {'data': self.subject_data(), 'format': 'json'}
+
+    def subject_bulk(self):
+        return {}, {'data': [self.subject_data() for _ in range(20)], 'format': 'json'}
+
+    def lesson_data(self, offset=0):
+        # Orders past any the subject has, so a bulk create never collides
+        return {
+            'subject': str(self.fixtures['subject_id']), 'title': 'Benchmark', 'description': '-',
+            'order': 100000 + offset, 'duration': '00:30:00',
+        }
+
+    def lesson_create(self):
+        return {}, {'data': self.lesson_data(), 'format': 'json'}
+
+    def lesson_bulk(self):
+        return {}, {'data': [self.lesson_data(offset) for offset in range(20)], 'format': 'json'}
+
+    def topic_data(self):
+        return {
+            'subject': str(self.fixtures['subject_id']), 'name': f'Benchmark {uuid.uuid4().hex[:12]}',
+            'description': '-', 'topic_difficulty_level': 'BEGINNER',
+        }
+
+    def topic_create(self):
+        return {}, {'data': self.topic_data(), 'format': 'json'}
+
+    def topic_bulk(self):
+        return {}, {'data': [self.topic_data() for _ in range(20)], 'format': 'json'}
+
+    def content_create(self):
+        return {}, {'format': 'multipart', 'data': {
+            'lesson': str(self.fixtures['lesson'].pk), 'learning_type': LearningType.VISUAL,
+            'content_type': ContentType.DYNAMIC, 'description': 'Benchmark',
+            'file': SimpleUploadedFile('page.html', UPLOAD_BODY, content_type='text/html'),
+        }}
+
+    def content_package(self):
+        archive = io.BytesIO()
+        files = {'index.html': UPLOAD_BODY, 'style.css': b'body { margin: 0 }'}
+        with zipfile.ZipFile(archive, 'w') as package:
+            package.writestr('manifest.json', json.dumps({
+                'pages': [{'path': 'index.html', 'description': 'Benchmark'}],
+                'files': {name: hashlib.sha256(body).hexdigest() for name, body in files.items()},
+            }))
+            for name, body in files.items():
+                package.writestr(name, body)
+        return {}, {'format': 'multipart', 'data': {
+            'lesson': str(self.fixtures['lesson'].pk), 'learning_type': LearningType.VISUAL,
+            'file': SimpleUploadedFile('package.zip', archive.getvalue(), content_type='application/zip'),
+        }}
+
+    def revision_content_create(self):
+        return {}, {'format': 'json', 'data': {
+            'topic_id': str(self.fixtures['topic'].pk), 'video_url': '/media/benchmark.mp4',
+        }}
+
+    def upload_metadata(self):
+        return {
+            'lesson': str(self.fixtures['lesson'].pk), 'learning_type': LearningType.VISUAL,
+            'description': 'Benchmark',
+        }
+
+    def upload_create(self):
+        # A checksum nothing is stored under, so a part file is started
+        return {}, {'format': 'json', 'data': {
+            'kind': UploadKind.DYNAMIC, 'filename': 'page.html', 'size': 1024,
+            'checksum': hashlib.sha256(uuid.uuid4().bytes).hexdigest(), 'metadata': self.upload_metadata(),
+        }}
+
+    def upload_session(self, received=0):
+        session = UploadSession.objects.create(
+            user_id=self.fixtures['student'].pk, kind=UploadKind.DYNAMIC, filename='page.html',
+            size=len(UPLOAD_BODY), checksum=hashlib.sha256(UPLOAD_BODY).hexdigest(),
+            metadata=self.upload_metadata(), received=received,
+        )
+        os.makedirs(os.path.dirname(uploads.part_path(session)), exist_ok=True)
+        with open(uploads.part_path(session), 'wb') as part:
+            part.write(UPLOAD_BODY[:received])
+        return session
+
+    def upload_detail(self):
+        return {'upload_id': self.upload_session().pk}, {}
+
+    def upload_chunk(self):
+        return {'upload_id': self.upload_session().pk}, {
+            'data': UPLOAD_BODY, 'content_type': 'application/octet-stream',
+            'HTTP_CONTENT_RANGE': f'bytes 0-{len(UPLOAD_BODY) - 1}/{len(UPLOAD_BODY)}',
+            'HTTP_X_CHUNK_SHA256': hashlib.sha256(UPLOAD_BODY).hexdigest(),
+        }
+
+    def upload_complete(self):
+        return {'upload_id': self.upload_session(received=len(UPLOAD_BODY)).pk}, {}
+
+    def register(self):
+        name = f'bench-{uuid.uuid4().hex[:12]}'
+        return {}, {'format': 'json', 'data': {
+            'username': name, 'password': 'benchmark-password', 'email': f'{name}@bench.invalid',
+            'first_name': 'Bench', 'last_name': 'Mark',
+            'student_profile': {
+                'academic_year': self.fixtures['academic_year'], 'learning_type': LearningType.VISUAL,
+            },
+            'parent': {'email': f'parent-{name}@bench.invalid', 'password': 'benchmark-password'},
+        }}
+
+    def login(self):
+        return {}, {'format': 'json', 'data': {
+            'username': self.fixtures['student'].username, 'password': self.fixtures['password'],
+        }}
+
+    def refresh_token(self):
+        # A fresh token each time: these endpoints blacklist what they're sent
+        return {}, {'format': 'json', 'data': {'refresh': str(StudentRefreshToken.for_user(self.fixtures['student']))}}
+
+    def forgot_password(self):
+        return {}, {'format': 'json', 'data': {'email': self.fixtures['student'].email}}
+
+    def reset_password(self):
+        student = self.fixtures['student']
+        return {
+            'uidb64': urlsafe_base64_encode(force_bytes(student.pk)),
+            'token': default_token_generator.make_token(student),
+        }, {'format': 'json', 'data': {'new_password': 'benchmark-password'}}
+
+    def change_password(self):
+        return {}, {'format': 'json', 'data': {
+            'old_password': self.fixtures['password'], 'new_password': 'benchmark-password',
+        }}
+
+    def roster_import(self):
+        # Rolled back with the request, so the job never starts
+        return {}, {'format': 'multipart', 'data': {
+            'file': SimpleUploadedFile('roster.csv', b'username,password,academic_year,learning_type\n'),
+        }}
+
+    def roster_import_status(self):
+        job = RosterImportJob.objects.create(status=ImportStatus.DONE)
+        return {'job_id': job.id}, {}
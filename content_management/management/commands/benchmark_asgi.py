@@ -0,0 +1,193 @@
+# content_management/management/commands/benchmark_asgi.py
+#
+# Compares the sync DRF read endpoints behind WSGI with their async
+# versions behind ASGI. By default both run in this process, through
+# Django's WSGIHandler on a thread pool and ASGIHandler on the event loop,
+# so the numbers cover middleware, views and the database but no network.
+# Pass --wsgi-url and --asgi-url to measure real servers instead, e.g.
+# gunicorn masarat.wsgi against uvicorn masarat.asgi.
+import asyncio
+import io
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from content_management.models import BaseContent, Lesson, RevisionContent, Subject
+from users.tokens import StudentRefreshToken
+
+# name: (sync url name, async url name)
+ENDPOINTS = {
+    'subjects': ('subject-list', 'async-subject-list'),
+    'lessons': ('lesson-list', 'async-lesson-list'),
+    'contents': ('lesson-content-list', 'async-lesson-content-list'),
+    'revisions': ('revision-content-list', 'async-revision-content-list'),
+    'user': ('user-detail', 'async-user-detail'),
+}
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[round(fraction * (len(ordered) - 1))] if ordered else 0.0
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the async read endpoints under ASGI against the sync ones under WSGI'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', required=True, help='Student whose token the requests carry')
+        parser.add_argument('--requests', type=int, default=400, help='Requests per endpoint and server')
+        parser.add_argument('--concurrency', type=int, default=32, help='Requests in flight at once')
+        parser.add_argument('--endpoints', nargs='+', choices=sorted(ENDPOINTS), default=sorted(ENDPOINTS))
+        parser.add_argument('--wsgi-url', help='Base URL of a running WSGI server')
+        parser.add_argument('--asgi-url', help='Base URL of a running ASGI server')
+
+    def handle(self, *args, **options):
+        if bool(options['wsgi_url']) != bool(options['asgi_url']):
+            raise CommandError('Pass both --wsgi-url and --asgi-url, or neither.')
+        user = User.objects.filter(username=options['username']).first()
+        if user is None:
+            raise CommandError(f"No user named {options['username']}")
+        self.authorization = f'Bearer {StudentRefreshToken.for_user(user).access_token}'
+        self.concurrency = options['concurrency']
+        paths = self.resolve_paths(user, options['endpoints'])
+
+        self.stdout.write(f"{'endpoint':<10} {'server':<5} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>6}")
+        for name, (sync_path, async_path) in paths.items():
+            for server, path, base_url in (
+                ('wsgi', sync_path, options['wsgi_url']),
+                ('asgi', async_path, options['asgi_url']),
+            ):
+                if base_url:
+                    results, elapsed = asyncio.run(self.run_http(base_url, path, options['requests']))
+                elif server == 'wsgi':
+                    results, elapsed = self.run_wsgi(path, options['requests'])
+                else:
+                    results, elapsed = asyncio.run(self.run_asgi(path, options['requests']))
+                latencies = [latency * 1000 for status, latency in results]
+                errors = sum(1 for status, _ in results if status != 200)
+                self.stdout.write(
+                    f'{name:<10} {server:<5} {len(results) / elapsed:>8.1f} '
+                    f'{percentile(latencies, 0.5):>8.1f} {percentile(latencies, 0.99):>8.1f} {errors:>6}'
+                )
+
+    def resolve_paths(self, user, names):
+        # Point each list endpoint at real rows the student can see
+        academic_year = user.student_profile.academic_year
+        subject = Subject.objects.filter(academic_year=academic_year, is_active=True).first()
+        lesson = Lesson.objects.filter(pk__in=BaseContent.objects.values('lesson_id')).first()
+        revision = RevisionContent.objects.first()
+        arguments = {
+            'lessons': {'subject_id': subject.pk} if subject else None,
+            'contents': {'lesson_id': lesson.pk} if lesson else None,
+            'revisions': {'topic_id': revision.topic_id} if revision else None,
+        }
+        paths = {}
+        for name in names:
+            kwargs = arguments.get(name, {})
+            if kwargs is None:
+                self.stderr.write(f'Skipping {name}: no data to request')
+                continue
+            paths[name] = tuple(reverse(url_name, kwargs=kwargs) for url_name in ENDPOINTS[name])
+        return paths
+
+    # In-process WSGI: a thread per in-flight request, as a threaded server would
+
+    def run_wsgi(self, path, count):
+        handler = WSGIHandler()
+
+        def request(_):
+            status = {}
+            environ = {
+                'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '', 'SCRIPT_NAME': '',
+                'SERVER_NAME': 'testserver', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+                'REMOTE_ADDR': '127.0.0.1', 'HTTP_HOST': 'testserver', 'HTTP_AUTHORIZATION': self.authorization,
+                'wsgi.version': (1, 0), 'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(),
+                'wsgi.errors': sys.stderr, 'wsgi.multithread': True, 'wsgi.multiprocess': False,
+                'wsgi.run_once': False,
+            }
+            started = time.perf_counter()
+            body = handler(environ, lambda line, headers: status.setdefault('code', int(line.split()[0])))
+            for _ in body:
+                pass
+            body.close()
+            return status.get('code'), time.perf_counter() - started
+
+        with ThreadPoolExecutor(self.concurrency) as pool:
+            list(pool.map(request, range(self.concurrency)))  # warm up
+            started = time.perf_counter()
+            results = list(pool.map(request, range(count)))
+        return results, time.perf_counter() - started
+
+    # In-process ASGI: every request is a task on one event loop
+
+    async def run_asgi(self, path, count):
+        handler = ASGIHandler()
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+            'headers': [(b'host', b'testserver'), (b'authorization', self.authorization.encode())],
+            'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+        }
+
+        async def request():
+            status = {}
+            delivered = False
+
+            async def receive():
+                nonlocal delivered
+                if not delivered:
+                    delivered = True
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                # The client never disconnects
+                await asyncio.Future()
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    status['code'] = message['status']
+
+            started = time.perf_counter()
+            await handler(dict(scope), receive, send)
+            return status.get('code'), time.perf_counter() - started
+
+        return await self.gather(request, count)
+
+    # Real servers over HTTP/1.1, one connection per request
+
+    async def run_http(self, base_url, path, count):
+        url = urlsplit(base_url)
+        port = url.port or (443 if url.scheme == 'https' else 80)
+        request_bytes = (
+            f'GET {url.path.rstrip("/")}{path} HTTP/1.1\r\nHost: {url.netloc}\r\n'
+            f'Authorization: {self.authorization}\r\nConnection: close\r\n\r\n'
+        ).encode()
+
+        async def request():
+            started = time.perf_counter()
+            reader, writer = await asyncio.open_connection(url.hostname, port, ssl=url.scheme == 'https' or None)
+            writer.write(request_bytes)
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+            status = int(response.split(b' ', 2)[1]) if response else None
+            return status, time.perf_counter() - started
+
+        return await self.gather(request, count)
+
+    async def gather(self, request, count):
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def limited():
+            async with semaphore:
+                return await request()
+
+        await asyncio.gather(*(limited() for _ in range(self.concurrency)))  # warm up
+        started = time.perf_counter()
+        results = await asyncio.gather(*(limited() for _ in range(count)))
+        return results, time.perf_counter() - started
@@ -0,0 +1,53 @@
+# content_management/management/commands/gc_media_blobs.py
+from collections import Counter
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from content_management.models import DynamicContent, MediaBlob, RevisionContent, VideoContent
+from content_management.storage import blob_digest, blob_storage
+
+
+class Command(BaseCommand):
+    help = 'Deletes content-addressed media blobs that no content row references'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recount', action='store_true', help='Recompute every reference count from the content tables first')
+        parser.add_argument('--grace-hours', type=int, default=24, help='Keep unreferenced blobs used more recently than this (uploads in flight)')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be deleted without deleting it')
+
+    def handle(self, *args, **options):
+        if options['recount']:
+            self.recount()
+
+        cutoff = timezone.now() - timedelta(hours=options['grace_hours'])
+        deleted = 0
+        for blob in MediaBlob.objects.filter(ref_count=0, last_used_at__lt=cutoff).iterator():
+            if options['dry_run']:
+                self.stdout.write(blob.name)
+                continue
+            with transaction.atomic():
+                # Re-check under the lock, which reuse (touch_blob) and new
+                # references wait on: either may have arrived since the scan
+                locked = MediaBlob.objects.select_for_update().filter(
+                    pk=blob.pk, ref_count=0, last_used_at__lt=cutoff
+                ).first()
+                if locked is None:
+                    continue
+                blob_storage.delete(locked.name)
+                locked.delete()
+            deleted += 1
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} unreferenced blob(s)'))
+
+    def recount(self):
+        counts = Counter()
+        for model, field in ((VideoContent, 'url'), (DynamicContent, 'url'), (RevisionContent, 'video_url')):
+            for url in model.objects.values_list(field, flat=True).iterator():
+                digest = blob_digest(url)
+                if digest:
+                    counts[digest] += 1
+        for blob in MediaBlob.objects.iterator():
+            if blob.ref_count != counts[blob.digest]:
+                MediaBlob.objects.filter(pk=blob.pk).update(ref_count=counts[blob.digest])
@@ -0,0 +1,29 @@
+# content_management/management/commands/process_videos.py
+from django.core.management.base import BaseCommand
+
+from content_management import video_processing
+from content_management.models import ProcessingStatus, VideoContent
+
+
+class Command(BaseCommand):
+    help = 'Probes videos and renders their posters (pending ones by default), e.g. after a restart lost the pool queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--failed', action='store_true', help='Also retry videos whose processing failed')
+        parser.add_argument('--all', action='store_true', help='Reprocess every video')
+
+    def handle(self, *args, **options):
+        videos = VideoContent.objects.all()
+        if not options['all']:
+            statuses = [ProcessingStatus.PENDING]
+            if options['failed']:
+                statuses.append(ProcessingStatus.FAILED)
+            videos = videos.filter(processing_status__in=statuses)
+
+        done = failed = 0
+        for video in videos.iterator():
+            if video_processing.process_now(video):
+                done += 1
+            else:
+                failed += 1
+        self.stdout.write(self.style.SUCCESS(f'Processed {done} video(s), {failed} failed'))
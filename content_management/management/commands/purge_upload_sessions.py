@@ -0,0 +1,26 @@
+# content_management/management/commands/purge_upload_sessions.py
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from content_management import uploads
+from content_management.models import UploadSession, UploadStatus
+
+
+class Command(BaseCommand):
+    help = 'Deletes chunked upload sessions (and their partial files) that have been idle too long'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=48, help='Idle time after which a pending session is dropped')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['hours'])
+        count = 0
+        for session in UploadSession.objects.filter(updated_at__lt=cutoff).iterator():
+            if session.status == UploadStatus.PENDING:
+                uploads.discard_session(session)
+            else:
+                session.delete()
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f'Purged {count} upload session(s)'))
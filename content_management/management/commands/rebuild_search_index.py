@@ -0,0 +1,18 @@
+# content_management/management/commands/rebuild_search_index.py
+from django.core.management.base import BaseCommand
+
+from content_management import search
+from content_management.models import Lesson, SearchDocument, SearchKind, Subject, Topic
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the search documents of every subject, lesson and topic'
+
+    def handle(self, *args, **options):
+        for kind, model in ((SearchKind.SUBJECT, Subject), (SearchKind.LESSON, Lesson), (SearchKind.TOPIC, Topic)):
+            ids = list(model.objects.values_list('pk', flat=True))
+            search.reindex(kind, ids)
+            # Documents whose rows were deleted without a signal
+            SearchDocument.objects.filter(kind=kind).exclude(object_id__in=model.objects.values('pk')).delete()
+            self.stdout.write(f'Indexed {len(ids)} {kind.label.lower()}(s)')
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt'))
@@ -0,0 +1,20 @@
+# content_management/management/commands/rebuild_snapshots.py
+from django.core.management.base import BaseCommand
+
+from content_management import snapshots
+from content_management.models import Subject
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the curriculum tree snapshots (all subjects, or the given subject IDs)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('subject_ids', nargs='*', help='Only rebuild these subjects')
+
+    def handle(self, *args, **options):
+        subject_ids = options['subject_ids'] or Subject.objects.values_list('pk', flat=True)
+        count = 0
+        for subject_id in subject_ids:
+            if snapshots.rebuild_subject(subject_id) is not None:
+                count += 1
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} snapshot(s)'))
@@ -0,0 +1,197 @@
+# content_management/management/commands/seed_data.py
+#
+# Fills the database with a generated catalog and student population for
+# load tests and benchmark_api. The same --seed and sizes always produce the
+# same catalog, ids included, and the same students, so runs on different
+# machines (or before and after a change) measure the same data. Seeded
+# subjects have codes starting with SEED- and seeded users usernames starting
+# with seed-; --replace deletes those before seeding again.
+import random
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from content_management import search, snapshots
+from content_management.cache import content_cache
+from content_management.models import (
+    AcademicYear, BaseContent, ContentType, DifficultyLevel, DynamicContent, LearningType, Lesson,
+    ProcessingStatus, RevisionContent, SearchKind, Subject, Topic, VideoContent,
+)
+from users.models import StudentProfile
+
+CODE_PREFIX = 'SEED-'
+USERNAME_PREFIX = 'seed-'
+ADMIN_USERNAME = 'seed-admin'
+BATCH_SIZE = 2000
+# Every seeded row's timestamps count up from here
+EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+
+SUBJECT_NAMES = (
+    'Mathematics', 'Science', 'Arabic', 'English', 'History', 'Geography', 'Physics', 'Chemistry',
+    'Biology', 'Religion', 'French', 'Computer Science', 'Art', 'Music', 'Philosophy', 'Economics',
+)
+WORDS = (
+    'fractions', 'equations', 'energy', 'cells', 'grammar', 'poetry', 'maps', 'rivers', 'empires',
+    'forces', 'atoms', 'reactions', 'plants', 'algorithms', 'geometry', 'probability', 'climate',
+    'الرياضيات', 'الكسور', 'الطاقة', 'الخلايا', 'القواعد', 'الشعر', 'الخرائط', 'الأنهار',
+)
+
+
+class Command(BaseCommand):
+    help = 'Generates a reproducible catalog (years x subjects x lessons x contents x topics) and students'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--years', type=int, default=3, help=f'Academic years, at most {len(AcademicYear)}')
+        parser.add_argument('--subjects', type=int, default=4, help='Subjects per year')
+        parser.add_argument('--lessons', type=int, default=10, help='Lessons per subject')
+        parser.add_argument('--contents', type=int, default=8, help='Content items per lesson')
+        parser.add_argument('--topics', type=int, default=5, help='Topics per subject')
+        parser.add_argument('--revisions', type=int, default=3, help='Revision items per topic')
+        parser.add_argument('--students', type=int, default=100, help='Students per year')
+        parser.add_argument('--password', default='seed-password', help='Password of every seeded user')
+        parser.add_argument('--replace', action='store_true', help='Delete previously seeded rows first')
+
+    def handle(self, *args, **options):
+        if not 1 <= options['years'] <= len(AcademicYear):
+            raise CommandError(f'--years must be between 1 and {len(AcademicYear)}.')
+        seeded = Subject.objects.filter(code__startswith=CODE_PREFIX).exists() or User.objects.filter(
+            username__startswith=USERNAME_PREFIX
+        ).exists()
+        if seeded and not options['replace']:
+            raise CommandError('The database already holds seeded data; pass --replace to regenerate it.')
+
+        self.random = random.Random(options['seed'])
+        self.clock = 0
+        if seeded:
+            # Committed on its own: the delete handlers' refreshes must run
+            # before rows with the same ids are created again
+            with transaction.atomic():
+                Subject.objects.filter(code__startswith=CODE_PREFIX).delete()
+                User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+        with transaction.atomic():
+            years = AcademicYear.values[:options['years']]
+            subjects = self.create_catalog(years, options)
+            students = self.create_students(years, options)
+
+        # Bulk inserts send no signals: build what the handlers would have
+        for subject in subjects:
+            snapshots.rebuild_subject(subject.pk)
+        search.reindex(SearchKind.SUBJECT, [subject.pk for subject in subjects])
+        search.reindex(SearchKind.LESSON, Lesson.objects.filter(subject__in=subjects).values_list('pk', flat=True))
+        search.reindex(SearchKind.TOPIC, Topic.objects.filter(subject__in=subjects).values_list('pk', flat=True))
+        for year in years:
+            content_cache.bump('year', year)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {len(subjects)} subject(s) over {len(years)} year(s) and {students} student(s); '
+            f'every seeded user, and {ADMIN_USERNAME}, has the password given by --password'
+        ))
+
+    def uuid(self):
+        return uuid.UUID(int=self.random.getrandbits(128), version=4)
+
+    def timestamp(self):
+        self.clock += 1
+        return EPOCH + timedelta(seconds=self.clock)
+
+    def text(self, count):
+        return ' '.join(self.random.choice(WORDS) for _ in range(count))
+
+    def create_catalog(self, years, options):
+        subjects, lessons, contents, videos, pages, topics, revisions = [], [], [], [], [], [], []
+        for year_index, year in enumerate(years):
+            for number in range(options['subjects']):
+                name = SUBJECT_NAMES[number % len(SUBJECT_NAMES)]
+                if number >= len(SUBJECT_NAMES):
+                    name = f'{name} {number // len(SUBJECT_NAMES) + 1}'
+                subject = Subject(
+                    id=self.uuid(), name=name, code=f'{CODE_PREFIX}{year_index + 1:02}-{number + 1:03}',
+                    description=self.text(12), academic_year=year, created_at=self.timestamp(),
+                )
+                subjects.append(subject)
+
+                for order in range(1, options['lessons'] + 1):
+                    lesson = Lesson(
+                        id=self.uuid(), subject=subject, title=f'{name} {order}: {self.text(3)}',
+                        description=self.text(20), order=order,
+                        duration=timedelta(minutes=self.random.randint(10, 60)), created_at=self.timestamp(),
+                    )
+                    lessons.append(lesson)
+                    for index in range(options['contents']):
+                        content_type = ContentType.VIDEO if index % 2 == 0 else ContentType.DYNAMIC
+                        content = BaseContent(
+                            id=self.uuid(), lesson=lesson, content_type=content_type,
+                            learning_type=LearningType.values[index % len(LearningType)],
+                            description=self.text(8), created_at=self.timestamp(),
+                        )
+                        contents.append(content)
+                        if content_type == ContentType.VIDEO:
+                            videos.append(VideoContent(
+                                id=self.uuid(), base_content=content, url=f'/media/seed/{content.id}.mp4',
+                                duration=timedelta(seconds=self.random.randint(60, 1200)),
+                                processing_status=ProcessingStatus.DONE,
+                            ))
+                        else:
+                            pages.append(DynamicContent(
+                                id=self.uuid(), base_content=content, url=f'/media/seed/{content.id}.html',
+                            ))
+
+                for number_in_subject in range(options['topics']):
+                    topic = Topic(
+                        id=self.uuid(), subject=subject, name=f'{name} topic {number_in_subject + 1}',
+                        description=self.text(10),
+                        topic_difficulty_level=DifficultyLevel.values[number_in_subject % len(DifficultyLevel)],
+                        created_at=self.timestamp(),
+                    )
+                    topics.append(topic)
+                    for _ in range(options['revisions']):
+                        revisions.append(RevisionContent(
+                            id=self.uuid(), topic=topic, video_url=f'/media/seed/{self.uuid()}.mp4',
+                            created_at=self.timestamp(),
+                        ))
+
+        for model, rows in (
+            (Subject, subjects), (Lesson, lessons), (BaseContent, contents), (VideoContent, videos),
+            (DynamicContent, pages), (Topic, topics), (RevisionContent, revisions),
+        ):
+            model.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+            self.stdout.write(f'{model.__name__}: {len(rows)}')
+        return subjects
+
+    def create_students(self, years, options):
+        # One hash for everyone: hashing per user would dominate the run
+        password = make_password(options['password'], salt=f'seed{options["seed"]}')
+        User.objects.create(
+            username=ADMIN_USERNAME, email='admin@seed.invalid', password=password, is_staff=True, is_superuser=True,
+        )
+
+        users, profiles = [], []
+        for year in years:
+            for _ in range(options['students']):
+                number = len(users) + 1
+                user = User(
+                    username=f'{USERNAME_PREFIX}student-{number:06}', email=f'student{number}@seed.invalid',
+                    password=password, first_name='Seed', last_name=f'Student {number}',
+                    date_joined=self.timestamp(),
+                )
+                users.append(user)
+                profiles.append(StudentProfile(
+                    user=user, academic_year=year, first_time_login=False,
+                    learning_type=self.random.choice(LearningType.values),
+                ))
+        User.objects.bulk_create(users, batch_size=BATCH_SIZE)
+        if any(user.pk is None for user in users):
+            # Backends that cannot return ids from a bulk insert
+            ids = dict(User.objects.filter(username__startswith=USERNAME_PREFIX).values_list('username', 'id'))
+            for user in users:
+                user.pk = ids[user.username]
+        for profile in profiles:
+            profile.user_id = profile.user.pk
+        StudentProfile.objects.bulk_create(profiles, batch_size=BATCH_SIZE)
+        self.stdout.write(f'Students: {len(users)}')
+        return len(users)
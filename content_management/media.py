@@ -0,0 +1,272 @@
+# content_management/media.py
+import mimetypes
+import os
+import posixpath
+import uuid
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.authentication import BaseAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.negotiation import BaseContentNegotiation
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from .serializers import MediaTokenSerializer
+
+# More ranges than this in one request and the Range header is ignored
+MAX_RANGES = 16
+STREAM_BLOCK_SIZE = 64 * 1024
+
+# Compressed files are served as what they are, never with Content-Encoding:
+# clients would unpack them on the fly and Range offsets would stop matching
+# the stored bytes (the same mapping FileResponse uses)
+COMPRESSED_TYPES = {
+    'br': 'application/x-brotli',
+    'bzip2': 'application/x-bzip',
+    'compress': 'application/x-compress',
+    'gzip': 'application/gzip',
+    'xz': 'application/x-xz',
+}
+
+MEDIA_TOKEN_SALT = 'content_management.media'
+MEDIA_TOKEN_PARAM = 'token'
+MEDIA_TOKEN_COOKIE = 'media_token'
+
+
+# Signed media URLs, for clients that cannot send an Authorization header
+# (<video src>, <iframe>). A token covers the folder of the file it was
+# issued for, so a package page and the assets it loads by relative URL
+# share one; the first request sets it as a cookie scoped to that folder.
+
+def media_scope(path):
+    folder = posixpath.dirname(path)
+    return f'{folder}/' if folder else path
+
+
+def in_scope(path, scope):
+    return path == scope or (scope.endswith('/') and path.startswith(scope))
+
+
+def sign_media_path(user_id, path):
+    return signing.dumps({'user': str(user_id), 'scope': media_scope(path)}, salt=MEDIA_TOKEN_SALT)
+
+
+class MediaTokenAuthentication(BaseAuthentication):
+    def authenticate(self, request):
+        token = request.query_params.get(MEDIA_TOKEN_PARAM) or request.COOKIES.get(MEDIA_TOKEN_COOKIE)
+        if not token:
+            return None
+        try:
+            claims = signing.loads(token, salt=MEDIA_TOKEN_SALT, max_age=settings.MEDIA_TOKEN_LIFETIME)
+        except signing.BadSignature:
+            raise AuthenticationFailed('Media token is invalid or expired.')
+        if not in_scope(request.parser_context['kwargs'].get('path', ''), claims['scope']):
+            raise AuthenticationFailed('Media token does not cover this file.')
+        request.media_token = (token, claims['scope'])
+        return TokenUser({jwt_settings.USER_ID_CLAIM: claims['user']}), None
+
+    def authenticate_header(self, request):
+        return 'Bearer realm="media"'
+
+
+class IgnoreClientContentNegotiation(BaseContentNegotiation):
+    # Video players send Accept headers no DRF renderer matches; the body is
+    # the file itself, so skip negotiation instead of answering 406
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return (renderers[0], renderers[0].media_type)
+
+
+class RangeFile:
+    """
+    Exposes `length` bytes of an open file starting at `start`. It keeps the
+    real fileno(), so a WSGI server's file_wrapper can still sendfile() the
+    range; Content-Length tells it where to stop.
+    """
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.remaining = length
+        self.file.seek(start)
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range_header(header, size):
+    """
+    Returns a list of (start, end) byte ranges (inclusive), an empty list if
+    none of them can be satisfied, or None when the header should be ignored
+    and the whole file served.
+    """
+    if not header or not header.startswith('bytes='):
+        return None
+    specs = header[len('bytes='):].split(',')
+    if len(specs) > MAX_RANGES:
+        return None
+    ranges = []
+    for spec in specs:
+        first, dash, last = spec.strip().partition('-')
+        if not dash:
+            return None
+        try:
+            if first:
+                start = int(first)
+                end = int(last) if last else size - 1
+                if last and end < start:
+                    return None
+            else:
+                suffix = int(last)
+                start, end = max(size - suffix, 0), size - 1
+        except ValueError:
+            return None
+        if start < 0:
+            return None
+        if start < size:
+            ranges.append((start, min(end, size - 1)))
+    return ranges
+
+
+def _multipart_ranges(path, ranges, content_type, size, boundary):
+    with open(path, 'rb') as file:
+        for start, end in ranges:
+            yield (
+                f'--{boundary}\r\n'
+                f'Content-Type: {content_type}\r\n'
+                f'Content-Range: bytes {start}-{end}/{size}\r\n\r\n'
+            ).encode()
+            file.seek(start)
+            remaining = end - start + 1
+            while remaining:
+                block = file.read(min(STREAM_BLOCK_SIZE, remaining))
+                if not block:
+                    break
+                remaining -= len(block)
+                yield block
+            yield b'\r\n'
+        yield f'--{boundary}--\r\n'.encode()
+
+
+# Authenticated media download with Range support. Bytes go out through
+# FileResponse (sendfile under a WSGI file_wrapper), or are handed to the
+# front-end server with X-Accel-Redirect / X-Sendfile.
+class MediaView(APIView):
+    authentication_classes = [*api_settings.DEFAULT_AUTHENTICATION_CLASSES, MediaTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+    content_negotiation_class = IgnoreClientContentNegotiation
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        media_token = getattr(request, 'media_token', None)
+        if media_token and request.query_params.get(MEDIA_TOKEN_PARAM) and response.status_code < 400:
+            token, scope = media_token
+            response.set_cookie(
+                MEDIA_TOKEN_COOKIE, token, max_age=settings.MEDIA_TOKEN_LIFETIME,
+                path=settings.MEDIA_URL + scope, secure=request.is_secure(), httponly=True, samesite='Lax',
+            )
+        return response
+
+    def get(self, request, path):
+        try:
+            full_path = safe_join(settings.MEDIA_ROOT, path)
+        except SuspiciousFileOperation:
+            raise Http404("File not found.")
+        if not os.path.isfile(full_path):
+            raise Http404("File not found.")
+
+        content_type, encoding = mimetypes.guess_type(full_path)
+        content_type = COMPRESSED_TYPES.get(encoding, content_type) or 'application/octet-stream'
+
+        if settings.MEDIA_SENDFILE_BACKEND:
+            return self.offload(path, full_path, content_type)
+
+        stat = os.stat(full_path)
+        size = stat.st_size
+        etag = f'"{stat.st_mtime_ns:x}-{size:x}"'
+        last_modified = http_date(stat.st_mtime)
+
+        # If-None-Match / If-Modified-Since (304) and If-Match (412)
+        not_modified = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+        if not_modified is not None:
+            not_modified['Accept-Ranges'] = 'bytes'
+            return not_modified
+
+        ranges = None
+        if_range = request.headers.get('If-Range')
+        if if_range is None or if_range in (etag, last_modified):
+            ranges = parse_range_header(request.headers.get('Range'), size)
+
+        if ranges is None:
+            response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+        elif not ranges:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+        elif len(ranges) == 1:
+            start, end = ranges[0]
+            response = FileResponse(
+                RangeFile(open(full_path, 'rb'), start, end - start + 1),
+                content_type=content_type, status=206
+            )
+            response['Content-Length'] = end - start + 1
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        else:
+            boundary = uuid.uuid4().hex
+            response = StreamingHttpResponse(
+                _multipart_ranges(full_path, ranges, content_type, size, boundary),
+                content_type=f'multipart/byteranges; boundary={boundary}', status=206
+            )
+
+        response['Accept-Ranges'] = 'bytes'
+        response['ETag'] = etag
+        response['Last-Modified'] = last_modified
+        return response
+
+    def offload(self, path, full_path, content_type):
+        # The front-end server streams the file (and handles Range itself);
+        # Django has only done the authentication check
+        response = HttpResponse(content_type=content_type)
+        if settings.MEDIA_SENDFILE_BACKEND == 'nginx':
+            response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT_PREFIX + quote(path)
+        else:
+            response['X-Sendfile'] = full_path
+        return response
+
+
+# A signed URL for one media file, valid for MEDIA_TOKEN_LIFETIME seconds,
+# for players and frames that cannot send the bearer token
+class MediaTokenView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = MediaTokenSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        path = serializer.validated_data['path']
+        token = sign_media_path(request.user.pk, path)
+        return Response({
+            "url": f"{settings.MEDIA_URL}{quote(path)}?{MEDIA_TOKEN_PARAM}={token}",
+            "expires_in": settings.MEDIA_TOKEN_LIFETIME,
+        }, status=status.HTTP_200_OK)
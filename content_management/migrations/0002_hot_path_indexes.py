@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content_management', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dynamiccontent',
+            name='base_content',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='dynamic_content', to='content_management.basecontent'),
+        ),
+        migrations.AlterField(
+            model_name='videocontent',
+            name='base_content',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='video_content', to='content_management.basecontent'),
+        ),
+        migrations.AddIndex(
+            model_name='basecontent',
+            index=models.Index(fields=['lesson', 'created_at', 'id'], name='content_lesson_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['subject', 'order', 'id'], name='lesson_active_subject_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='revisioncontent',
+            index=models.Index(fields=['topic', 'created_at', 'id'], name='revision_topic_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subject',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['academic_year', 'created_at', 'id'], name='subject_active_year_idx'),
+        ),
+    ]
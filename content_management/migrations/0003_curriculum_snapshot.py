@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:10
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content_management', '0002_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CurriculumSnapshot',
+            fields=[
+                ('subject', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='snapshot', serialize=False, to='content_management.subject')),
+                ('tree', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content_management', '0005_media_blob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videocontent',
+            name='bitrate',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='videocontent',
+            name='duration',
+            field=models.DurationField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='videocontent',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='videocontent',
+            name='poster_url',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='videocontent',
+            name='processed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='videocontent',
+            name='processing_status',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('DONE', 'Done'), ('FAILED', 'Failed')], default='PENDING', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='videocontent',
+            name='thumbnails_url',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='videocontent',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# PostgreSQL only: the weighted tsvector the search endpoint matches and
+# ranks with, kept up to date by the database itself. Other databases use the
+# in-process index in content_management/search.py.
+ADD_SEARCH_VECTOR = """
+ALTER TABLE content_management_searchdocument ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', title_terms), 'A') ||
+        setweight(to_tsvector('simple', body_terms), 'B')
+    ) STORED;
+CREATE INDEX search_document_vector_idx ON content_management_searchdocument USING GIN (search_vector);
+"""
+
+DROP_SEARCH_VECTOR = """
+DROP INDEX IF EXISTS search_document_vector_idx;
+ALTER TABLE content_management_searchdocument DROP COLUMN IF EXISTS search_vector;
+"""
+
+
+def add_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(ADD_SEARCH_VECTOR)
+
+
+def drop_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_SEARCH_VECTOR)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content_management', '0006_video_metadata'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('SUBJECT', 'Subject'), ('LESSON', 'Lesson'), ('TOPIC', 'Topic')], max_length=10)),
+                ('object_id', models.UUIDField()),
+                ('academic_year', models.CharField(choices=[('Primary 1', 'Primary Year 1'), ('Primary 2', 'Primary Year 2'), ('Primary 3', 'Primary Year 3'), ('Primary 4', 'Primary Year 4'), ('Primary 5', 'Primary Year 5'), ('Primary 6', 'Primary Year 6'), ('Prep 1', 'Prep Year 1'), ('Prep 2', 'Prep Year 2'), ('Prep 3', 'Prep Year 3'), ('Secondary 1', 'Secondary Year 1'), ('Secondary 2', 'Secondary Year 2'), ('Secondary 3', 'Secondary Year 3')], max_length=20)),
+                ('is_active', models.BooleanField(default=True)),
+                ('title', models.CharField(max_length=255)),
+                ('title_terms', models.TextField()),
+                ('body_terms', models.TextField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_documents', to='content_management.subject')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('is_active', True)), fields=['academic_year'], name='search_active_year_idx')],
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id'), name='search_document_object_uniq')],
+            },
+        ),
+        migrations.RunPython(add_search_vector, drop_search_vector),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:45
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content_management', '0007_search_document'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LessonFeed',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('learning_type', models.CharField(choices=[('Visual', 'Visual'), ('Auditory', 'Auditory'), ('Kinesthetic', 'Kinesthetic'), ('Reading/Writing', 'Reading/Writing')], max_length=15)),
+                ('served_type', models.CharField(blank=True, choices=[('Visual', 'Visual'), ('Auditory', 'Auditory'), ('Kinesthetic', 'Kinesthetic'), ('Reading/Writing', 'Reading/Writing')], max_length=15, null=True)),
+                ('items', models.JSONField(default=list, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('lesson', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feeds', to='content_management.lesson')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('lesson', 'learning_type'), name='lesson_feed_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content_management', '0008_lesson_feed'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='uploadsession',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('COMPLETING', 'Completing'), ('COMPLETE', 'Complete')], default='PENDING', max_length=10),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:28
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content_management', '0009_upload_completing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediablob',
+            name='last_used_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:02
+
+from django.db import migrations, models
+
+
+def drop_feeds(apps, schema_editor):
+    # Feeds are rebuilt on first read; dropping them saves backfilling the
+    # subject's fields here
+    apps.get_model('content_management', 'LessonFeed').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content_management', '0010_media_blob_last_used'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_feeds, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='lessonfeed',
+            name='academic_year',
+            field=models.CharField(choices=[('Primary 1', 'Primary Year 1'), ('Primary 2', 'Primary Year 2'), ('Primary 3', 'Primary Year 3'), ('Primary 4', 'Primary Year 4'), ('Primary 5', 'Primary Year 5'), ('Primary 6', 'Primary Year 6'), ('Prep 1', 'Prep Year 1'), ('Prep 2', 'Prep Year 2'), ('Prep 3', 'Prep Year 3'), ('Secondary 1', 'Secondary Year 1'), ('Secondary 2', 'Secondary Year 2'), ('Secondary 3', 'Secondary Year 3')], default='', max_length=20),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='lessonfeed',
+            name='is_active',
+            field=models.BooleanField(default=True),
+        ),
+    ]
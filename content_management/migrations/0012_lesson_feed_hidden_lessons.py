@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:10
+
+from django.db import migrations
+
+
+def hide_inactive_lessons(apps, schema_editor):
+    apps.get_model('content_management', 'LessonFeed').objects.filter(lesson__is_active=False).update(is_active=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content_management', '0011_lesson_feed_subject'),
+    ]
+
+    operations = [
+        migrations.RunPython(hide_inactive_lessons, migrations.RunPython.noop),
+    ]
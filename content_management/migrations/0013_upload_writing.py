@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content_management', '0012_lesson_feed_hidden_lessons'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='uploadsession',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('WRITING', 'Writing'), ('COMPLETING', 'Completing'), ('COMPLETE', 'Complete')], default='PENDING', max_length=10),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:40
+
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+
+def backfill_search_documents(apps, schema_editor):
+    # Indexes the rows that existed before search did, so the endpoint works
+    # straight after deploy; rebuild_search_index does the same on demand.
+    # Rows that already have a document (saved since 0007) are left alone.
+    from content_management.cache import content_cache
+    from content_management.search import terms
+
+    SearchDocument = apps.get_model('content_management', 'SearchDocument')
+    sources = (
+        ('SUBJECT', apps.get_model('content_management', 'Subject').objects.all(),
+         lambda subject: (subject, subject.name, subject.description, subject.is_active)),
+        ('LESSON', apps.get_model('content_management', 'Lesson').objects.select_related('subject'),
+         lambda lesson: (lesson.subject, lesson.title, lesson.description,
+                         lesson.is_active and lesson.subject.is_active)),
+        ('TOPIC', apps.get_model('content_management', 'Topic').objects.select_related('subject'),
+         lambda topic: (topic.subject, topic.name, topic.description, topic.subject.is_active)),
+    )
+    years = set()
+    for kind, rows, describe in sources:
+        documents = []
+        for row in rows.iterator(chunk_size=BATCH_SIZE):
+            subject, title, body, is_active = describe(row)
+            years.add(subject.academic_year)
+            documents.append(SearchDocument(
+                kind=kind, object_id=row.pk, subject=subject,
+                academic_year=subject.academic_year, is_active=is_active,
+                title=title[:255], title_terms=' '.join(terms(title)), body_terms=' '.join(terms(body)),
+            ))
+            if len(documents) == BATCH_SIZE:
+                SearchDocument.objects.bulk_create(documents, ignore_conflicts=True)
+                documents = []
+        SearchDocument.objects.bulk_create(documents, ignore_conflicts=True)
+    for year in years:
+        content_cache.bump('search', year)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content_management', '0013_upload_writing'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_search_documents, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,6 @@
 import uuid
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.utils import timezone
 from django.core.exceptions import ValidationError
@@ -35,6 +37,27 @@ class DifficultyLevel(models.TextChoices):
     INTERMEDIATE = 'INTERMEDIATE', 'Intermediate'
     ADVANCED = 'ADVANCED', 'Advanced'
 
+class ProcessingStatus(models.TextChoices):
+    PENDING = 'PENDING', 'Pending'
+    DONE = 'DONE', 'Done'
+    FAILED = 'FAILED', 'Failed'
+
+class UploadKind(models.TextChoices):
+    VIDEO = 'VIDEO', 'Video'
+    DYNAMIC = 'DYNAMIC', 'Dynamic'
+    REVISION = 'REVISION', 'Revision'
+
+class UploadStatus(models.TextChoices):
+    PENDING = 'PENDING', 'Pending'
+    WRITING = 'WRITING', 'Writing'
+    COMPLETING = 'COMPLETING', 'Completing'
+    COMPLETE = 'COMPLETE', 'Complete'
+
+class SearchKind(models.TextChoices):
+    SUBJECT = 'SUBJECT', 'Subject'
+    LESSON = 'LESSON', 'Lesson'
+    TOPIC = 'TOPIC', 'Topic'
+
 
 # Models
 class Subject(models.Model):
@@ -49,6 +72,16 @@ class Subject(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Subject list: active subjects of one academic year in cursor order
+            models.Index(
+                fields=['academic_year', 'created_at', 'id'],
+                condition=models.Q(is_active=True),
+                name='subject_active_year_idx',
+            ),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -64,6 +97,16 @@ class Lesson(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Lesson list: active lessons of one subject in (order, id) cursor order
+            models.Index(
+                fields=['subject', 'order', 'id'],
+                condition=models.Q(is_active=True),
+                name='lesson_active_subject_idx',
+            ),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -96,6 +139,11 @@ class BaseContent(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['lesson', 'created_at', 'id'], name='content_lesson_created_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
 
@@ -111,6 +159,18 @@ class VideoContent(models.Model):
     )
     url = models.TextField()
 
+    # Filled in by the background post-processing (see video_processing.py)
+    duration = models.DurationField(null=True, blank=True)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    bitrate = models.PositiveBigIntegerField(null=True, blank=True)
+    poster_url = models.TextField(blank=True, default='')
+    thumbnails_url = models.TextField(blank=True, default='')
+    processing_status = models.CharField(
+        max_length=10, choices=ProcessingStatus.choices, default=ProcessingStatus.PENDING
+    )
+    processed_at = models.DateTimeField(null=True, blank=True)
+
     def __str__(self):
         return f"VideoContent {self.id}"
 
@@ -134,5 +194,113 @@ class RevisionContent(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['topic', 'created_at', 'id'], name='revision_topic_created_idx'),
+        ]
+
     def __str__(self):
         return f"RevisionContent {self.id} for Topic {self.topic}"
+
+
+class CurriculumSnapshot(models.Model):
+    # Pre-serialized subject -> lessons -> contents / topics -> revision content
+    # tree served by the subject tree endpoint, patched as the curriculum changes
+    subject = models.OneToOneField(
+        Subject,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='snapshot'
+    )
+    tree = models.JSONField(encoder=DjangoJSONEncoder)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"CurriculumSnapshot for Subject {self.subject_id}"
+
+
+class LessonFeed(models.Model):
+    # A lesson's content as served to one learning type: the serialized items
+    # of the first type in that learner's fallback order that the lesson has
+    # (see feeds.py). Rebuilt for the lesson whenever its content changes.
+    lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, related_name='feeds')
+    learning_type = models.CharField(max_length=15, choices=LearningType.choices)
+    served_type = models.CharField(max_length=15, choices=LearningType.choices, null=True, blank=True)
+    items = models.JSONField(encoder=DjangoJSONEncoder, default=list)
+    # Copied from the lesson and its subject so access can be checked without
+    # a join: is_active only if both the lesson and the subject are
+    academic_year = models.CharField(max_length=20, choices=AcademicYear.choices)
+    is_active = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['lesson', 'learning_type'], name='lesson_feed_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.learning_type} feed for Lesson {self.lesson_id}"
+
+
+class UploadSession(models.Model):
+    # A resumable chunked upload; `received` is how many leading bytes of the
+    # file are on disk, and `metadata` holds the fields of the row to create
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='upload_sessions')
+    kind = models.CharField(max_length=10, choices=UploadKind.choices)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    checksum = models.CharField(max_length=64)  # SHA-256 of the whole file, hex
+    received = models.PositiveBigIntegerField(default=0)
+    metadata = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=UploadStatus.choices, default=UploadStatus.PENDING)
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"UploadSession {self.id} ({self.filename})"
+
+
+class MediaBlob(models.Model):
+    # One stored media file, named by its SHA-256 (see storage.ContentAddressedStorage).
+    # ref_count is the number of VideoContent/DynamicContent/RevisionContent
+    # URLs pointing at it; unreferenced blobs are removed by gc_media_blobs
+    # once last_used_at (bumped whenever the blob is handed out) is old enough.
+    digest = models.CharField(max_length=64, primary_key=True)
+    name = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+    last_used_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return self.name
+
+
+class SearchDocument(models.Model):
+    # The search index entry of one subject, lesson or topic, with what search
+    # filters on copied in. title_terms/body_terms hold the normalised words
+    # (see search.py); on PostgreSQL a generated tsvector over them with a GIN
+    # index is added by migration 0007.
+    kind = models.CharField(max_length=10, choices=SearchKind.choices)
+    object_id = models.UUIDField()
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='search_documents')
+    academic_year = models.CharField(max_length=20, choices=AcademicYear.choices)
+    is_active = models.BooleanField(default=True)
+    title = models.CharField(max_length=255)
+    title_terms = models.TextField()
+    body_terms = models.TextField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='search_document_object_uniq'),
+        ]
+        indexes = [
+            models.Index(
+                fields=['academic_year'], condition=models.Q(is_active=True), name='search_active_year_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.title}"
@@ -0,0 +1,150 @@
+# content_management/packages.py
+#
+# Course packages: a zip of HTML pages and their assets with a manifest.json
+# at its root. Members are streamed out of the uploaded archive one block at
+# a time (it is never read into memory), written under
+# MEDIA_ROOT/packages/<id>/ by a thread pool and checked against the
+# manifest's digests. Each declared page then becomes a DYNAMIC content item,
+# all in one transaction.
+import hashlib
+import json
+import os
+import shutil
+import stat
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from rest_framework import serializers
+
+from .models import BaseContent, ContentType, DynamicContent
+from .serializers import PackageManifestSerializer
+
+PACKAGES_FOLDER = 'packages'
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_MAX_SIZE = 1024 * 1024
+COPY_BLOCK_SIZE = 1024 * 1024
+
+package_storage = FileSystemStorage()
+
+
+def invalid(message):
+    return serializers.ValidationError({"file": message})
+
+
+def check_member(info):
+    # Nothing in the archive may land outside the package directory
+    name = info.filename
+    if name.startswith('/') or '\\' in name or ':' in name or any(
+        part in ('', '.', '..') for part in name.split('/')
+    ):
+        raise invalid(f"Unsafe path in package: {name!r}.")
+    if stat.S_ISLNK(info.external_attr >> 16):
+        raise invalid(f"Symbolic links are not allowed: {name!r}.")
+    if info.flag_bits & 0x1:
+        raise invalid(f"Encrypted files are not supported: {name!r}.")
+
+
+def read_manifest(archive):
+    try:
+        info = archive.getinfo(MANIFEST_NAME)
+    except KeyError:
+        raise invalid(f"The package has no {MANIFEST_NAME}.")
+    if info.file_size > MANIFEST_MAX_SIZE:
+        raise invalid(f"{MANIFEST_NAME} is larger than {MANIFEST_MAX_SIZE} bytes.")
+    try:
+        data = json.loads(archive.read(info))
+    except ValueError:
+        raise invalid(f"{MANIFEST_NAME} is not valid JSON.")
+    serializer = PackageManifestSerializer(data=data)
+    if not serializer.is_valid():
+        raise serializers.ValidationError({"manifest": serializer.errors})
+    return serializer.validated_data
+
+
+def list_members(archive, manifest):
+    # The archive must hold exactly the files the manifest lists. The sizes
+    # checked here are the ones zipfile stops reading at, so a crafted
+    # archive can't inflate past them while extracting.
+    members = {}
+    for info in archive.infolist():
+        if info.is_dir() or info.filename == MANIFEST_NAME:
+            continue
+        check_member(info)
+        if info.filename in members:
+            raise invalid(f"{info.filename!r} appears twice in the package.")
+        members[info.filename] = info
+
+    unlisted = sorted(members.keys() - manifest['files'].keys())
+    if unlisted:
+        raise invalid(f"Files not listed in the manifest: {', '.join(unlisted[:20])}")
+    missing = sorted(manifest['files'].keys() - members.keys())
+    if missing:
+        raise invalid(f"Files missing from the package: {', '.join(missing[:20])}")
+    if len(members) > settings.CONTENT_PACKAGE_MAX_FILES:
+        raise invalid(f"A package may hold at most {settings.CONTENT_PACKAGE_MAX_FILES} files.")
+    if sum(info.file_size for info in members.values()) > settings.CONTENT_PACKAGE_MAX_SIZE:
+        raise invalid(f"A package may unpack to at most {settings.CONTENT_PACKAGE_MAX_SIZE} bytes.")
+    return list(members.values())
+
+
+def extract_member(archive, info, directory, digest):
+    target = os.path.join(directory, *info.filename.split('/'))
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    sha256 = hashlib.sha256()
+    try:
+        # ZipFile serialises reads of the archive between threads; the
+        # inflating, hashing and writing run in parallel
+        with archive.open(info) as source, open(target, 'wb') as out:
+            for block in iter(lambda: source.read(COPY_BLOCK_SIZE), b''):
+                sha256.update(block)
+                out.write(block)
+    except zipfile.BadZipFile as error:
+        raise invalid(f"{info.filename!r} is corrupt: {error}")
+    if sha256.hexdigest() != digest:
+        raise invalid(f"{info.filename!r} does not match its digest in the manifest.")
+
+
+def ingest_package(upload, lesson, learning_type):
+    # Returns the created BaseContent rows, one per manifest page
+    package_name = f'{PACKAGES_FOLDER}/{uuid.uuid4()}'
+    staging = package_storage.path(f'{package_name}.part')
+    directory = package_storage.path(package_name)
+
+    try:
+        with zipfile.ZipFile(upload) as archive:
+            manifest = read_manifest(archive)
+            members = list_members(archive, manifest)
+            os.makedirs(staging)
+            with ThreadPoolExecutor(settings.CONTENT_PACKAGE_WORKERS) as pool:
+                list(pool.map(
+                    lambda info: extract_member(archive, info, staging, manifest['files'][info.filename]),
+                    members,
+                ))
+        os.replace(staging, directory)
+    except zipfile.BadZipFile:
+        raise invalid("The file is not a zip archive.")
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    try:
+        with transaction.atomic():
+            contents = []
+            for page in manifest['pages']:
+                base_content = BaseContent.objects.create(
+                    lesson=lesson,
+                    learning_type=page.get('learning_type', learning_type),
+                    content_type=ContentType.DYNAMIC,
+                    description=page['description'],
+                )
+                DynamicContent.objects.create(
+                    base_content=base_content, url=package_storage.url(f"{package_name}/{page['path']}")
+                )
+                contents.append(base_content)
+    except Exception:
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+    return contents
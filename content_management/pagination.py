@@ -0,0 +1,143 @@
+# content_management/pagination.py
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over a unique, fully ordered key such as ``(order, id)``.
+
+    The cursor stores the key of the last (or first) row on the page, and the
+    next page is fetched with ``WHERE key > cursor ORDER BY key LIMIT n``. With
+    an index on the key every page costs the same, however deep the client
+    pages. This differs from DRF's CursorPagination, which only seeks on the
+    first field and uses an OFFSET to break ties.
+    """
+    ordering = ('created_at', 'id')
+    page_size = api_settings.PAGE_SIZE or 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.prepare(request, queryset.model)
+        return self.paginate_rows(list(self.get_page_queryset(queryset)))
+
+    def prepare(self, request, model):
+        # Split out of paginate_queryset so callers that evaluate the page
+        # queryset themselves (e.g. with the async ORM) can reuse the rest
+        self.request = request
+        self.model = model
+        self.page_size = self.get_page_size(request)
+        self.position, self.reverse = self.decode_cursor(request)
+
+    def get_page_queryset(self, queryset):
+        if self.position is not None:
+            queryset = queryset.filter(self.build_seek_filter(self.ordering, self.position, self.reverse))
+        ordering = [f'-{field}' if self.reverse else field for field in self.ordering]
+        # One extra row tells us whether there is another page
+        return queryset.order_by(*ordering)[:self.page_size + 1]
+
+    def paginate_rows(self, rows):
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = self.position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.position is not None
+        self.page = rows
+        return rows
+
+    def build_seek_filter(self, fields, values, reverse):
+        # (a, b) > (x, y) written as a >= x AND (a > x OR b > y), which keeps a
+        # range condition on the leading column for the index to seek on
+        field, value = fields[0], values[0]
+        strict, loose = ('lt', 'lte') if reverse else ('gt', 'gte')
+        if len(fields) == 1:
+            return Q(**{f'{field}__{strict}': value})
+        rest = self.build_seek_filter(fields[1:], values[1:], reverse)
+        return Q(**{f'{field}__{loose}': value}) & (Q(**{f'{field}__{strict}': value}) | rest)
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                return _positive_int(
+                    request.query_params[self.page_size_query_param],
+                    strict=True,
+                    cutoff=self.max_page_size
+                )
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            values = payload['p']
+            if len(values) != len(self.ordering):
+                raise ValueError
+            position = tuple(
+                self.model._meta.get_field(field).to_python(value)
+                for field, value in zip(self.ordering, values)
+            )
+            return position, bool(payload.get('r', False))
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError, binascii.Error, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, instance, reverse):
+        values = []
+        for field in self.ordering:
+            value = getattr(instance, field)
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else str(value))
+        payload = {'p': values}
+        if reverse:
+            payload['r'] = True
+        encoded = base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode('ascii'))
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, encoded.decode('ascii'))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class LessonPagination(KeysetPagination):
+    ordering = ('order', 'id')
@@ -0,0 +1,228 @@
+# content_management/search.py
+#
+# Full-text search over subjects, lessons and topics. Every row has a
+# SearchDocument holding its words after Arabic-aware normalisation and light
+# stemming, so "الرياضيات", "رياضيات" and "الرّياضيّات" all index as the same
+# term. PostgreSQL matches and ranks those terms through the GIN-indexed
+# tsvector added by migration 0007 (the 'simple' configuration: the language
+# work is already done here). Other databases, SQLite in tests, fall back to
+# an inverted index built in process per academic year.
+import bisect
+import re
+import threading
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+
+from .cache import content_cache
+from .models import Lesson, SearchDocument, SearchKind, Subject, Topic
+
+# Matches PostgreSQL's default ts_rank weights for A (title) and B (body)
+TITLE_WEIGHT = 1.0
+BODY_WEIGHT = 0.4
+REINDEX_BATCH_SIZE = 1000
+
+WORD = re.compile(r'\w+')
+ARABIC_LETTERS = re.compile(r'[\u0621-\u064a]')
+# Harakat, Quranic marks and the tatweel
+ARABIC_MARKS = re.compile(r'[\u0610-\u061a\u0640\u064b-\u065f\u0670\u06d6-\u06ed]')
+ARABIC_FOLDING = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي', 'ئ': 'ي', 'ؤ': 'و', 'ة': 'ه',
+    **{chr(0x0660 + digit): str(digit) for digit in range(10)},
+    **{chr(0x06f0 + digit): str(digit) for digit in range(10)},
+})
+# Light stemming in the style of Larkey's light10: the definite article and
+# its conjunction/preposition forms, then the common plural and pronoun suffixes
+ARABIC_PREFIXES = ('وال', 'بال', 'كال', 'فال', 'لل', 'ال')
+ARABIC_SUFFIXES = ('ها', 'ان', 'ات', 'ون', 'ين', 'يه', 'ه', 'ي')
+
+
+def stem(word):
+    if not ARABIC_LETTERS.match(word):
+        return word
+    for prefix in ARABIC_PREFIXES:
+        if word.startswith(prefix) and len(word) - len(prefix) >= 2:
+            word = word[len(prefix):]
+            break
+    for suffix in ARABIC_SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 2:
+            word = word[:-len(suffix)]
+    return word
+
+
+def terms(text):
+    text = ARABIC_MARKS.sub('', text.casefold()).translate(ARABIC_FOLDING)
+    return [stem(word) for word in WORD.findall(text)]
+
+
+# Index maintenance. Rows are re-read and upserted in batches; callers
+# schedule it after commit like the snapshot refreshes.
+
+def _document(kind, instance, subject, text, is_active):
+    return SearchDocument(
+        kind=kind, object_id=instance.pk, subject=subject,
+        academic_year=subject.academic_year, is_active=is_active,
+        title=text[0][:255],
+        title_terms=' '.join(terms(text[0])), body_terms=' '.join(terms(text[1])),
+    )
+
+
+def _documents(kind, ids):
+    if kind == SearchKind.SUBJECT:
+        for subject in Subject.objects.filter(pk__in=ids):
+            yield _document(kind, subject, subject, (subject.name, subject.description), subject.is_active)
+    elif kind == SearchKind.LESSON:
+        for lesson in Lesson.objects.filter(pk__in=ids).select_related('subject'):
+            yield _document(
+                kind, lesson, lesson.subject, (lesson.title, lesson.description),
+                lesson.is_active and lesson.subject.is_active,
+            )
+    else:
+        for topic in Topic.objects.filter(pk__in=ids).select_related('subject'):
+            yield _document(kind, topic, topic.subject, (topic.name, topic.description), topic.subject.is_active)
+
+
+def reindex(kind, ids):
+    ids = list(ids)
+    for start in range(0, len(ids), REINDEX_BATCH_SIZE):
+        batch = ids[start:start + REINDEX_BATCH_SIZE]
+        with transaction.atomic():
+            stale = SearchDocument.objects.filter(kind=kind, object_id__in=batch)
+            years = set(stale.values_list('academic_year', flat=True))
+            documents = list(_documents(kind, batch))
+            years.update(document.academic_year for document in documents)
+            # Rows that are gone take their documents with them
+            stale.exclude(object_id__in=[document.object_id for document in documents]).delete()
+            SearchDocument.objects.bulk_create(
+                documents, update_conflicts=True, unique_fields=['kind', 'object_id'],
+                update_fields=['subject', 'academic_year', 'is_active', 'title', 'title_terms', 'body_terms', 'updated_at'],
+            )
+            transaction.on_commit(lambda years=years: [content_cache.bump('search', year) for year in years])
+
+
+def reindex_subject(subject_id):
+    # A subject's year and is_active are copied into its lessons' and topics'
+    # documents, so they're refreshed with it. A deleted subject's documents
+    # have already gone with it in the cascade.
+    reindex(SearchKind.SUBJECT, [subject_id])
+    reindex(SearchKind.LESSON, Lesson.objects.filter(subject_id=subject_id).values_list('pk', flat=True))
+    reindex(SearchKind.TOPIC, Topic.objects.filter(subject_id=subject_id).values_list('pk', flat=True))
+
+
+def schedule(refresh, *args):
+    if all(arg is not None for arg in args):
+        transaction.on_commit(lambda: refresh(*args))
+
+
+# Querying
+
+def search(academic_year, query, kinds=None, limit=20):
+    # Returns ranked {kind, id, subject_id, title, rank} dicts. Every word
+    # must match; the last one also matches as a prefix, for type-ahead.
+    words = terms(query)
+    if not words:
+        return []
+    if connection.vendor == 'postgresql':
+        return _search_postgres(academic_year, words, kinds, limit)
+    return _search_in_process(academic_year, words, kinds, limit)
+
+
+def _search_postgres(academic_year, words, kinds, limit):
+    tsquery = ' & '.join([f"'{word}'" for word in words[:-1]] + [f"'{words[-1]}':*"])
+    documents = SearchDocument.objects.filter(academic_year=academic_year, is_active=True)
+    if kinds:
+        documents = documents.filter(kind__in=kinds)
+    documents = documents.filter(
+        RawSQL("search_vector @@ to_tsquery('simple', %s)", [tsquery], output_field=BooleanField())
+    ).annotate(
+        rank=RawSQL("ts_rank(search_vector, to_tsquery('simple', %s))", [tsquery], output_field=FloatField())
+    ).order_by('-rank', 'title', 'id')[:limit]
+    return [
+        {
+            'kind': document.kind, 'id': document.object_id, 'subject_id': document.subject_id,
+            'title': document.title, 'rank': round(document.rank, 6),
+        }
+        for document in documents
+    ]
+
+
+class InvertedIndex:
+    """
+    term -> {document number: weight} over the active documents of one
+    academic year, with the terms kept sorted for prefix lookups.
+    """
+
+    def __init__(self, documents):
+        self.documents = []
+        self.postings = defaultdict(dict)
+        for document in documents:
+            number = len(self.documents)
+            self.documents.append({field: document[field] for field in ('kind', 'object_id', 'subject_id', 'title')})
+            for field, weight in (('title_terms', TITLE_WEIGHT), ('body_terms', BODY_WEIGHT)):
+                for term in document[field].split():
+                    postings = self.postings[term]
+                    postings[number] = postings.get(number, 0.0) + weight
+        self.terms = sorted(self.postings)
+
+    def matches(self, word, prefix=False):
+        if not prefix:
+            return self.postings.get(word, {})
+        scores = defaultdict(float)
+        for term in self.terms[bisect.bisect_left(self.terms, word):]:
+            if not term.startswith(word):
+                break
+            for number, weight in self.postings[term].items():
+                scores[number] += weight
+        return scores
+
+    def search(self, words, kinds, limit):
+        scores = None
+        for index, word in enumerate(words):
+            matches = self.matches(word, prefix=index == len(words) - 1)
+            if scores is None:
+                scores = dict(matches)
+            else:
+                scores = {number: score + matches[number] for number, score in scores.items() if number in matches}
+            if not scores:
+                return []
+        results = [
+            {**self.documents[number], 'rank': round(score, 6)}
+            for number, score in scores.items()
+            if not kinds or self.documents[number]['kind'] in kinds
+        ]
+        results.sort(key=lambda result: (-result['rank'], result['title'], str(result['object_id'])))
+        return [
+            {
+                'kind': result['kind'], 'id': result['object_id'], 'subject_id': result['subject_id'],
+                'title': result['title'], 'rank': result['rank'],
+            }
+            for result in results[:limit]
+        ]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(academic_year):
+    # One index per year and process, rebuilt when the year's search scope is bumped
+    version = content_cache.get_version('search', academic_year)
+    with _indexes_lock:
+        cached = _indexes.get(academic_year)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+    index = InvertedIndex(
+        SearchDocument.objects.filter(academic_year=academic_year, is_active=True).values(
+            'kind', 'object_id', 'subject_id', 'title', 'title_terms', 'body_terms'
+        ).iterator()
+    )
+    with _indexes_lock:
+        _indexes[academic_year] = (version, index)
+    return index
+
+
+def _search_in_process(academic_year, words, kinds, limit):
+    return get_index(academic_year).search(words, kinds, limit)
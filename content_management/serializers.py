@@ -1,5 +1,10 @@
+import re
+from django.conf import settings
 from rest_framework import serializers
-from .models import Subject, Lesson, Topic, BaseContent, VideoContent, DynamicContent, RevisionContent
+from .models import (
+    Subject, Lesson, Topic, BaseContent, VideoContent, DynamicContent, RevisionContent, UploadSession,
+    ContentType, LearningType, SearchKind,
+)
 
 # Subject Serializer
 class SubjectSerializer(serializers.ModelSerializer):
@@ -31,6 +36,29 @@ class TopicSerializer(serializers.ModelSerializer):
         ]
 
 
+# Topic listing entry, with the number of revision items under the topic
+class TopicListSerializer(TopicSerializer):
+    revision_count = serializers.IntegerField(read_only=True)
+
+    class Meta(TopicSerializer.Meta):
+        fields = TopicSerializer.Meta.fields + ['revision_count']
+
+
+# Items of the bulk upsert endpoints. Uniqueness and the subject reference
+# are checked once for the whole batch (see bulk.py), not per item.
+class SubjectBulkSerializer(SubjectSerializer):
+    class Meta(SubjectSerializer.Meta):
+        extra_kwargs = {'code': {'validators': []}}
+
+
+class LessonBulkSerializer(LessonSerializer):
+    subject = serializers.UUIDField(source='subject_id')
+
+
+class TopicBulkSerializer(TopicSerializer):
+    subject = serializers.UUIDField(source='subject_id')
+
+
 # VideoContent Serializer
 class VideoContentSerializer(serializers.ModelSerializer):
     base_content_id = serializers.PrimaryKeyRelatedField(
@@ -40,7 +68,15 @@ class VideoContentSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = VideoContent
-        fields = ['id', 'base_content', 'base_content_id', 'url']
+        fields = [
+            'id', 'base_content', 'base_content_id', 'url',
+            'duration', 'width', 'height', 'bitrate',
+            'poster_url', 'thumbnails_url', 'processing_status'
+        ]
+        read_only_fields = [
+            'duration', 'width', 'height', 'bitrate',
+            'poster_url', 'thumbnails_url', 'processing_status'
+        ]
 
 
 # DynamicContent Serializer
@@ -106,6 +142,19 @@ class ContentSerializer(serializers.ModelSerializer):
         return instance
 
 
+# Read-only BaseContent Serializer for listings
+# Reads the reverse one-to-ones directly, so the queryset must select_related them
+class ContentListSerializer(ContentSerializer):
+    video_contents = VideoContentSerializer(source='video_content', read_only=True)
+    dynamic_contents = DynamicContentSerializer(source='dynamic_content', read_only=True)
+
+    def to_representation(self, instance):
+        # Only the payload that matches content_type is sent
+        data = super().to_representation(instance)
+        data.pop('dynamic_contents' if instance.content_type == ContentType.VIDEO else 'video_contents', None)
+        return data
+
+
 # RevisionContent Serializer
 class RevisionContentSerializer(serializers.ModelSerializer):
     topic_id = serializers.PrimaryKeyRelatedField(
@@ -119,3 +168,93 @@ class RevisionContentSerializer(serializers.ModelSerializer):
             'id', 'topic', 'topic_id', 'video_url', 
             'created_at', 'updated_at'
         ]
+
+
+# Serializers for the curriculum tree snapshot
+class TreeRevisionContentSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RevisionContent
+        fields = ['id', 'video_url', 'created_at', 'updated_at']
+
+
+class TreeTopicSerializer(TopicSerializer):
+    revision_contents = TreeRevisionContentSerializer(source='revisioncontent_set', many=True, read_only=True)
+
+    class Meta(TopicSerializer.Meta):
+        fields = TopicSerializer.Meta.fields + ['revision_contents']
+
+
+class TreeLessonSerializer(LessonSerializer):
+    contents = ContentListSerializer(source='basecontent_set', many=True, read_only=True)
+
+    class Meta(LessonSerializer.Meta):
+        fields = LessonSerializer.Meta.fields + ['contents']
+
+
+# Chunked UploadSession Serializer
+class UploadSessionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UploadSession
+        fields = [
+            'id', 'kind', 'filename', 'size', 'checksum', 'received',
+            'status', 'metadata', 'created_at', 'updated_at'
+        ]
+        read_only_fields = ['received', 'status', 'created_at', 'updated_at']
+
+    def validate_size(self, value):
+        if value <= 0 or value > settings.CHUNKED_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(f"Size must be between 1 and {settings.CHUNKED_UPLOAD_MAX_SIZE} bytes.")
+        return value
+
+    def validate_checksum(self, value):
+        value = value.lower()
+        if not re.fullmatch(r'[0-9a-f]{64}', value):
+            raise serializers.ValidationError("Checksum must be a hex SHA-256 digest.")
+        return value
+
+
+# Course package upload and the manifest.json inside the package
+class PackageUploadSerializer(serializers.Serializer):
+    lesson = serializers.PrimaryKeyRelatedField(queryset=Lesson.objects.all())
+    learning_type = serializers.ChoiceField(choices=LearningType.choices)
+    file = serializers.FileField()
+
+
+class PackagePageSerializer(serializers.Serializer):
+    path = serializers.CharField()
+    description = serializers.CharField()
+    learning_type = serializers.ChoiceField(choices=LearningType.choices, required=False)
+
+
+class PackageManifestSerializer(serializers.Serializer):
+    pages = PackagePageSerializer(many=True, allow_empty=False)
+    # Every file in the package, relative path -> SHA-256
+    files = serializers.DictField(child=serializers.RegexField(r'^[0-9a-fA-F]{64}$'), allow_empty=False)
+
+    def validate(self, data):
+        data['files'] = {path: digest.lower() for path, digest in data['files'].items()}
+        missing = [page['path'] for page in data['pages'] if page['path'] not in data['files']]
+        if missing:
+            raise serializers.ValidationError({"pages": f"Pages not listed in files: {', '.join(missing)}"})
+        return data
+
+
+# Query parameters of the search endpoint
+class SearchQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=200)
+    kind = serializers.ListField(child=serializers.ChoiceField(choices=SearchKind.choices), required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=20)
+
+
+# Media file to issue a signed URL for, given by its URL or MEDIA_ROOT path
+class MediaTokenSerializer(serializers.Serializer):
+    url = serializers.CharField(max_length=1024)
+
+    def validate(self, data):
+        path = data['url'].split('?', 1)[0]
+        if not path.startswith(settings.MEDIA_URL):
+            raise serializers.ValidationError({"url": f"Must start with {settings.MEDIA_URL}."})
+        path = path[len(settings.MEDIA_URL):]
+        if not path or path.startswith('/') or '..' in path.split('/'):
+            raise serializers.ValidationError({"url": "Not a media file URL."})
+        return {'path': path}
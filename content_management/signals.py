@@ -0,0 +1,187 @@
+# content_management/signals.py
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import feeds, search, snapshots, video_processing
+from .cache import content_cache
+from .storage import change_ref_counts
+from .models import (
+    BaseContent, DynamicContent, Lesson, RevisionContent, SearchKind, Subject, Topic, VideoContent
+)
+
+
+def bump_scopes(*scopes):
+    # Bump after commit so a concurrent reader can't cache the pre-commit rows
+    # under the new version
+    scopes = {scope for scope in scopes if scope[1] is not None}
+    transaction.on_commit(lambda: [content_cache.bump(*scope) for scope in scopes])
+
+
+def _remember_previous(instance, *fields):
+    # Keep the stored values of `fields` so moving a row also invalidates the
+    # scope it was moved out of
+    previous = None
+    if not instance._state.adding:
+        previous = type(instance).objects.filter(pk=instance.pk).values(*fields).first()
+    for field in fields:
+        setattr(instance, f'_previous_{field}', previous[field] if previous else None)
+
+
+def _previous(instance, field):
+    return getattr(instance, f'_previous_{field}', None)
+
+
+@receiver(pre_save, sender=Subject)
+def remember_subject_year(sender, instance, **kwargs):
+    _remember_previous(instance, 'academic_year')
+
+
+@receiver(pre_save, sender=Lesson)
+def remember_lesson_subject(sender, instance, **kwargs):
+    _remember_previous(instance, 'subject_id', 'is_active')
+
+
+@receiver(pre_save, sender=Topic)
+def remember_subject(sender, instance, **kwargs):
+    _remember_previous(instance, 'subject_id')
+
+
+@receiver(pre_save, sender=BaseContent)
+def remember_lesson(sender, instance, **kwargs):
+    _remember_previous(instance, 'lesson_id')
+
+
+@receiver(pre_save, sender=RevisionContent)
+def remember_topic(sender, instance, **kwargs):
+    _remember_previous(instance, 'topic_id', 'video_url')
+
+
+@receiver(pre_save, sender=VideoContent)
+@receiver(pre_save, sender=DynamicContent)
+def remember_url(sender, instance, **kwargs):
+    _remember_previous(instance, 'url')
+
+
+@receiver(post_save, sender=Subject)
+@receiver(post_delete, sender=Subject)
+def invalidate_subject(sender, instance, **kwargs):
+    bump_scopes(
+        ('year', instance.academic_year),
+        ('year', _previous(instance, 'academic_year')),
+        ('search', instance.academic_year),
+        ('topics', instance.pk),
+    )
+    snapshots.schedule(snapshots.refresh_subject_fields, instance.pk)
+    snapshots.schedule(feeds.refresh_subject, instance.pk)
+    search.schedule(search.reindex_subject, instance.pk)
+
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+def invalidate_lesson(sender, instance, **kwargs):
+    bump_scopes(
+        ('subject', instance.subject_id),
+        ('subject', _previous(instance, 'subject_id')),
+    )
+    snapshots.schedule(snapshots.refresh_lesson, instance.subject_id, instance.pk)
+    snapshots.schedule(snapshots.refresh_lesson, _previous(instance, 'subject_id'), instance.pk)
+    if (
+        kwargs['signal'] is post_delete
+        or _previous(instance, 'subject_id') != instance.subject_id
+        or _previous(instance, 'is_active') != instance.is_active
+    ):
+        # The feeds carry the subject's year and whether the lesson is shown,
+        # so rebuild them (or drop them from the cache) when either changes
+        snapshots.schedule(feeds.rebuild_lesson, instance.pk)
+    search.schedule(search.reindex, SearchKind.LESSON, [instance.pk])
+
+
+@receiver(post_save, sender=BaseContent)
+@receiver(post_delete, sender=BaseContent)
+def invalidate_content(sender, instance, **kwargs):
+    bump_scopes(
+        ('lesson', instance.lesson_id),
+        ('lesson', _previous(instance, 'lesson_id')),
+    )
+    snapshots.schedule(snapshots.refresh_lesson_of, instance.lesson_id)
+    snapshots.schedule(snapshots.refresh_lesson_of, _previous(instance, 'lesson_id'))
+    snapshots.schedule(feeds.rebuild_lesson, instance.lesson_id)
+    snapshots.schedule(feeds.rebuild_lesson, _previous(instance, 'lesson_id'))
+
+
+@receiver(post_save, sender=VideoContent)
+@receiver(post_save, sender=DynamicContent)
+@receiver(post_delete, sender=VideoContent)
+@receiver(post_delete, sender=DynamicContent)
+def touch_base_content(sender, instance, **kwargs):
+    # Video/dynamic rows have no updated_at of their own; stamp the parent so
+    # the lesson's ETag and Last-Modified move with them
+    base_contents = BaseContent.objects.filter(pk=instance.base_content_id)
+    lesson_id = base_contents.values_list('lesson_id', flat=True).first()
+    base_contents.update(updated_at=timezone.now())
+    bump_scopes(('lesson', lesson_id))
+    snapshots.schedule(snapshots.refresh_lesson_of, lesson_id)
+    snapshots.schedule(feeds.rebuild_lesson, lesson_id)
+
+
+@receiver(post_save, sender=Topic)
+@receiver(post_delete, sender=Topic)
+def invalidate_topic(sender, instance, **kwargs):
+    # Revision content embeds its topic, so a topic edit changes that list too
+    bump_scopes(
+        ('topic', instance.pk),
+        ('topics', instance.subject_id),
+        ('topics', _previous(instance, 'subject_id')),
+    )
+    snapshots.schedule(snapshots.refresh_topic, instance.subject_id, instance.pk)
+    snapshots.schedule(snapshots.refresh_topic, _previous(instance, 'subject_id'), instance.pk)
+    search.schedule(search.reindex, SearchKind.TOPIC, [instance.pk])
+
+
+@receiver(post_save, sender=RevisionContent)
+@receiver(post_delete, sender=RevisionContent)
+def invalidate_revision_content(sender, instance, **kwargs):
+    topic_ids = {instance.topic_id, _previous(instance, 'topic_id')}
+    subject_ids = Topic.objects.filter(pk__in=topic_ids).values_list('subject_id', flat=True)
+    bump_scopes(
+        ('topic', instance.topic_id),
+        ('topic', _previous(instance, 'topic_id')),
+        *(('topics', subject_id) for subject_id in subject_ids),
+    )
+    snapshots.schedule(snapshots.refresh_topic_of, instance.topic_id)
+    snapshots.schedule(snapshots.refresh_topic_of, _previous(instance, 'topic_id'))
+
+
+# Reference counts of content-addressed media blobs, kept in the same
+# transaction as the row that points at them
+
+@receiver(post_save, sender=VideoContent)
+@receiver(post_save, sender=DynamicContent)
+def count_url_reference(sender, instance, **kwargs):
+    change_ref_counts(added=instance.url, removed=_previous(instance, 'url'))
+
+
+@receiver(post_delete, sender=VideoContent)
+@receiver(post_delete, sender=DynamicContent)
+def release_url_reference(sender, instance, **kwargs):
+    change_ref_counts(removed=instance.url)
+
+
+@receiver(post_save, sender=RevisionContent)
+def count_video_url_reference(sender, instance, **kwargs):
+    change_ref_counts(added=instance.video_url, removed=_previous(instance, 'video_url'))
+
+
+@receiver(post_delete, sender=RevisionContent)
+def release_video_url_reference(sender, instance, **kwargs):
+    change_ref_counts(removed=instance.video_url)
+
+
+@receiver(post_save, sender=VideoContent)
+def queue_video_processing(sender, instance, created, **kwargs):
+    # Probe and render posters off the request, once the row is committed
+    if created and settings.VIDEO_PROCESSING_ENABLED:
+        transaction.on_commit(lambda: video_processing.enqueue(instance.pk))
@@ -0,0 +1,127 @@
+# content_management/snapshots.py
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Prefetch
+
+from .cache import content_cache
+from .models import BaseContent, CurriculumSnapshot, Lesson, RevisionContent, Subject, Topic
+from .serializers import SubjectSerializer, TreeLessonSerializer, TreeTopicSerializer
+
+
+def _plain(data):
+    # Normalise UUIDs, datetimes and ReturnDicts to what the JSONField stores
+    return json.loads(json.dumps(data, cls=DjangoJSONEncoder))
+
+
+def _lessons(subject_id):
+    contents = BaseContent.objects.select_related('video_content', 'dynamic_content').order_by('created_at', 'id')
+    return Lesson.objects.filter(subject_id=subject_id, is_active=True).prefetch_related(
+        Prefetch('basecontent_set', queryset=contents)
+    ).order_by('order', 'id')
+
+
+def _topics(subject_id):
+    revision_contents = RevisionContent.objects.order_by('created_at', 'id')
+    return Topic.objects.filter(subject_id=subject_id).prefetch_related(
+        Prefetch('revisioncontent_set', queryset=revision_contents)
+    ).order_by('created_at', 'id')
+
+
+def build_tree(subject):
+    tree = SubjectSerializer(subject).data
+    tree['lessons'] = TreeLessonSerializer(_lessons(subject.pk), many=True).data
+    tree['topics'] = TreeTopicSerializer(_topics(subject.pk), many=True).data
+    return _plain(tree)
+
+
+def _bump(subject_id):
+    # After commit, so no process caches the tree again from the old rows
+    transaction.on_commit(lambda: content_cache.bump('tree', subject_id))
+
+
+def _save(subject_id, tree):
+    CurriculumSnapshot.objects.update_or_create(subject_id=subject_id, defaults={'tree': tree})
+    _bump(subject_id)
+    return tree
+
+
+def rebuild_subject(subject_id):
+    subject = Subject.objects.filter(pk=subject_id).first()
+    if subject is None:
+        _bump(subject_id)
+        return None
+    return _save(subject_id, build_tree(subject))
+
+
+def _patch(subject_id, patcher):
+    # Patch one branch of a stored snapshot; without one, build it whole.
+    # The row lock keeps concurrent patches to different branches from
+    # overwriting each other.
+    with transaction.atomic():
+        snapshot = CurriculumSnapshot.objects.select_for_update().filter(subject_id=subject_id).first()
+        if snapshot is None:
+            return rebuild_subject(subject_id)
+        patcher(snapshot.tree)
+        return _save(subject_id, snapshot.tree)
+
+
+def _replace_node(nodes, node_id, node, sort_key):
+    nodes[:] = [existing for existing in nodes if existing['id'] != str(node_id)]
+    if node is not None:
+        nodes.append(node)
+        nodes.sort(key=sort_key)
+
+
+def refresh_subject_fields(subject_id):
+    subject = Subject.objects.filter(pk=subject_id).first()
+    if subject is None:
+        _bump(subject_id)
+        return None
+    return _patch(subject_id, lambda tree: tree.update(_plain(SubjectSerializer(subject).data)))
+
+
+def refresh_lesson(subject_id, lesson_id):
+    lesson = _lessons(subject_id).filter(pk=lesson_id).first()
+    node = _plain(TreeLessonSerializer(lesson).data) if lesson else None
+    return _patch(subject_id, lambda tree: _replace_node(
+        tree['lessons'], lesson_id, node, lambda item: (item['order'], item['id'])
+    ))
+
+
+def refresh_topic(subject_id, topic_id):
+    topic = _topics(subject_id).filter(pk=topic_id).first()
+    node = _plain(TreeTopicSerializer(topic).data) if topic else None
+    return _patch(subject_id, lambda tree: _replace_node(
+        tree['topics'], topic_id, node, lambda item: (item['created_at'], item['id'])
+    ))
+
+
+def refresh_lesson_of(lesson_id):
+    subject_id = Lesson.objects.filter(pk=lesson_id).values_list('subject_id', flat=True).first()
+    if subject_id is not None:
+        refresh_lesson(subject_id, lesson_id)
+
+
+def refresh_topic_of(topic_id):
+    subject_id = Topic.objects.filter(pk=topic_id).values_list('subject_id', flat=True).first()
+    if subject_id is not None:
+        refresh_topic(subject_id, topic_id)
+
+
+def get_tree(subject_id):
+    snapshot = CurriculumSnapshot.objects.filter(subject_id=subject_id).values_list('tree', flat=True).first()
+    if snapshot is not None:
+        return snapshot
+    return rebuild_subject(subject_id)
+
+
+def get_cached_tree(subject_id):
+    return content_cache.get_or_set('tree', subject_id, 'tree', lambda: get_tree(subject_id))
+
+
+def schedule(refresh, *args):
+    # Patch after commit so the snapshot is rebuilt from committed rows
+    if all(arg is not None for arg in args):
+        transaction.on_commit(lambda: refresh(*args))
@@ -0,0 +1,164 @@
+# content_management/storage.py
+import hashlib
+import os
+import re
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from django.db.models import F
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from .models import MediaBlob
+
+BLOBS_FOLDER = 'blobs'
+
+# <MEDIA_URL>blobs/ab/cd/<sha256><ext>
+BLOB_URL_DIGEST = re.compile(r'/%s/[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})' % BLOBS_FOLDER)
+
+
+class HashingUploadMixin:
+    # Hash an upload while Django streams it in, so storing it needs no
+    # second pass over the bytes
+    def new_file(self, *args, **kwargs):
+        self.sha256 = hashlib.sha256()
+        return super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.sha256.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.sha256 = self.sha256.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(HashingUploadMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(HashingUploadMixin, TemporaryFileUploadHandler):
+    pass
+
+
+class LocalFile(File):
+    """
+    A file that already sits on local disk. FileSystemStorage moves it into
+    place (a rename on the same filesystem) instead of copying its bytes.
+    """
+
+    def __init__(self, path, name, sha256=None):
+        super().__init__(open(path, 'rb'), name=name)
+        self.path = path
+        self.sha256 = sha256
+
+    def temporary_file_path(self):
+        return self.path
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores every distinct file once, under MEDIA_ROOT/blobs and named by its
+    SHA-256. Saving a file whose bytes are already stored returns the
+    existing name without writing anything. MediaBlob keeps one row per
+    stored file with the number of content rows that point at it.
+    """
+
+    @cached_property
+    def base_location(self):
+        return self._value_or_setting(self._location, os.path.join(settings.MEDIA_ROOT, BLOBS_FOLDER))
+
+    @cached_property
+    def base_url(self):
+        return self._value_or_setting(self._base_url, f'{settings.MEDIA_URL}{BLOBS_FOLDER}/')
+
+    def get_available_name(self, name, max_length=None):
+        # The final name comes from the digest in _save()
+        return name
+
+    def blob_name(self, digest, name):
+        extension = os.path.splitext(name)[1].lower()[:16]
+        return f'{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+    def _save(self, name, content):
+        digest = getattr(content, 'sha256', None)
+        staged = None
+        if not (digest and hasattr(content, 'temporary_file_path')):
+            digest, staged = self._stage(content)
+
+        blob = MediaBlob.objects.filter(digest=digest).first()
+        if blob is not None and touch_blob(digest) and self.exists(blob.name):
+            if staged:
+                os.remove(staged)
+            return blob.name
+
+        blob_name = self.blob_name(digest, name)
+        full_path = self.path(blob_name)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        if staged:
+            os.replace(staged, full_path)
+        else:
+            file_move_safe(content.temporary_file_path(), full_path, allow_overwrite=True)
+        if self.file_permissions_mode is not None:
+            os.chmod(full_path, self.file_permissions_mode)
+
+        MediaBlob.objects.update_or_create(
+            digest=digest,
+            defaults={'name': blob_name, 'size': os.path.getsize(full_path), 'last_used_at': timezone.now()},
+        )
+        return blob_name
+
+    def _stage(self, content):
+        # Copy into a temp file beside the blobs, hashing as the chunks pass
+        os.makedirs(self.location, exist_ok=True)
+        fd, staged = tempfile.mkstemp(dir=self.location, suffix='.part')
+        digest = hashlib.sha256()
+        with os.fdopen(fd, 'wb') as out:
+            for chunk in content.chunks():
+                digest.update(chunk)
+                out.write(chunk)
+        return digest.hexdigest(), staged
+
+
+blob_storage = ContentAddressedStorage()
+
+
+def save_media_file(file):
+    # Store (or reuse) the file's blob and return its public URL
+    return blob_storage.url(blob_storage.save(file.name, file))
+
+
+def blob_digest(url):
+    match = BLOB_URL_DIGEST.search(url or '')
+    return match.group(1) if match else None
+
+
+def touch_blob(digest):
+    # Handing out a blob restarts its grace period, so gc_media_blobs cannot
+    # delete it before the reference being saved to it is committed. False
+    # if the collector got there first (it holds the row lock while deleting).
+    return bool(MediaBlob.objects.filter(digest=digest).update(last_used_at=timezone.now()))
+
+
+def existing_blob_url(digest):
+    blob = MediaBlob.objects.filter(digest=digest).first()
+    if blob is not None and touch_blob(digest) and blob_storage.exists(blob.name):
+        return blob_storage.url(blob.name)
+    return None
+
+
+def change_ref_counts(added=None, removed=None):
+    # Adjust the reference counts for content URLs that point at blobs
+    added, removed = blob_digest(added), blob_digest(removed)
+    if added == removed:
+        return
+    if added:
+        MediaBlob.objects.filter(digest=added).update(ref_count=F('ref_count') + 1, last_used_at=timezone.now())
+    if removed:
+        MediaBlob.objects.filter(digest=removed, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
@@ -1,3 +1,1277 @@
-from django.test import TestCase
+import hashlib
+import importlib
+import io
+import json
+import os
+import re
+import subprocess
+import tempfile
+import uuid
+import zipfile
+from concurrent.futures import Future
+from datetime import timedelta
+from unittest import mock
+from urllib.parse import urlsplit
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver, reverse
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.test import APITestCase
+
+from users.models import StudentProfile
+from utils import metrics, profiling
+from . import snapshots, uploads, video_processing
+from .cache import content_cache
+from .storage import blob_digest, existing_blob_url, save_media_file
+from .models import (
+    Subject, Lesson, Topic, BaseContent, VideoContent, DynamicContent, RevisionContent,
+    AcademicYear, LearningType, ContentType, DifficultyLevel, CurriculumSnapshot, MediaBlob, UploadKind,
+    ProcessingStatus, SearchDocument, UploadSession, UploadStatus
+)
+
+
+class CurriculumTestMixin:
+    def create_student(self, academic_year=AcademicYear.PREP_1):
+        user = User.objects.create_user(username='student', password='secret123')
+        StudentProfile.objects.create(
+            user=user, academic_year=academic_year, learning_type=LearningType.VISUAL
+        )
+        return user
+
+    def create_subject(self, code='MATH-1', academic_year=AcademicYear.PREP_1):
+        return Subject.objects.create(
+            name='Mathematics', code=code, description='Algebra and geometry',
+            academic_year=academic_year,
+        )
+
+    def create_lesson(self, subject, order=1):
+        return Lesson.objects.create(
+            subject=subject, title=f'Lesson {order}', description='Lesson description',
+            order=order, duration=timedelta(minutes=30),
+        )
+
+    def create_contents(self, lesson, count):
+        for index in range(count):
+            content_type = ContentType.VIDEO if index % 2 == 0 else ContentType.DYNAMIC
+            base_content = BaseContent.objects.create(
+                lesson=lesson, learning_type=LearningType.VISUAL,
+                content_type=content_type, description=f'Item {index}',
+            )
+            if content_type == ContentType.VIDEO:
+                VideoContent.objects.create(base_content=base_content, url=f'/media/videos/{index}.mp4')
+            else:
+                DynamicContent.objects.create(base_content=base_content, url=f'/media/web_pages/{index}.html')
+
+
+class ContentCacheTests(CurriculumTestMixin, APITestCase):
+    def setUp(self):
+        content_cache.clear_local()
+        content_cache.shared.clear()
+        self.client.force_authenticate(self.create_student())
+        self.subject = self.create_subject()
+        self.lesson = self.create_lesson(self.subject)
+
+    def lesson_titles(self):
+        response = self.client.get(reverse('lesson-list', kwargs={'subject_id': self.subject.id}))
+        return [lesson['title'] for lesson in response.json()['results']]
+
+    def test_warm_hits_are_free_until_the_scope_is_bumped(self):
+        self.assertEqual(self.lesson_titles(), ['Lesson 1'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.lesson_titles(), ['Lesson 1'])
+
+        # The entry is still in this process's LRU; the new version skips it
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lesson.title = 'Fractions'
+            self.lesson.save()
+        self.assertEqual(self.lesson_titles(), ['Fractions'])
+
+        content_cache.get_or_set('test', 1, 'key', lambda: 'old')
+        content_cache.bump('test', 1)
+        self.assertEqual(content_cache.get_or_set('test', 1, 'key', lambda: 'new'), 'new')
+
+    def test_local_tier_evicts_the_least_recently_used(self):
+        self.assertEqual(content_cache.local.maxsize, settings.CMS_CACHE_LOCAL_MAXSIZE)
+        with mock.patch.object(content_cache.local, 'maxsize', 2):
+            for key in ('a', 'b'):
+                content_cache.get_or_set('test', 1, key, lambda key=key: key.upper())
+            content_cache.get_or_set('test', 1, 'a', lambda: 'unused')  # a is now the most recent
+            content_cache.get_or_set('test', 1, 'c', lambda: 'C')
+            self.assertEqual(len(content_cache.local), 2)
+
+        version = content_cache.get_version('test', 1)
+        local = {key: content_cache.local.get(content_cache._data_key('test', 1, version, key)) for key in 'abc'}
+        self.assertEqual(local, {'a': 'A', 'b': None, 'c': 'C'})
+        # Still in the shared tier, so no rebuild
+        self.assertEqual(content_cache.get_or_set('test', 1, 'b', lambda: 'rebuilt'), 'B')
+
+
+class LessonContentViewTests(CurriculumTestMixin, APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(self.create_student())
+        self.subject = self.create_subject()
+
+    def count_queries(self, lesson):
+        url = reverse('lesson-content-list', kwargs={'lesson_id': lesson.id})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'page_size': 200})
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.json()['results']
+
+    def test_query_count_does_not_grow_with_items(self):
+        small_lesson = self.create_lesson(self.subject, order=1)
+        self.create_contents(small_lesson, 3)
+        large_lesson = self.create_lesson(self.subject, order=2)
+        self.create_contents(large_lesson, 120)
+
+        small_queries, small_data = self.count_queries(small_lesson)
+        large_queries, large_data = self.count_queries(large_lesson)
+
+        self.assertEqual(len(small_data), 3)
+        self.assertEqual(len(large_data), 120)
+        # One aggregate for the ETag validators and one SELECT for the page
+        self.assertEqual(small_queries, large_queries)
+        self.assertEqual(large_queries, 2)
+
+    def test_items_carry_their_video_or_dynamic_payload(self):
+        lesson = self.create_lesson(self.subject)
+        self.create_contents(lesson, 2)
+
+        _, data = self.count_queries(lesson)
+
+        items = {item['content_type']: item for item in data}
+        video = items[ContentType.VIDEO]
+        self.assertEqual(video['video_contents']['url'], '/media/videos/0.mp4')
+        self.assertEqual(video['video_contents']['base_content'], video['id'])
+        self.assertNotIn('dynamic_contents', video)
+        dynamic = items[ContentType.DYNAMIC]
+        self.assertEqual(dynamic['dynamic_contents']['url'], '/media/web_pages/1.html')
+        self.assertNotIn('video_contents', dynamic)
+
+
+class ConditionalListTests(CurriculumTestMixin, APITestCase):
+    def setUp(self):
+        content_cache.clear_local()
+        content_cache.shared.clear()
+        self.create_student()
+        self.subject = self.create_subject()
+        self.lesson = self.create_lesson(self.subject)
+        self.create_contents(self.lesson, 2)
+        tokens = self.client.post(reverse('login'), {'username': 'student', 'password': 'secret123'}).json()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        self.topic = Topic.objects.create(subject=self.subject, name='Algebra', description='-')
+        RevisionContent.objects.create(topic=self.topic, video_url='/media/revision.mp4')
+
+    def urls(self):
+        return [
+            reverse('subject-list'),
+            reverse('lesson-list', kwargs={'subject_id': self.subject.id}),
+            reverse('lesson-content-list', kwargs={'lesson_id': self.lesson.id}),
+            reverse('revision-content-list', kwargs={'topic_id': self.topic.id}),
+        ]
+
+    def test_unchanged_lists_are_not_modified(self):
+        for url in self.urls():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+                self.assertEqual(
+                    self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304
+                )
+                # Answered from the cached validators
+                with self.assertNumQueries(0):
+                    self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_etag_follows_child_rows(self):
+        contents_url, revision_url = self.urls()[2:]
+        contents, revisions = self.client.get(contents_url), self.client.get(revision_url)
+
+        # A video row has no updated_at of its own; its parent is stamped
+        with self.captureOnCommitCallbacks(execute=True):
+            video = VideoContent.objects.get(base_content__lesson=self.lesson)
+            video.url = '/media/videos/new.mp4'
+            video.save()
+        response = self.client.get(contents_url, HTTP_IF_NONE_MATCH=contents['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], contents['ETag'])
+
+        # Revision items embed their topic
+        with self.captureOnCommitCallbacks(execute=True):
+            self.topic.name = 'Algebra I'
+            self.topic.save()
+        response = self.client.get(revision_url, HTTP_IF_NONE_MATCH=revisions['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], revisions['ETag'])
+
+
+class KeysetPaginationTests(CurriculumTestMixin, APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(self.create_student())
+        self.subject = self.create_subject()
+        # Repeated `order` values make the id tie-breaker matter
+        self.lessons = [self.create_lesson(self.subject, order=index // 3) for index in range(10)]
+
+    def test_pages_walk_forward_and_back_without_gaps(self):
+        url = reverse('lesson-list', kwargs={'subject_id': self.subject.id})
+        expected = [str(lesson.id) for lesson in sorted(self.lessons, key=lambda lesson: (lesson.order, str(lesson.id)))]
+
+        seen, pages, next_url = [], [], url + '?page_size=4'
+        while next_url:
+            page = self.client.get(next_url).json()
+            pages.append(page)
+            seen.extend(item['id'] for item in page['results'])
+            next_url = page['next']
+        self.assertEqual(seen, expected)
+        self.assertEqual([len(page['results']) for page in pages], [4, 4, 2])
+        self.assertIsNone(pages[0]['previous'])
+
+        previous_page = self.client.get(pages[-1]['previous']).json()
+        self.assertEqual([item['id'] for item in previous_page['results']], expected[4:8])
+
+    def test_invalid_cursor_is_rejected(self):
+        url = reverse('lesson-list', kwargs={'subject_id': self.subject.id})
+        response = self.client.get(url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+
+class QueryPlanTests(CurriculumTestMixin, APITestCase):
+    """
+    Runs EXPLAIN over the SQL each list endpoint issues and fails when a
+    curriculum table is read with a sequential scan or sorted in memory.
+
+    The seeded dataset is far too small for the planner to prefer an index on
+    its own, so on PostgreSQL sequential scans and sorts are priced out with
+    enable_seqscan/enable_sort: if one still shows up, no index can serve the
+    query.
+    """
+    content_table = re.compile(r'"content_management_\w+"')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='student', password='secret123')
+        StudentProfile.objects.create(
+            user=cls.user, academic_year=AcademicYear.PREP_1, learning_type=LearningType.VISUAL
+        )
+        for year in (AcademicYear.PREP_1, AcademicYear.PREP_2, AcademicYear.PREP_3):
+            for subject_index in range(6):
+                subject = Subject.objects.create(
+                    name=f'Subject {subject_index}', code=f'{year}-{subject_index}',
+                    description='Seeded subject', academic_year=year,
+                    is_active=subject_index != 5,
+                )
+                for order in range(8):
+                    lesson = Lesson.objects.create(
+                        subject=subject, title=f'Lesson {order}', description='Seeded lesson',
+                        order=order, duration=timedelta(minutes=20), is_active=order != 7,
+                    )
+                    cls().create_contents(lesson, 4)
+                topic = Topic.objects.create(
+                    subject=subject, name='Revision', description='Seeded topic',
+                    topic_difficulty_level=DifficultyLevel.BEGINNER,
+                )
+                for index in range(4):
+                    RevisionContent.objects.create(topic=topic, video_url=f'/media/revisions/{index}.mp4')
+        cls.subject = Subject.objects.filter(academic_year=AcademicYear.PREP_1).first()
+        cls.lesson = Lesson.objects.filter(subject=cls.subject).first()
+        cls.topic = Topic.objects.filter(subject=cls.subject).first()
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+        content_cache.clear_local()
+        content_cache.shared.clear()
+
+    def endpoint_urls(self):
+        return [
+            reverse('subject-list'),
+            reverse('lesson-list', kwargs={'subject_id': self.subject.id}),
+            reverse('lesson-content-list', kwargs={'lesson_id': self.lesson.id}),
+            reverse('revision-content-list', kwargs={'topic_id': self.topic.id}),
+        ]
+
+    def capture_curriculum_queries(self, url):
+        # First page plus the page behind its cursor, which adds the seek filter
+        queries = []
+        while url and len(queries) < 2:
+            with CaptureQueriesContext(connection) as captured:
+                response = self.client.get(url, {'page_size': 2} if '?' not in url else None)
+            self.assertEqual(response.status_code, 200, url)
+            queries.append([
+                query['sql'] for query in captured
+                if query['sql'].startswith('SELECT') and self.content_table.search(query['sql'])
+            ])
+            next_url = response.json()['next']
+            url = next_url and '{0.path}?{0.query}'.format(urlsplit(next_url))
+        self.assertEqual(len(queries), 2, 'seed data should span more than one page')
+        return [sql for page in queries for sql in page]
+
+    def explain(self, sql):
+        with transaction.atomic(), connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute('SET LOCAL enable_sort = off')
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+                return self.postgres_problems(json.loads(cursor.fetchone()[0])[0]['Plan'])
+            if connection.vendor == 'sqlite':
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                return [
+                    detail for _, _, _, detail in cursor.fetchall()
+                    if detail.startswith('SCAN content_management_') or 'TEMP B-TREE' in detail
+                ]
+        self.skipTest(f'No plan checks for {connection.vendor}')
+
+    def postgres_problems(self, node):
+        problems = []
+        if node['Node Type'] == 'Seq Scan' and node['Relation Name'].startswith('content_management_'):
+            problems.append(f"Seq Scan on {node['Relation Name']}")
+        if node['Node Type'] in ('Sort', 'Incremental Sort'):
+            problems.append(f"{node['Node Type']} on {node.get('Sort Key')}")
+        for child in node.get('Plans', []):
+            problems.extend(self.postgres_problems(child))
+        return problems
+
+    def test_list_endpoints_use_indexes(self):
+        for url in self.endpoint_urls():
+            queries = self.capture_curriculum_queries(url)
+            self.assertTrue(queries, url)
+            for sql in queries:
+                with self.subTest(url=url, sql=sql):
+                    self.assertEqual(self.explain(sql), [])
+
+
+class TokenClaimsTests(CurriculumTestMixin, APITestCase):
+    def setUp(self):
+        content_cache.clear_local()
+        content_cache.shared.clear()
+        self.user = self.create_student()
+        self.create_subject(code='MATH-1', academic_year=AcademicYear.PREP_1)
+        self.create_subject(code='MATH-2', academic_year=AcademicYear.PREP_2)
+        tokens = self.client.post(reverse('login'), {'username': 'student', 'password': 'secret123'}).json()
+        self.refresh = tokens['refresh']
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+
+    def subject_codes(self):
+        response = self.client.get(reverse('subject-list'))
+        self.assertEqual(response.status_code, 200)
+        return [subject['code'] for subject in response.json()['results']]
+
+    def test_warm_catalog_read_makes_no_queries(self):
+        self.assertEqual(self.subject_codes(), ['MATH-1'])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.subject_codes(), ['MATH-1'])
+
+    def test_profile_change_applies_to_live_and_refreshed_tokens(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            StudentProfile.objects.filter(user=self.user).update(academic_year=AcademicYear.PREP_2)
+            StudentProfile.objects.get(user=self.user).save()
+
+        self.assertEqual(self.subject_codes(), ['MATH-2'])
+
+        # Once the override is gone the rotated token alone carries the new year
+        content_cache.shared.clear()
+        tokens = self.client.post(reverse('token_refresh'), {'refresh': self.refresh}).json()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.subject_codes(), ['MATH-2'])
+        self.assertFalse([query for query in queries if 'users_' in query['sql'] or 'auth_user' in query['sql']])
+
+
+    def test_writes_load_the_user_and_reject_deactivated_accounts(self):
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        response = self.client.post(reverse('subject-create'), {
+            'name': 'Physics', 'code': 'PHYS-1', 'description': '-', 'academic_year': AcademicYear.PREP_1,
+        })
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(Subject.objects.filter(code='PHYS-1').exists())
+
+class AsyncViewTests(CurriculumTestMixin, APITestCase):
+    def setUp(self):
+        content_cache.clear_local()
+        content_cache.shared.clear()
+        self.create_student()
+        self.subject = self.create_subject()
+        self.lessons = [self.create_lesson(self.subject, order=index) for index in range(5)]
+        self.create_contents(self.lessons[0], 4)
+        tokens = self.client.post(reverse('login'), {'username': 'student', 'password': 'secret123'}).json()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+
+    def assertSameResults(self, name, async_name, **kwargs):
+        sync_response = self.client.get(reverse(name, kwargs=kwargs), {'page_size': 2})
+        async_response = self.client.get(reverse(async_name, kwargs=kwargs), {'page_size': 2})
+        self.assertEqual(async_response.status_code, 200)
+        self.assertEqual(async_response.json()['results'], sync_response.json()['results'])
+        return async_response
+
+    def test_async_lists_match_the_sync_views(self):
+        self.assertSameResults('subject-list', 'async-subject-list')
+        self.assertSameResults('lesson-content-list', 'async-lesson-content-list', lesson_id=self.lessons[0].id)
+        response = self.assertSameResults('lesson-list', 'async-lesson-list', subject_id=self.subject.id)
+
+        next_page = self.client.get(response.json()['next']).json()
+        self.assertEqual([lesson['order'] for lesson in next_page['results']], [2, 3])
+        revalidated = self.client.get(
+            reverse('async-lesson-list', kwargs={'subject_id': self.subject.id}), {'page_size': 2},
+            HTTP_IF_NONE_MATCH=response['ETag'],
+        )
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_async_user_detail_and_authentication(self):
+        response = self.client.get(reverse('async-user-detail'))
+        self.assertEqual(response.json(), self.client.get(reverse('user-detail')).json())
+
+        self.client.credentials()
+        response = self.client.get(reverse('async-subject-list'))
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('WWW-Authenticate', response)
+
+
+class BulkWriteTests(CurriculumTestMixin, APITestCase):
+    def setUp(self):
+        content_cache.clear_local()
+        content_cache.shared.clear()
+        self.client.force_authenticate(self.create_student())
+        self.subject = self.create_subject()
+
+    def lesson_item(self, order, title=None):
+        return {
+            'subject': str(self.subject.id), 'title': title or f'Lesson {order}',
+            'description': 'Lesson description', 'order': order, 'duration': '00:30:00',
+        }
+
+    def test_lessons_upsert_on_subject_and_order(self):
+        self.create_lesson(self.subject, order=1)
+        list_url = reverse('lesson-list', kwargs={'subject_id': self.subject.id})
+        self.client.get(list_url)  # cache the list
+
+        items = [self.lesson_item(1, title='Renamed')] + [self.lesson_item(order) for order in range(2, 22)]
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+            response = self.client.put(reverse('lesson-bulk'), items, format='json')
+        self.assertEqual(response.status_code, 200)
+        statuses = [result['status'] for result in response.json()['results']]
+        self.assertEqual(statuses, ['updated'] + ['created'] * 20)
+        # Batched writes, not a statement per row
+        self.assertLess(len(queries), 20)
+
+        titles = [lesson['title'] for lesson in self.client.get(list_url, {'page_size': 3}).json()['results']]
+        self.assertEqual(titles, ['Renamed', 'Lesson 2', 'Lesson 3'])
+        tree = self.client.get(reverse('subject-tree', kwargs={'subject_id': self.subject.id})).json()
+        self.assertEqual(len(tree['lessons']), 21)
+
+    def test_batch_is_all_or_nothing(self):
+        items = [
+            {'name': 'Physics', 'code': 'PHYS-1', 'description': 'Forces', 'academic_year': AcademicYear.PREP_1},
+            {'name': 'Maths again', 'code': 'MATH-1', 'description': 'Taken', 'academic_year': AcademicYear.PREP_1},
+            {'name': 'Physics copy', 'code': 'PHYS-1', 'description': 'Twice', 'academic_year': AcademicYear.PREP_1},
+        ]
+        response = self.client.post(reverse('subject-bulk'), items, format='json')
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()
+        self.assertEqual(errors[0], {})
+        self.assertIn('Duplicates item 0', errors[2]['non_field_errors'][0])
+
+        response = self.client.post(reverse('subject-bulk'), items[:2], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('already exists', response.json()[1]['non_field_errors'][0])
+        self.assertFalse(Subject.objects.filter(code='PHYS-1').exists())
+
+        response = self.client.put(reverse('subject-bulk'), items[:2], format='json')
+        self.assertEqual([result['status'] for result in response.json()['results']], ['created', 'updated'])
+        self.assertEqual(Subject.objects.get(code='MATH-1').name, 'Maths again')
+
+
+    def test_deactivating_a_subject_in_bulk_hides_its_lesson_feeds(self):
+        lesson = self.create_lesson(self.subject)
+        feed_url = reverse('lesson-feed', kwargs={'lesson_id': lesson.id})
+        self.assertEqual(self.client.get(feed_url).status_code, 200)
+
+        item = {
+            'name': self.subject.name, 'code': self.subject.code, 'description': self.subject.description,
+            'academic_year': self.subject.academic_year, 'is_active': False,
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put(reverse('subject-bulk'), [item], format='json')
+        self.assertEqual(response.json()['results'][0]['status'], 'updated')
+        self.assertEqual(self.client.get(feed_url).status_code, 404)
+
+class ContentPackageTests(CurriculumTestMixin, APITestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name))
+        self.media_root = media_root.name
+        self.client.force_authenticate(self.create_student())
+        self.lesson = self.create_lesson(self.create_subject())
+
+    def make_package(self, files, pages, digests=None):
+        buffer = io.BytesIO()
+        manifest = {
+            'pages': pages,
+            'files': digests or {name: hashlib.sha256(data).hexdigest() for name, data in files.items()},
+        }
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr('manifest.json', json.dumps(manifest))
+            for name, data in files.items():
+                archive.writestr(name, data)
+        return SimpleUploadedFile('package.zip', buffer.getvalue(), content_type='application/zip')
+
+    def upload(self, package):
+        return self.client.post(reverse('content-package'), {
+            'lesson': self.lesson.id, 'learning_type': LearningType.VISUAL, 'file': package,
+        }, format='multipart')
+
+    def test_each_page_becomes_dynamic_content(self):
+        files = {
+            'index.html': b'<script src="js/app.js"></script>',
+            'quiz/page.html': b'<p>Quiz</p>',
+            'js/app.js': b'console.log(1)' * 10000,
+        }
+        pages = [
+            {'path': 'index.html', 'description': 'Introduction'},
+            {'path': 'quiz/page.html', 'description': 'Quiz', 'learning_type': LearningType.KINESTHETIC},
+        ]
+        response = self.upload(self.make_package(files, pages))
+        self.assertEqual(response.status_code, 201)
+        items = response.json()
+        self.assertEqual([item['description'] for item in items], ['Introduction', 'Quiz'])
+        self.assertEqual(items[1]['learning_type'], LearningType.KINESTHETIC)
+
+        url = items[0]['dynamic_contents']['url']
+        self.assertRegex(url, r'^/media/packages/[0-9a-f-]{36}/index\.html$')
+        package_dir = os.path.join(self.media_root, *url.split('/')[2:-1])
+        with open(os.path.join(package_dir, 'js', 'app.js'), 'rb') as stored:
+            self.assertEqual(stored.read(), files['js/app.js'])
+
+    def test_rejected_packages_leave_nothing_behind(self):
+        pages = [{'path': 'index.html', 'description': 'Introduction'}]
+        index = {'index.html': b'<p>Hi</p>'}
+        bad_packages = [
+            self.make_package({**index, '../escape.html': b'x'}, pages),
+            self.make_package({**index, 'extra.css': b'x'}, pages, digests={
+                'index.html': hashlib.sha256(index['index.html']).hexdigest(),
+            }),
+            self.make_package(index, pages, digests={'index.html': '0' * 64}),
+        ]
+        for package in bad_packages:
+            response = self.upload(package)
+            self.assertEqual(response.status_code, 400, response.content)
+        self.assertFalse(BaseContent.objects.exists())
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'packages')), [])
+
+
+class SnapshotTests(CurriculumTestMixin, APITestCase):
+    def setUp(self):
+        content_cache.clear_local()
+        content_cache.shared.clear()
+        self.client.force_authenticate(self.create_student())
+        self.subject = self.create_subject()
+
+    def tree(self, subject_id=None):
+        return self.client.get(reverse('subject-tree', kwargs={'subject_id': subject_id or self.subject.id}))
+
+    def test_branches_are_patched_in_place(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first, second = self.create_lesson(self.subject, order=1), self.create_lesson(self.subject, order=2)
+            self.create_contents(first, 2)
+            topic = Topic.objects.create(subject=self.subject, name='Algebra', description='-')
+            RevisionContent.objects.create(topic=topic, video_url='/media/revision.mp4')
+        tree = self.tree().json()
+        self.assertEqual([len(lesson['contents']) for lesson in tree['lessons']], [2, 0])
+        self.assertEqual(len(tree['topics'][0]['revision_contents']), 1)
+
+        # Marks the stored first branch: patching the second must leave it alone
+        snapshot = CurriculumSnapshot.objects.get(subject=self.subject)
+        snapshot.tree['lessons'][0]['description'] = 'untouched'
+        snapshot.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_contents(second, 1)
+            second.order = 0
+            second.save()
+        tree = self.tree().json()
+        self.assertEqual([lesson['title'] for lesson in tree['lessons']], ['Lesson 2', 'Lesson 1'])
+        self.assertEqual([len(lesson['contents']) for lesson in tree['lessons']], [1, 2])
+        self.assertEqual(tree['lessons'][1]['description'], 'untouched')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual([lesson['title'] for lesson in self.tree().json()['lessons']], ['Lesson 2'])
+
+    def test_misses_are_not_cached_and_bumps_wait_for_commit(self):
+        subject_id = uuid.uuid4()
+        self.assertEqual(self.tree(subject_id).status_code, 404)
+        # Created without any refresh having run
+        Subject.objects.create(
+            id=subject_id, name='Physics', code='PHYS-1', description='-', academic_year=AcademicYear.PREP_1,
+        )
+        self.assertEqual(self.tree(subject_id).json()['code'], 'PHYS-1')
+
+        version = content_cache.get_version('tree', self.subject.id)
+        with self.captureOnCommitCallbacks() as callbacks:
+            snapshots.rebuild_subject(self.subject.id)
+            self.assertEqual(content_cache.get_version('tree', self.subject.id), version)
+        self.assertEqual(len(callbacks), 1)
+
+
+class UploadSessionTests(CurriculumTestMixin, APITestCase):
+    def setUp(self):
+        for setting in ('MEDIA_ROOT', 'UPLOAD_SESSION_ROOT'):
+            directory = tempfile.TemporaryDirectory()
+            self.addCleanup(directory.cleanup)
+            self.enterContext(override_settings(**{setting: directory.name}))
+        self.client.force_authenticate(self.create_student())
+        self.lesson = self.create_lesson(self.create_subject())
+        self.data = b'<p>page</p>' * 100
+
+    def start(self, checksum=None):
+        response = self.client.post(reverse('upload-create'), {
+            'kind': UploadKind.DYNAMIC, 'filename': 'page.html', 'size': len(self.data),
+            'checksum': checksum or hashlib.sha256(self.data).hexdigest(),
+            'metadata': {'lesson': str(self.lesson.id), 'learning_type': LearningType.VISUAL, 'description': 'Page'},
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()['id']
+
+    def put(self, upload_id, start, chunk, checksum=None):
+        return self.client.put(
+            reverse('upload-detail', kwargs={'upload_id': upload_id}), chunk,
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{start + len(chunk) - 1}/{len(self.data)}',
+            HTTP_X_CHUNK_SHA256=checksum or hashlib.sha256(chunk).hexdigest(),
+        )
+
+    def complete(self, upload_id):
+        return self.client.post(reverse('upload-complete', kwargs={'upload_id': upload_id}))
+
+    def test_interrupted_and_bad_chunks_are_resumed_from_the_offset(self):
+        upload_id = self.start()
+        first, second = self.data[:600], self.data[600:]
+        self.assertEqual(self.put(upload_id, 0, first).json()['received'], 600)
+
+        # The connection drops halfway through the body
+        with self.assertRaises(serializers.ValidationError):
+            uploads.write_chunk(
+                upload_id, io.BytesIO(second[:100]), 600, len(second), hashlib.sha256(second).hexdigest()
+            )
+        self.assertEqual(self.put(upload_id, 600, second, checksum='0' * 64).status_code, 400)
+        self.assertEqual(self.put(upload_id, 0, first).status_code, 409)
+        self.assertEqual(
+            self.client.get(reverse('upload-detail', kwargs={'upload_id': upload_id})).json()['received'], 600,
+        )
+
+        self.assertEqual(self.put(upload_id, 600, second).status_code, 200)
+        response = self.complete(upload_id)
+        self.assertEqual(response.status_code, 201, response.content)
+        path = os.path.join(settings.MEDIA_ROOT, *response.json()['dynamic_contents']['url'].split('/')[2:])
+        with open(path, 'rb') as stored:
+            self.assertEqual(stored.read(), self.data)
+        # A second complete is a conflict, not a second row
+        self.assertEqual(self.complete(upload_id).status_code, 409)
+        self.assertEqual(BaseContent.objects.count(), 1)
+
+    def test_complete_is_claimed_once_and_checked_against_the_checksum(self):
+        upload_id = self.start(checksum='1' * 64)
+        self.assertEqual(self.put(upload_id, 0, self.data).status_code, 200)
+        self.assertEqual(self.complete(upload_id).status_code, 400)
+        session = UploadSession.objects.get(pk=upload_id)
+        self.assertEqual(session.status, UploadStatus.PENDING)
+
+        # Another request is completing it
+        UploadSession.objects.filter(pk=upload_id).update(status=UploadStatus.COMPLETING)
+        self.assertEqual(self.complete(upload_id).status_code, 409)
+        self.assertEqual(self.put(upload_id, 0, self.data).status_code, 409)
+        self.assertFalse(BaseContent.objects.exists())
+
+
+    def test_a_chunk_being_written_holds_the_offset_without_a_lock(self):
+        upload_id = self.start()
+        url = reverse('upload-detail', kwargs={'upload_id': upload_id})
+        chunk = self.data[:600]
+        test = self
+
+        class SlowBody(io.BytesIO):
+            # Other requests arrive while the body is still streaming in
+            def read(self, size=-1):
+                if not self.tell():
+                    test.assertEqual(test.client.get(url).json()['status'], UploadStatus.WRITING)
+                    test.assertEqual(test.put(upload_id, 0, chunk).status_code, 409)
+                    test.assertEqual(test.client.delete(url).status_code, 409)
+                    test.assertEqual(test.complete(upload_id).status_code, 409)
+                return super().read(size)
+
+        with CaptureQueriesContext(connection) as queries:
+            session = uploads.write_chunk(upload_id, SlowBody(chunk), 0, len(chunk), hashlib.sha256(chunk).hexdigest())
+        self.assertEqual((session.status, session.received), (UploadStatus.PENDING, 600))
+        self.assertFalse([query for query in queries if 'FOR UPDATE' in query['sql']])
+
+        # A writer that died mid-chunk stops holding the offset after the timeout
+        UploadSession.objects.filter(pk=upload_id).update(
+            status=UploadStatus.WRITING, updated_at=timezone.now() - timedelta(hours=1),
+        )
+        self.assertEqual(self.put(upload_id, 600, self.data[600:]).status_code, 200)
+        self.assertEqual(self.complete(upload_id).status_code, 201)
+
+class MediaViewTests(CurriculumTestMixin, APITestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name))
+        self.data = b'0123456789' * 10
+        for name in ('videos/clip.mp4', 'packages/p1/index.html', 'packages/p1/js/app.js', 'packages/p1/data.json.gz'):
+            os.makedirs(os.path.join(media_root.name, os.path.dirname(name)), exist_ok=True)
+            with open(os.path.join(media_root.name, name), 'wb') as file:
+                file.write(self.data)
+        self.student = self.create_student()
+
+    def test_ranges_and_conditional_requests(self):
+        self.client.force_authenticate(self.student)
+        url = '/media/videos/clip.mp4'
+        response = self.client.get(url, HTTP_RANGE='bytes=0-9')
+        self.assertEqual((response.status_code, response['Content-Range']), (206, 'bytes 0-9/100'))
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+
+        response = self.client.get(url, HTTP_RANGE='bytes=0-1,-2')
+        self.assertEqual(response.status_code, 206)
+        self.assertTrue(response['Content-Type'].startswith('multipart/byteranges; boundary='))
+        body = b''.join(response.streaming_content)
+        self.assertIn(b'Content-Range: bytes 0-1/100\r\n\r\n01\r\n', body)
+        self.assertIn(b'Content-Range: bytes 98-99/100\r\n\r\n89\r\n', body)
+
+        response = self.client.get(url, HTTP_RANGE='bytes=500-')
+        self.assertEqual((response.status_code, response['Content-Range']), (416, 'bytes */100'))
+
+        full = self.client.get(url)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=full['ETag']).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=full['Last-Modified']).status_code, 304)
+        # A stale If-Range gets the whole file
+        response = self.client.get(url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_compressed_files_are_served_as_stored(self):
+        self.client.force_authenticate(self.student)
+        response = self.client.get('/media/packages/p1/data.json.gz', HTTP_RANGE='bytes=0-9')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertNotIn('Content-Encoding', response)
+
+    def test_signed_urls_cover_a_folder_through_a_cookie(self):
+        self.assertEqual(self.client.get('/media/packages/p1/index.html').status_code, 401)
+        self.client.force_authenticate(self.student)
+        signed = self.client.post(reverse('media-token'), {'url': '/media/packages/p1/index.html'}, format='json')
+        self.assertEqual(signed.status_code, 200)
+        self.assertEqual(
+            self.client.post(reverse('media-token'), {'url': '/media/../settings.py'}, format='json').status_code, 400,
+        )
+        self.client.force_authenticate(None)
+
+        # As an <iframe> would: the page by signed URL, its assets by relative URL
+        response = self.client.get(signed.json()['url'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.cookies['media_token']['path'], '/media/packages/p1/')
+        self.assertEqual(self.client.get('/media/packages/p1/js/app.js').status_code, 200)
+        self.assertEqual(self.client.get('/media/videos/clip.mp4').status_code, 401)
+
+        self.client.cookies.clear()
+        with override_settings(MEDIA_TOKEN_LIFETIME=-1):
+            self.assertEqual(self.client.get(signed.json()['url']).status_code, 401)
+
+
+class VideoProcessingTests(CurriculumTestMixin, APITestCase):
+    PROBE = {
+        'streams': [{'width': 1280, 'height': 720}],
+        'format': {'duration': '90.5', 'bit_rate': '800000'},
+    }
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name))
+        self.lesson = self.create_lesson(self.create_subject())
+        self.commands = []
+        self.enterContext(mock.patch.object(video_processing, '_run', side_effect=self.fake_run))
+
+    def fake_run(self, command):
+        # ffprobe prints JSON; ffmpeg writes the image named last
+        self.commands.append(command)
+        if command[0] == 'ffprobe':
+            return json.dumps(self.PROBE).encode()
+        with open(command[-1], 'wb') as image:
+            image.write(b'jpeg')
+        return b''
+
+    def create_video(self, name):
+        os.makedirs(os.path.join(settings.MEDIA_ROOT, 'videos'), exist_ok=True)
+        open(os.path.join(settings.MEDIA_ROOT, 'videos', name), 'wb').close()
+        content = BaseContent.objects.create(
+            lesson=self.lesson, learning_type=LearningType.VISUAL, content_type=ContentType.VIDEO, description='-',
+        )
+        return VideoContent.objects.create(base_content=content, url=f'/media/videos/{name}')
+
+    def test_probe_fills_in_the_video_and_the_lesson_duration(self):
+        videos = [self.create_video('one.mp4'), self.create_video('two.mp4')]
+        for video in videos:
+            self.assertTrue(video_processing.process_now(video))
+
+        video = VideoContent.objects.get(pk=videos[0].pk)
+        self.assertEqual(video.processing_status, ProcessingStatus.DONE)
+        self.assertEqual((video.width, video.height, video.bitrate), (1280, 720, 800000))
+        self.assertEqual(video.duration, timedelta(seconds=90.5))
+        self.assertEqual(video.poster_url, '/media/posters/one.jpg')
+        self.assertEqual(video.thumbnails_url, '/media/posters/one-strip.jpg')
+        # Both videos are on the same learning-type track
+        self.lesson.refresh_from_db()
+        self.assertEqual(self.lesson.duration, timedelta(seconds=181))
+        # A poster frame a tenth of the way in
+        self.assertIn('9.050', self.commands[1])
+
+    def test_failed_jobs_are_marked_and_the_callback_closes_its_connections(self):
+        video = self.create_video('broken.mp4')
+        future = Future()
+        future.set_exception(subprocess.CalledProcessError(1, 'ffprobe'))
+        with mock.patch.object(video_processing.connections, 'close_all') as close_all, self.assertLogs(
+            'content_management.video_processing', 'ERROR'
+        ):
+            video_processing._apply_future(video.pk, video_processing.job_arguments(video), future)
+        close_all.assert_called_once_with()
+        video.refresh_from_db()
+        self.assertEqual(video.processing_status, ProcessingStatus.FAILED)
+
+
+class MediaBlobTests(CurriculumTestMixin, APITestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name))
+        self.lesson = self.create_lesson(self.create_subject())
+
+    def store(self, data, name='page.html'):
+        return save_media_file(SimpleUploadedFile(name, data))
+
+    def attach(self, url):
+        content = BaseContent.objects.create(
+            lesson=self.lesson, learning_type=LearningType.VISUAL, content_type=ContentType.DYNAMIC,
+            description='Page',
+        )
+        return DynamicContent.objects.create(base_content=content, url=url)
+
+    def test_identical_files_share_one_counted_blob(self):
+        url = self.store(b'<p>same</p>')
+        self.assertEqual(self.store(b'<p>same</p>', name='copy.html'), url)
+        self.assertEqual(MediaBlob.objects.count(), 1)
+
+        first, second = self.attach(url), self.attach(url)
+        self.assertEqual(MediaBlob.objects.get().ref_count, 2)
+        first.base_content.delete()
+        self.assertEqual(MediaBlob.objects.get().ref_count, 1)
+        second.url = self.store(b'<p>other</p>')
+        second.save()
+        self.assertEqual(MediaBlob.objects.get(pk=blob_digest(url)).ref_count, 0)
+        self.assertEqual(MediaBlob.objects.get(pk=blob_digest(second.url)).ref_count, 1)
+
+    def test_gc_keeps_referenced_and_recently_reused_blobs(self):
+        referenced, unused, reused = (self.store(data) for data in (b'referenced', b'unused', b'reused'))
+        self.attach(referenced)
+        MediaBlob.objects.update(last_used_at=timezone.now() - timedelta(days=2))
+        # Handed to a new upload whose reference is not committed yet
+        self.assertEqual(existing_blob_url(blob_digest(reused)), reused)
+
+        call_command('gc_media_blobs', stdout=io.StringIO())
+        self.assertEqual(
+            set(MediaBlob.objects.values_list('digest', flat=True)), {blob_digest(referenced), blob_digest(reused)},
+        )
+        self.assertIsNone(existing_blob_url(blob_digest(unused)))
+        self.assertTrue(os.path.exists(os.path.join(settings.MEDIA_ROOT, *reused.split('/')[2:])))
+        self.assertFalse(os.path.exists(os.path.join(settings.MEDIA_ROOT, *unused.split('/')[2:])))
+
+
+class SearchTests(CurriculumTestMixin, APITestCase):
+    def setUp(self):
+        content_cache.clear_local()
+        content_cache.shared.clear()
+        self.client.force_authenticate(self.create_student())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.subject = Subject.objects.create(
+                name='الرياضيات', code='MATH-AR', description='الجبر والهندسة', academic_year=AcademicYear.PREP_1,
+            )
+            self.fractions = Lesson.objects.create(
+                subject=self.subject, title='الكسور العشرية', description='جمع الكسور وطرحها',
+                order=1, duration=timedelta(minutes=30),
+            )
+            self.equations = Lesson.objects.create(
+                subject=self.subject, title='Linear equations', description='Solving for x with fractions',
+                order=2, duration=timedelta(minutes=30),
+            )
+            Topic.objects.create(
+                subject=self.subject, name='مراجعة الكسور', description='تمارين',
+                topic_difficulty_level=DifficultyLevel.BEGINNER,
+            )
+            other_year = self.create_subject(code='OTHER', academic_year=AcademicYear.PREP_2)
+            self.create_lesson(other_year)
+
+    def search(self, query, **params):
+        response = self.client.get(reverse('search'), {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def test_arabic_spelling_variants_match(self):
+        # Without the article and with diacritics, still "الرياضيات"
+        self.assertEqual([result['id'] for result in self.search('رِياضيات')], [str(self.subject.id)])
+        results = self.search('كسور')
+        self.assertEqual({result['kind'] for result in results}, {'LESSON', 'TOPIC'})
+        # The lesson has the word in its title and description, the topic only in its name
+        self.assertEqual(results[0]['title'], 'الكسور العشرية')
+        self.assertEqual([result['kind'] for result in self.search('كسور', kind='TOPIC')], ['TOPIC'])
+
+    def test_migration_indexes_rows_saved_before_search_existed(self):
+        expected = {result['id'] for result in self.search('كسور')}
+        SearchDocument.objects.all().delete()
+        content_cache.bump('search', AcademicYear.PREP_1)
+        self.assertEqual(self.search('كسور'), [])
+
+        migration = importlib.import_module('content_management.migrations.0014_backfill_search_documents')
+        migration.backfill_search_documents(django_apps, None)
+        self.assertEqual({result['id'] for result in self.search('كسور')}, expected)
+        self.assertEqual(SearchDocument.objects.count(), 6)
+
+    def test_results_are_scoped_ranked_and_kept_current(self):
+        # Prefix match on the last word; the title match ranks first
+        self.assertEqual([result['title'] for result in self.search('fraction')], ['Linear equations'])
+        self.assertEqual(self.search('Lesson'), [])  # the other year's lesson
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.equations.title = 'Quadratic equations'
+            self.equations.save()
+        self.assertEqual([result['title'] for result in self.search('quadratic')], ['Quadratic equations'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.subject.is_active = False
+            self.subject.save()
+        self.assertEqual(self.search('quadratic'), [])
+
+
+class LessonFeedTests(CurriculumTestMixin, APITestCase):
+    def setUp(self):
+        content_cache.clear_local()
+        content_cache.shared.clear()
+        self.create_student()  # a Visual learner
+        self.lesson = self.create_lesson(self.create_subject())
+        tokens = self.client.post(reverse('login'), {'username': 'student', 'password': 'secret123'}).json()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+
+    def add_content(self, learning_type, description):
+        with self.captureOnCommitCallbacks(execute=True):
+            base_content = BaseContent.objects.create(
+                lesson=self.lesson, learning_type=learning_type,
+                content_type=ContentType.DYNAMIC, description=description,
+            )
+            DynamicContent.objects.create(base_content=base_content, url=f'/media/web_pages/{description}.html')
+
+    def get_feed(self):
+        response = self.client.get(reverse('lesson-feed', kwargs={'lesson_id': self.lesson.id}))
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_feed_falls_back_and_follows_content_changes(self):
+        self.add_content(LearningType.AUDITORY, 'podcast')
+        self.add_content(LearningType.READING_WRITING, 'notes')
+        feed = self.get_feed()
+        # Reading/Writing comes before Auditory in a Visual learner's fallback order
+        self.assertEqual(feed['served_type'], LearningType.READING_WRITING)
+        self.assertEqual([item['description'] for item in feed['results']], ['notes'])
+
+        self.add_content(LearningType.VISUAL, 'diagram')
+        feed = self.get_feed()
+        self.assertEqual(feed['served_type'], LearningType.VISUAL)
+        self.assertEqual(feed['results'][0]['dynamic_contents']['url'], '/media/web_pages/diagram.html')
+
+        with self.assertNumQueries(0):
+            self.get_feed()
+
+    def test_feed_follows_the_subjects_year_and_active_flag(self):
+        self.add_content(LearningType.VISUAL, 'diagram')
+        self.get_feed()
+        url = reverse('lesson-feed', kwargs={'lesson_id': self.lesson.id})
+        subject = self.lesson.subject
+
+        with self.captureOnCommitCallbacks(execute=True):
+            subject.is_active = False
+            subject.save()
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            subject.is_active = True
+            subject.save()
+        self.get_feed()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lesson.subject = self.create_subject(code='MATH-2', academic_year=AcademicYear.PREP_2)
+            self.lesson.save()
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_hidden_lessons_have_no_feed(self):
+        self.add_content(LearningType.VISUAL, 'diagram')
+        url = reverse('lesson-feed', kwargs={'lesson_id': self.lesson.id})
+        self.get_feed()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lesson.is_active = False
+            self.lesson.save()
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+        # Still hidden when its subject is saved
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lesson.subject.save()
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+        # Shown again through the bulk endpoint
+        item = {
+            'subject': str(self.lesson.subject_id), 'title': self.lesson.title, 'description': '-',
+            'order': self.lesson.order, 'duration': '00:30:00', 'is_active': True,
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put(reverse('lesson-bulk'), [item], format='json')
+        self.assertEqual(response.json()['results'][0]['status'], 'updated')
+        self.get_feed()
+
+    def test_unknown_lesson_is_not_found(self):
+        response = self.client.get(reverse('lesson-feed', kwargs={'lesson_id': '00000000-0000-0000-0000-000000000000'}))
+        self.assertEqual(response.status_code, 404)
+
+
+class TopicListTests(CurriculumTestMixin, APITestCase):
+    def setUp(self):
+        content_cache.clear_local()
+        content_cache.shared.clear()
+        self.create_student()
+        self.subject = self.create_subject()
+        self.topics = [
+            Topic.objects.create(
+                subject=self.subject, name=f'Topic {index}', description='Revision',
+                topic_difficulty_level=level,
+            )
+            for index, level in enumerate([DifficultyLevel.BEGINNER, DifficultyLevel.ADVANCED, DifficultyLevel.BEGINNER])
+        ]
+        RevisionContent.objects.create(topic=self.topics[0], video_url='/media/revisions/0.mp4')
+        tokens = self.client.post(reverse('login'), {'username': 'student', 'password': 'secret123'}).json()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        self.url = reverse('topic-list', kwargs={'subject_id': self.subject.id})
+
+    def test_filters_by_difficulty_with_revision_counts(self):
+        results = self.client.get(self.url, {'difficulty': DifficultyLevel.BEGINNER}).json()['results']
+        self.assertEqual([(topic['name'], topic['revision_count']) for topic in results], [('Topic 0', 1), ('Topic 2', 0)])
+        self.assertEqual(self.client.get(self.url, {'difficulty': 'EASY'}).status_code, 400)
+
+        # Served from the index: no queries once warm
+        with self.assertNumQueries(0):
+            self.client.get(self.url, {'difficulty': DifficultyLevel.ADVANCED})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            RevisionContent.objects.create(topic=self.topics[2], video_url='/media/revisions/2.mp4')
+        results = self.client.get(self.url, {'difficulty': DifficultyLevel.BEGINNER}).json()['results']
+        self.assertEqual([topic['revision_count'] for topic in results], [1, 1])
+
+    def test_other_years_subjects_are_not_found(self):
+        other = self.create_subject(code='OTHER', academic_year=AcademicYear.PREP_2)
+        response = self.client.get(reverse('topic-list', kwargs={'subject_id': other.id}))
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class BenchmarkTests(APITestCase):
+    SIZES = {'years': 2, 'subjects': 2, 'lessons': 3, 'contents': 4, 'topics': 2, 'revisions': 2, 'students': 3}
+
+    def seed(self, **options):
+        call_command('seed_data', stdout=io.StringIO(), **self.SIZES, **options)
+        return sorted(Lesson.objects.values_list('id', 'title', 'order'))
+
+    def test_seed_is_reproducible(self):
+        lessons = self.seed(seed=7)
+        self.assertEqual(len(lessons), 2 * 2 * 3)
+        self.assertEqual(BaseContent.objects.count(), 2 * 2 * 3 * 4)
+        self.assertEqual(StudentProfile.objects.count(), 2 * 3)
+        with self.assertRaises(CommandError):
+            self.seed(seed=7)
+        self.assertEqual(self.seed(seed=7, replace=True), lessons)
+        self.assertNotEqual(self.seed(seed=8, replace=True), lessons)
+
+    def test_benchmark_covers_every_endpoint(self):
+        self.seed()
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'results.json')
+            call_command('benchmark_api', requests=2, warmup=0, output=output, stdout=io.StringIO())
+            with open(output) as results:
+                report = json.load(results)
+            self.assertEqual(
+                {result['url_name'] for result in report['results'].values()},
+                {
+                    pattern.name for module in ('content_management.urls', 'users.urls')
+                    for pattern in get_resolver(module).url_patterns
+                },
+            )
+            self.assertFalse([name for name, result in report['results'].items() if result['errors']])
+
+            # A query more than the baseline fails the run
+            report['results']['GET subject-list']['queries'] = -1
+            with open(output, 'w') as baseline:
+                json.dump(report, baseline)
+            with self.assertRaisesMessage(CommandError, 'GET subject-list: '):
+                call_command(
+                    'benchmark_api', requests=2, warmup=0, only=['subject-list'], baseline=output,
+                    stdout=io.StringIO(),
+                )
+
+
+class ServerTimingTests(CurriculumTestMixin, APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(self.create_student())
+        self.lesson = self.create_lesson(self.create_subject())
+        self.create_contents(self.lesson, 3)
+
+    def test_each_response_reports_where_its_time_went(self):
+        response = self.client.get(reverse('lesson-content-list', kwargs={'lesson_id': self.lesson.id}))
+        timings = dict(entry.split(';', 1) for entry in response['Server-Timing'].split(', '))
+        self.assertEqual(set(timings), {'sql', 'serialize', 'render', 'total'})
+        # An ETag aggregate and the page
+        self.assertIn('desc="2 queries"', timings['sql'])
+
+    @override_settings(METRICS_TOKEN='scrape-secret')
+    def test_metrics_are_aggregated_per_url_name(self):
+        url = reverse('lesson-content-list', kwargs={'lesson_id': self.lesson.id})
+        self.client.get(url)
+        self.client.get(url)
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+        body = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-secret').content.decode()
+        counts = {
+            line.split()[0]: float(line.split()[1]) for line in body.splitlines()
+            if 'url_name="lesson-content-list"' in line and not line.startswith('#')
+        }
+        self.assertGreaterEqual(
+            counts['http_request_duration_seconds_count{url_name="lesson-content-list",method="GET"}'], 2,
+        )
+        self.assertGreaterEqual(
+            counts['http_request_sql_queries_bucket{url_name="lesson-content-list",method="GET",le="+Inf"}'], 2,
+        )
+        self.assertIn('http_request_serialize_seconds_sum{url_name="lesson-content-list",method="GET"}', counts)
+
+
+    def scrape(self, series):
+        body = self.client.get('/metrics').content.decode()
+        return sum(float(line.split()[1]) for line in body.splitlines() if line.startswith(series))
+
+    def test_exited_workers_are_compacted_without_losing_counts(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(METRICS_DIR=directory.name))
+        series = 'http_requests_total{url_name="subject-list",method="GET",status="200"}'
+        key = json.dumps(['subject-list', 'GET', '200'])
+        # Workers that have exited (no such pid)
+        for started in (1, 2):
+            with open(os.path.join(directory.name, f'999999999-{started}.json'), 'w') as snapshot:
+                json.dump({'http_requests': {key: [5]}}, snapshot)
+
+        before = self.scrape(series)
+        self.assertGreaterEqual(before, 10)
+        self.assertCountEqual(
+            os.listdir(directory.name), ['.lock', metrics.COMPACTED, os.path.basename(metrics.registry.snapshot_path())],
+        )
+        # Scraping again neither loses nor re-adds them
+        self.assertEqual(self.scrape(series), before)
+
+        with open(os.path.join(directory.name, '999999999-3.json'), 'w') as snapshot:
+            json.dump({'http_requests': {key: [1]}}, snapshot)
+        self.assertEqual(self.scrape(series), before + 1)
+
+    def test_unknown_methods_share_one_label(self):
+        self.client.generic('BREW', '/no-such-page/')
+        self.assertGreaterEqual(self.scrape('http_requests_total{url_name="<unmatched>",method="other"'), 1)
+        self.assertEqual(self.scrape('http_requests_total{url_name="<unmatched>",method="BREW"'), 0)
+
+class ProfilerTests(CurriculumTestMixin, APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(profiling.save_rules, [])
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.enterContext(override_settings(PROFILER_DIR=self.directory.name))
+        self.student = self.create_student()
+        self.lesson = self.create_lesson(self.create_subject())
+        self.create_contents(self.lesson, 3)
+        self.admin = User.objects.create_superuser(username='admin', password='secret123')
+
+    def add_rule(self, **rule):
+        self.client.force_authenticate(self.admin)
+        response = self.client.post(reverse('profiler'), rule, format='json')
+        self.client.force_authenticate(None)
+        return response
+
+    def login_student(self):
+        tokens = self.client.post(reverse('login'), {'username': 'student', 'password': 'secret123'}).json()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+
+    def test_matching_requests_are_captured_with_their_sql(self):
+        self.assertEqual(self.add_rule().status_code, 400)
+        self.assertEqual(self.add_rule(url_name='lesson-content-list', max_captures=1).status_code, 201)
+        self.login_student()
+        self.assertEqual(self.client.get(reverse('profiler')).status_code, 403)
+
+        url = reverse('lesson-content-list', kwargs={'lesson_id': self.lesson.id})
+        self.client.get(reverse('subject-list'))
+        self.client.get(url)
+        self.client.get(url)  # past max_captures
+        self.assertEqual(
+            sorted(os.path.splitext(name)[1] for name in os.listdir(self.directory.name)), ['.json', '.prof'],
+        )
+
+        self.client.credentials()
+        self.client.force_authenticate(self.admin)
+        capture = self.client.get(reverse('profiler')).json()['captures'][0]
+        details = json.loads(b''.join(self.client.get(
+            reverse('profiler-capture', kwargs={'filename': f"{capture['name']}.json"})
+        ).streaming_content))
+        self.assertEqual((details['url_name'], details['status']), ('lesson-content-list', 200))
+        self.assertEqual(details['sql_count'], len(details['sql']))
+        self.assertGreater(details['sql_count'], 0)
+        self.assertEqual(
+            self.client.get(reverse('profiler-capture', kwargs={'filename': '..secret.py'})).status_code, 404,
+        )
+
+    def test_profiling_never_fails_the_request(self):
+        self.add_rule(url_name='lesson-content-list')
+        self.client.force_authenticate(self.student)
+        url = reverse('lesson-content-list', kwargs={'lesson_id': self.lesson.id})
+
+        # Another request holds the one cProfile slot
+        with profiling.cprofile_lock:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+        with mock.patch.object(profiling.Capture, 'save', side_effect=OSError('disk full')):
+            with self.assertLogs('utils.profiling', 'ERROR'):
+                self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertFalse(profiling.cprofile_lock.locked())
+
+    @override_settings(PROFILER_MAX_CAPTURES=2, PROFILER_SAMPLE_INTERVAL=0.001)
+    def test_user_rules_sample_stacks_and_rotate(self):
+        self.add_rule(user_id=str(self.student.id), mode='sample')
+        self.client.get(reverse('subject-list'))  # anonymous: not this user
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+        self.login_student()
+        for _ in range(3):
+            self.client.get(reverse('lesson-content-list', kwargs={'lesson_id': self.lesson.id}))
+        names = os.listdir(self.directory.name)
+        self.assertEqual(len(names), 4)
+        self.assertEqual({os.path.splitext(name)[1] for name in names}, {'.folded', '.json'})
+
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self.client.delete(reverse('profiler')).status_code, 204)
+        self.assertEqual(profiling.get_rules(), [])
@@ -0,0 +1,34 @@
+# content_management/topics.py
+#
+# Per-subject topic index behind the topic listing: every topic of the
+# subject with its revision-content count, plus the subject fields needed to
+# authorise the read. It lives in the content cache under the ('topics',
+# subject) scope, which Topic, RevisionContent and Subject writes bump, so
+# navigating revision screens is a local-memory lookup and a filter.
+from django.db.models import Count
+
+from .cache import content_cache
+from .models import Subject, Topic
+from .serializers import TopicListSerializer
+
+
+def build_index(subject_id):
+    subject = Subject.objects.filter(pk=subject_id).values('academic_year', 'is_active').first()
+    if subject is None:
+        return None
+    topics = Topic.objects.filter(subject_id=subject_id).annotate(
+        revision_count=Count('revisioncontent')
+    ).order_by('created_at', 'id')
+    return {**subject, 'topics': TopicListSerializer(topics, many=True).data}
+
+
+def get_index(subject_id):
+    return content_cache.get_or_set('topics', subject_id, 'index', lambda: build_index(subject_id))
+
+
+def list_topics(subject_id, difficulty=None):
+    # Returns the index with its topics filtered, or None for an unknown subject
+    index = get_index(subject_id)
+    if index is None or difficulty is None:
+        return index
+    return {**index, 'topics': [topic for topic in index['topics'] if topic['topic_difficulty_level'] == difficulty]}
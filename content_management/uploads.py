@@ -0,0 +1,199 @@
+# content_management/uploads.py
+import hashlib
+import os
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException
+
+from .models import DynamicContent, UploadKind, UploadSession, UploadStatus, VideoContent
+from .serializers import ContentSerializer, RevisionContentSerializer
+from .storage import LocalFile, existing_blob_url, save_media_file
+
+# Bytes moved per read/write; a chunk is never held in memory whole
+STREAM_BLOCK_SIZE = 1024 * 1024
+
+CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+|\*)$')
+
+# Stand-in for video_url while validating revision metadata before the file exists
+PENDING_URL = 'pending'
+
+
+class UploadConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Chunk does not start at the current upload offset.'
+    default_code = 'upload_conflict'
+
+
+def part_path(session):
+    return os.path.join(settings.UPLOAD_SESSION_ROOT, f'{session.pk}.part')
+
+
+def metadata_serializer(kind, metadata, video_url=PENDING_URL):
+    if kind == UploadKind.REVISION:
+        return RevisionContentSerializer(data={**metadata, 'video_url': video_url})
+    return ContentSerializer(data={**metadata, 'content_type': kind})
+
+
+def start_session(session):
+    # Bytes we already store need not be sent again: the session starts out
+    # fully received and can be completed straight away
+    if existing_blob_url(session.checksum):
+        session.received = session.size
+        session.save(update_fields=['received', 'updated_at'])
+        return session
+    os.makedirs(settings.UPLOAD_SESSION_ROOT, exist_ok=True)
+    open(part_path(session), 'wb').close()
+    return session
+
+
+def parse_content_range(header, size):
+    match = CONTENT_RANGE.match(header or '')
+    if not match:
+        raise serializers.ValidationError({"Content-Range": "Expected 'bytes <start>-<end>/<size>'."})
+    start, end = int(match.group(1)), int(match.group(2))
+    if match.group(3) != '*' and int(match.group(3)) != size:
+        raise serializers.ValidationError({"Content-Range": "Size does not match the upload."})
+    if end < start or end >= size:
+        raise serializers.ValidationError({"Content-Range": "Range is outside the upload."})
+    return start, end - start + 1
+
+
+def write_chunk(session_id, stream, start, length, checksum):
+    # Chunks are appended strictly in order: anything else is a conflict and
+    # the client should resume from session.received. The offset is claimed
+    # by marking the session WRITING, so two requests for the same offset
+    # cannot both write into the part file; no row lock or transaction is
+    # held while the body streams in.
+    if not checksum:
+        raise serializers.ValidationError({"X-Chunk-SHA256": "Chunk checksum is required."})
+    now = timezone.now()
+    abandoned = now - timedelta(seconds=settings.CHUNKED_UPLOAD_WRITE_TIMEOUT)
+    claimed = UploadSession.objects.filter(
+        Q(status=UploadStatus.PENDING) | Q(status=UploadStatus.WRITING, updated_at__lt=abandoned),
+        pk=session_id, received=start,
+    ).update(status=UploadStatus.WRITING, updated_at=now)
+    if not claimed:
+        session = UploadSession.objects.get(pk=session_id)
+        if session.status == UploadStatus.WRITING:
+            raise UploadConflict('Another chunk is being written.')
+        if session.status != UploadStatus.PENDING:
+            raise UploadConflict('Upload is already complete.')
+        raise UploadConflict(f'Upload offset is {session.received}.')
+
+    session = UploadSession.objects.get(pk=session_id)
+    claim = UploadSession.objects.filter(pk=session_id, status=UploadStatus.WRITING, received=start)
+    try:
+        digest = hashlib.sha256()
+        remaining = length
+        with open(part_path(session), 'r+b') as part:
+            part.seek(start)
+            while remaining:
+                block = stream.read(min(STREAM_BLOCK_SIZE, remaining))
+                if not block:
+                    raise serializers.ValidationError({"Content-Range": "Request body is shorter than the range."})
+                part.write(block)
+                digest.update(block)
+                remaining -= len(block)
+
+        # The bytes past `received` are simply overwritten by the retry
+        if digest.hexdigest() != checksum.lower():
+            raise serializers.ValidationError({"X-Chunk-SHA256": "Chunk checksum mismatch."})
+    except BaseException:
+        claim.update(status=UploadStatus.PENDING, updated_at=timezone.now())
+        raise
+
+    session.status, session.received, session.updated_at = UploadStatus.PENDING, start + length, timezone.now()
+    if not claim.update(status=session.status, received=session.received, updated_at=session.updated_at):
+        # Taken over as abandoned while this request was still writing
+        raise UploadConflict('Another chunk is being written.')
+    return session
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as part:
+        for block in iter(lambda: part.read(STREAM_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def complete_session(session):
+    # Verify the assembled file, move it into MEDIA_ROOT and create the row.
+    # The session is claimed first: a concurrent complete gets a conflict
+    # instead of a second row or a part file that has gone.
+    if session.status != UploadStatus.PENDING:
+        raise UploadConflict('Upload is already complete.')
+    serializer = metadata_serializer(session.kind, session.metadata)
+    serializer.is_valid(raise_exception=True)
+
+    claimed = UploadSession.objects.filter(pk=session.pk, status=UploadStatus.PENDING).update(
+        status=UploadStatus.COMPLETING, updated_at=timezone.now()
+    )
+    if not claimed:
+        raise UploadConflict('Upload is already being completed.')
+    try:
+        session.refresh_from_db(fields=['received'])
+        instance = _complete_claimed(session, serializer)
+    except BaseException:
+        # Back to PENDING so the client can retry. A blob stored before the
+        # failure is reused by the retry (or collected by gc_media_blobs).
+        UploadSession.objects.filter(pk=session.pk).update(
+            status=UploadStatus.PENDING, updated_at=timezone.now()
+        )
+        session.status = UploadStatus.PENDING
+        raise
+    return instance
+
+
+def _complete_claimed(session, serializer):
+    if session.received != session.size:
+        raise serializers.ValidationError({"received": f"Only {session.received} of {session.size} bytes uploaded."})
+
+    path = part_path(session)
+    file_url = existing_blob_url(session.checksum) if not os.path.exists(path) else None
+    if file_url is None and not os.path.exists(path):
+        # The blob this session was going to reuse has been collected since
+        session.received = 0
+        session.save(update_fields=['received', 'updated_at'])
+        start_session(session)
+        raise UploadConflict('Upload offset is 0.')
+    if file_url is None:
+        if file_sha256(path) != session.checksum:
+            raise serializers.ValidationError({"checksum": "File checksum mismatch."})
+        with LocalFile(path, session.filename, sha256=session.checksum) as file:
+            file_url = save_media_file(file)
+        # A duplicate of a stored blob is left behind rather than moved
+        discard_part(session)
+
+    with transaction.atomic():
+        if session.kind == UploadKind.REVISION:
+            instance = serializer.save(video_url=file_url)
+        else:
+            instance = serializer.save()
+            model = VideoContent if session.kind == UploadKind.VIDEO else DynamicContent
+            model.objects.create(base_content=instance, url=file_url)
+        session.status = UploadStatus.COMPLETE
+        session.save(update_fields=['status', 'updated_at'])
+    return instance
+
+
+def discard_part(session):
+    try:
+        os.remove(part_path(session))
+    except FileNotFoundError:
+        pass
+
+
+def discard_session(session):
+    if session.status == UploadStatus.WRITING:
+        raise UploadConflict('A chunk is being written.')
+    if session.status == UploadStatus.COMPLETING:
+        raise UploadConflict('Upload is being completed.')
+    discard_part(session)
+    session.delete()
@@ -1,28 +1,57 @@
 from django.urls import path
 from .views import (
-    SubjectListView, SubjectCreateView,
-    LessonListView, LessonCreateView, TopicCreateView,
-    LessonContentView, ContentCreateView,
-    RevisionContentView, RevisionContentCreateView
+    SubjectListView, SubjectCreateView, SubjectTreeView, SubjectBulkView, SearchView,
+    LessonListView, LessonCreateView, LessonBulkView, TopicListView, TopicCreateView, TopicBulkView,
+    LessonContentView, LessonFeedView, ContentCreateView, ContentPackageView,
+    RevisionContentView, RevisionContentCreateView,
+    UploadSessionCreateView, UploadSessionDetailView, UploadSessionCompleteView
+)
+from .media import MediaTokenView
+from .async_views import (
+    AsyncSubjectListView, AsyncLessonListView, AsyncLessonContentView, AsyncRevisionContentView
 )
 
 urlpatterns = [
     # Subjects
     path('subjects/', SubjectListView.as_view(), name='subject-list'),
     path('subjects/create/', SubjectCreateView.as_view(), name='subject-create'),
+    path('subjects/bulk/', SubjectBulkView.as_view(), name='subject-bulk'),
+    path('subjects/<uuid:subject_id>/tree/', SubjectTreeView.as_view(), name='subject-tree'),
+
+    # Search
+    path('search/', SearchView.as_view(), name='search'),
 
     # Lessons
     path('subjects/<uuid:subject_id>/lessons/', LessonListView.as_view(), name='lesson-list'),
     path('lessons/create/', LessonCreateView.as_view(), name='lesson-create'),
+    path('lessons/bulk/', LessonBulkView.as_view(), name='lesson-bulk'),
 
     # Topics
+    path('subjects/<uuid:subject_id>/topics/', TopicListView.as_view(), name='topic-list'),
     path('topics/create/', TopicCreateView.as_view(), name='topic-create'),
+    path('topics/bulk/', TopicBulkView.as_view(), name='topic-bulk'),
 
     # Lesson Content
     path('lessons/<uuid:lesson_id>/contents/', LessonContentView.as_view(), name='lesson-content-list'),
+    path('lessons/<uuid:lesson_id>/feed/', LessonFeedView.as_view(), name='lesson-feed'),
     path('contents/create/', ContentCreateView.as_view(), name='content-create'),
+    path('contents/packages/', ContentPackageView.as_view(), name='content-package'),
+
+    # Signed media URLs
+    path('media-token/', MediaTokenView.as_view(), name='media-token'),
 
     # Revision Content
     path('topics/<uuid:topic_id>/revision-content/', RevisionContentView.as_view(), name='revision-content-list'),
     path('revision-content/create/', RevisionContentCreateView.as_view(), name='revision-content-create'),
+
+    # Chunked Uploads
+    path('uploads/', UploadSessionCreateView.as_view(), name='upload-create'),
+    path('uploads/<uuid:upload_id>/', UploadSessionDetailView.as_view(), name='upload-detail'),
+    path('uploads/<uuid:upload_id>/complete/', UploadSessionCompleteView.as_view(), name='upload-complete'),
+
+    # Async read endpoints (same responses; native async under ASGI)
+    path('async/subjects/', AsyncSubjectListView.as_view(), name='async-subject-list'),
+    path('async/subjects/<uuid:subject_id>/lessons/', AsyncLessonListView.as_view(), name='async-lesson-list'),
+    path('async/lessons/<uuid:lesson_id>/contents/', AsyncLessonContentView.as_view(), name='async-lesson-content-list'),
+    path('async/topics/<uuid:topic_id>/revision-content/', AsyncRevisionContentView.as_view(), name='async-revision-content-list'),
 ]
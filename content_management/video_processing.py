@@ -0,0 +1,208 @@
+# content_management/video_processing.py
+#
+# Video post-processing on a local process pool: probe duration, resolution
+# and bitrate with ffprobe, render a poster frame and a thumbnail strip with
+# ffmpeg, then record the results on the VideoContent and roll the durations
+# up into its Lesson. Workers are spawned and import this module before
+# Django is set up, so models are imported inside the functions that run
+# back in the web process.
+import json
+import logging
+import multiprocessing
+import os
+import subprocess
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+POSTERS_FOLDER = 'posters'
+POSTER_WIDTH = 640
+STRIP_FRAMES = 10
+STRIP_FRAME_WIDTH = 160
+
+
+# Worker side
+
+def _run(command):
+    return subprocess.run(command, check=True, capture_output=True, timeout=600).stdout
+
+
+def probe(path, ffprobe='ffprobe'):
+    output = _run([
+        ffprobe, '-v', 'error', '-print_format', 'json',
+        '-show_format', '-show_streams', '-select_streams', 'v:0', path,
+    ])
+    info = json.loads(output)
+    stream = (info.get('streams') or [{}])[0]
+    media_format = info.get('format', {})
+    duration = media_format.get('duration') or stream.get('duration')
+    bitrate = media_format.get('bit_rate') or stream.get('bit_rate')
+    return {
+        'duration': float(duration) if duration else None,
+        'width': stream.get('width'),
+        'height': stream.get('height'),
+        'bitrate': int(bitrate) if bitrate else None,
+    }
+
+
+def render_images(path, poster_path, strip_path, duration, ffmpeg='ffmpeg'):
+    if not os.path.exists(poster_path):
+        # A frame a tenth of the way in skips black intro frames
+        offset = f'{(duration or 0) * 0.1:.3f}'
+        _run([
+            ffmpeg, '-v', 'error', '-y', '-ss', offset, '-i', path,
+            '-frames:v', '1', '-vf', f'scale={POSTER_WIDTH}:-2', poster_path,
+        ])
+    if duration and not os.path.exists(strip_path):
+        rate = STRIP_FRAMES / duration
+        _run([
+            ffmpeg, '-v', 'error', '-y', '-i', path, '-frames:v', '1',
+            '-vf', f'fps={rate:.6f},scale={STRIP_FRAME_WIDTH}:-2,tile={STRIP_FRAMES}x1', strip_path,
+        ])
+
+
+def process_video_file(path, poster_path, strip_path, ffprobe='ffprobe', ffmpeg='ffmpeg'):
+    metadata = probe(path, ffprobe)
+    os.makedirs(os.path.dirname(poster_path), exist_ok=True)
+    render_images(path, poster_path, strip_path, metadata['duration'], ffmpeg)
+    return metadata
+
+
+# Web process side
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn: workers must not inherit the web process's DB sockets
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.VIDEO_PROCESSING_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _executor
+
+
+def media_path(url):
+    if not url or not url.startswith(settings.MEDIA_URL):
+        return None
+    return os.path.join(settings.MEDIA_ROOT, url[len(settings.MEDIA_URL):])
+
+
+def job_arguments(video):
+    path = media_path(video.url)
+    if path is None or not os.path.isfile(path):
+        return None
+    stem = os.path.splitext(os.path.basename(path))[0]
+    folder = os.path.join(settings.MEDIA_ROOT, POSTERS_FOLDER)
+    return (
+        path,
+        os.path.join(folder, f'{stem}.jpg'),
+        os.path.join(folder, f'{stem}-strip.jpg'),
+        settings.FFPROBE_BINARY,
+        settings.FFMPEG_BINARY,
+    )
+
+
+def enqueue(video_id):
+    # Hand the video to the pool; results are applied from a callback
+    from .models import VideoContent
+
+    video = VideoContent.objects.filter(pk=video_id).first()
+    arguments = video and job_arguments(video)
+    if not arguments:
+        return None
+    future = get_executor().submit(process_video_file, *arguments)
+    future.add_done_callback(lambda done: _apply_future(video_id, arguments, done))
+    return future
+
+
+def _apply_future(video_id, arguments, future):
+    # Runs on the executor's callback thread, which no request cycle ever
+    # cleans up after: the connections it opens are closed here
+    try:
+        apply_result(video_id, arguments, future.result())
+    except Exception:
+        logger.exception('Video processing failed for VideoContent %s', video_id)
+        mark_failed(video_id)
+    finally:
+        connections.close_all()
+
+
+def process_now(video):
+    # Same work without the pool, for the management command
+    arguments = job_arguments(video)
+    if not arguments:
+        mark_failed(video.pk)
+        return False
+    try:
+        apply_result(video.pk, arguments, process_video_file(*arguments))
+    except (OSError, subprocess.SubprocessError, ValueError):
+        logger.exception('Video processing failed for VideoContent %s', video.pk)
+        mark_failed(video.pk)
+        return False
+    return True
+
+
+def apply_result(video_id, arguments, metadata):
+    from .models import ProcessingStatus, VideoContent
+
+    video = VideoContent.objects.select_related('base_content').filter(pk=video_id).first()
+    if video is None:
+        return
+    _, poster_path, strip_path, _, _ = arguments
+    if metadata['duration'] is not None:
+        video.duration = timedelta(seconds=metadata['duration'])
+    video.width = metadata['width']
+    video.height = metadata['height']
+    video.bitrate = metadata['bitrate']
+    video.poster_url = _url_for(poster_path)
+    video.thumbnails_url = _url_for(strip_path)
+    video.processing_status = ProcessingStatus.DONE
+    video.processed_at = timezone.now()
+    # save() rather than update() so the cache and snapshot receivers run
+    video.save()
+    update_lesson_duration(video.base_content.lesson_id)
+
+
+def _url_for(path):
+    if not os.path.exists(path):
+        return ''
+    return settings.MEDIA_URL + os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, '/')
+
+
+def mark_failed(video_id):
+    from .models import ProcessingStatus, VideoContent
+
+    video = VideoContent.objects.filter(pk=video_id).first()
+    if video is not None:
+        video.processing_status = ProcessingStatus.FAILED
+        video.save(update_fields=['processing_status'])
+
+
+def update_lesson_duration(lesson_id):
+    # Each learning type is an alternative track through the lesson, so the
+    # lesson lasts as long as its longest track rather than the sum of all
+    from .models import Lesson, VideoContent
+
+    totals = {}
+    videos = VideoContent.objects.filter(
+        base_content__lesson_id=lesson_id, duration__isnull=False
+    ).values_list('base_content__learning_type', 'duration')
+    for learning_type, duration in videos:
+        totals[learning_type] = totals.get(learning_type, timedelta()) + duration
+    if not totals:
+        return
+    lesson = Lesson.objects.filter(pk=lesson_id).first()
+    if lesson is not None and lesson.duration != max(totals.values()):
+        lesson.duration = max(totals.values())
+        lesson.save(update_fields=['duration', 'updated_at'])
@@ -1,33 +1,54 @@
-import os
-from django.conf import settings
-from django.core.files.storage import FileSystemStorage
+from django.shortcuts import get_object_or_404
 from rest_framework import generics
 from rest_framework.permissions import IsAuthenticated
 from .models import (
     Subject, Lesson, Topic, BaseContent, 
-    VideoContent, DynamicContent, RevisionContent,ContentType
+    VideoContent, DynamicContent, RevisionContent,ContentType,
+    UploadKind, UploadSession, DifficultyLevel
 )
 from .serializers import (
     SubjectSerializer, LessonSerializer, TopicSerializer, 
-    ContentSerializer, VideoContentSerializer, 
-    DynamicContentSerializer, RevisionContentSerializer
+    ContentSerializer, ContentListSerializer, RevisionContentSerializer, UploadSessionSerializer,
+    PackageUploadSerializer, SearchQuerySerializer
 )
-from django.db.models import Prefetch
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework import serializers
+from rest_framework.exceptions import NotFound
+from rest_framework.parsers import MultiPartParser
+from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from users.tokens import get_student_claims
+from . import bulk, feeds, packages, search, snapshots, topics, uploads
+from .cache import CachedListMixin, content_cache
+from .conditional import ConditionalListMixin
+from .pagination import LessonPagination
+from .storage import save_media_file
 
 # Base mixin for student authorization
 class StudentAuthorizationMixin:
     permission_classes = [IsAuthenticated]
 
     def get_student_academic_year(self, request):
-        # Get the student's academic year from the profile
-        return request.user.student_profile.academic_year
+        # Get the student's academic year from the token claims
+        return get_student_claims(request)['academic_year']
+
+    def get_student_learning_type(self, request):
+        return get_student_claims(request)['learning_type']
+
+# Catalog reads: the user is built from the token alone, with no User or
+# profile query. Writes keep the default authentication, which loads the
+# user and so rejects deactivated accounts straight away.
+class StudentReadMixin(StudentAuthorizationMixin):
+    authentication_classes = [JWTStatelessUserAuthentication]
 
 # Subject List by Academic Year
-class SubjectListView(StudentAuthorizationMixin, generics.ListAPIView):
+class SubjectListView(StudentReadMixin, ConditionalListMixin, CachedListMixin, generics.ListAPIView):
     serializer_class = SubjectSerializer
+    cache_scope = 'year'
+
+    def get_cache_scope_id(self):
+        return self.get_student_academic_year(self.request)
 
     def get_queryset(self):
         academic_year = self.get_student_academic_year(self.request)
@@ -41,13 +62,47 @@ class SubjectCreateView(StudentAuthorizationMixin, generics.CreateAPIView):
         serializer.save()
 
 # Lessons List by Subject
-class LessonListView(StudentAuthorizationMixin, generics.ListAPIView):
+class LessonListView(StudentReadMixin, ConditionalListMixin, CachedListMixin, generics.ListAPIView):
     serializer_class = LessonSerializer
+    pagination_class = LessonPagination
+    cache_scope = 'subject'
+
+    def get_cache_scope_id(self):
+        return self.kwargs['subject_id']
 
     def get_queryset(self):
         subject_id = self.kwargs['subject_id']
         return Lesson.objects.filter(subject_id=subject_id, is_active=True).order_by('order')
 
+# Whole curriculum of a subject in one response, served from its snapshot
+class SubjectTreeView(StudentReadMixin, APIView):
+
+    def get(self, request, subject_id):
+        tree = snapshots.get_cached_tree(subject_id)
+        if (
+            tree is None
+            or not tree['is_active']
+            or tree['academic_year'] != self.get_student_academic_year(request)
+        ):
+            raise NotFound("Subject not found.")
+        return Response(tree, status=status.HTTP_200_OK)
+
+# Ranked search over the subjects, lessons and topics of the student's year
+class SearchView(StudentReadMixin, APIView):
+
+    def get(self, request):
+        params = SearchQuerySerializer(data={
+            **request.query_params.dict(), 'kind': request.query_params.getlist('kind'),
+        })
+        params.is_valid(raise_exception=True)
+        query, kinds, limit = params.validated_data['q'], params.validated_data.get('kind'), params.validated_data['limit']
+        academic_year = self.get_student_academic_year(request)
+        results = content_cache.get_or_set(
+            'search', academic_year, (search.terms(query), sorted(kinds or []), limit),
+            lambda: search.search(academic_year, query, kinds, limit),
+        )
+        return Response({"results": results}, status=status.HTTP_200_OK)
+
 # Lesson Creation
 class LessonCreateView(StudentAuthorizationMixin, generics.CreateAPIView):
     serializer_class = LessonSerializer
@@ -55,13 +110,21 @@ class LessonCreateView(StudentAuthorizationMixin, generics.CreateAPIView):
     def perform_create(self, serializer):
         serializer.save()
 
-# Topics List by Subject
-# class TopicListView(StudentAuthorizationMixin, generics.ListAPIView):
-#     serializer_class = TopicSerializer
-
-#     def get_queryset(self):
-#         subject_id = self.kwargs['subject_id']
-#         return Topic.objects.filter(subject_id=subject_id)
+# Topics List by Subject, optionally filtered by difficulty, from the cached topic index
+class TopicListView(StudentReadMixin, APIView):
+
+    def get(self, request, subject_id):
+        difficulty = request.query_params.get('difficulty')
+        if difficulty is not None and difficulty not in DifficultyLevel.values:
+            raise serializers.ValidationError({"difficulty": f"Must be one of {', '.join(DifficultyLevel.values)}."})
+        index = topics.list_topics(subject_id, difficulty)
+        if (
+            index is None
+            or not index['is_active']
+            or index['academic_year'] != self.get_student_academic_year(request)
+        ):
+            raise NotFound("Subject not found.")
+        return Response({"results": index['topics']}, status=status.HTTP_200_OK)
 
 # Topic Creation
 class TopicCreateView(StudentAuthorizationMixin, generics.CreateAPIView):
@@ -70,46 +133,65 @@ class TopicCreateView(StudentAuthorizationMixin, generics.CreateAPIView):
     def perform_create(self, serializer):
         serializer.save()
 
+# Bulk create (POST) or upsert (PUT) of a list of subjects, lessons or topics,
+# all or nothing, with one result per item in request order
+class BulkWriteView(StudentAuthorizationMixin, APIView):
+    writer_class = None
+
+    def post(self, request):
+        results = self.writer_class().save(request.data, upsert=False)
+        return Response({"results": results}, status=status.HTTP_201_CREATED)
+
+    def put(self, request):
+        results = self.writer_class().save(request.data, upsert=True)
+        return Response({"results": results}, status=status.HTTP_200_OK)
+
+
+class SubjectBulkView(BulkWriteView):
+    writer_class = bulk.SubjectWriter
+
+
+class LessonBulkView(BulkWriteView):
+    writer_class = bulk.LessonWriter
+
+
+class TopicBulkView(BulkWriteView):
+    writer_class = bulk.TopicWriter
+
 # Lesson Content by Lesson
-class LessonContentView(StudentAuthorizationMixin, generics.ListAPIView):
-    serializer_class = ContentSerializer
+class LessonContentView(StudentReadMixin, ConditionalListMixin, CachedListMixin, generics.ListAPIView):
+    serializer_class = ContentListSerializer
+    cache_scope = 'lesson'
+
+    def get_cache_scope_id(self):
+        return self.kwargs['lesson_id']
 
     def get_queryset(self):
         lesson_id = self.kwargs['lesson_id']
-        
-        # Get base contents and prefetch related video or dynamic content based on type
-        base_contents = BaseContent.objects.filter(lesson_id=lesson_id).prefetch_related(
-            Prefetch(
-                'video_content',  # Use the related_name defined in VideoContent
-                queryset=VideoContent.objects.all(),
-                to_attr='video_contents'  # This will be a single object due to OneToOneField
-            ),
-            Prefetch(
-                'dynamic_content',  # Use the related_name defined in DynamicContent
-                queryset=DynamicContent.objects.all(),
-                to_attr='dynamic_contents'  # This will be a single object due to OneToOneField
-            )
+
+        # Join the video or dynamic row in the same query; a lesson costs one
+        # SELECT however many items it has
+        return BaseContent.objects.filter(lesson_id=lesson_id).select_related(
+            'video_content', 'dynamic_content'
         )
-        return base_contents
-
-    def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        response_data = []
-
-        for base_content in queryset:
-            content_data = ContentSerializer(base_content).data
-            # Append related content based on content type
-            if base_content.content_type == ContentType.VIDEO:
-                content_data['video_contents'] = VideoContentSerializer(
-                    base_content.video_content  # Accessing single object now
-                ).data if base_content.video_content else None
-            elif base_content.content_type == ContentType.DYNAMIC:
-                content_data['dynamic_contents'] = DynamicContentSerializer(
-                    base_content.dynamic_content  # Accessing single object now
-                ).data if base_content.dynamic_content else None
-            response_data.append(content_data)
-
-        return Response(response_data, status=status.HTTP_200_OK)
+
+# Lesson content for the student's learning type, from the precomputed feed
+class LessonFeedView(StudentReadMixin, APIView):
+
+    def get(self, request, lesson_id):
+        learning_type = self.get_student_learning_type(request)
+        feed = feeds.get_cached_feed(lesson_id, learning_type)
+        if (
+            feed is None
+            or not feed['is_active']
+            or feed['academic_year'] != self.get_student_academic_year(request)
+        ):
+            raise NotFound("Lesson not found.")
+        return Response({
+            "learning_type": learning_type,
+            "served_type": feed['served_type'],
+            "results": feed['items'],
+        }, status=status.HTTP_200_OK)
 
 # BaseContent Creation with Video/Dynamic Content Handling
 class ContentCreateView(StudentAuthorizationMixin, generics.CreateAPIView):
@@ -125,9 +207,7 @@ class ContentCreateView(StudentAuthorizationMixin, generics.CreateAPIView):
         if content_type == ContentType.VIDEO:
             file = self.request.FILES.get("file")
             if file:
-                fs = FileSystemStorage(location=os.path.join(settings.MEDIA_ROOT, "videos"))
-                filename = fs.save(file.name, file)
-                file_url = fs.url(os.path.join("videos", filename))
+                file_url = save_media_file(file)
 
                 # Create associated VideoContent
                 VideoContent.objects.create(base_content=base_content, url=file_url)
@@ -137,9 +217,7 @@ class ContentCreateView(StudentAuthorizationMixin, generics.CreateAPIView):
         elif content_type == ContentType.DYNAMIC:
             file = self.request.FILES.get("file")
             if file:
-                fs = FileSystemStorage(location=os.path.join(settings.MEDIA_ROOT, "web_pages"))
-                filename = fs.save(file.name, file)
-                file_url = fs.url(os.path.join("web_pages", filename))
+                file_url = save_media_file(file)
 
                 # Create associated DynamicContent
                 DynamicContent.objects.create(base_content=base_content, url=file_url)
@@ -151,13 +229,33 @@ class ContentCreateView(StudentAuthorizationMixin, generics.CreateAPIView):
 
 
 
+# Zip course package: one DYNAMIC content item per page in its manifest
+class ContentPackageView(StudentAuthorizationMixin, APIView):
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        serializer = PackageUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        contents = packages.ingest_package(data['file'], data['lesson'], data['learning_type'])
+        contents = BaseContent.objects.filter(pk__in=[content.pk for content in contents]).select_related(
+            'video_content', 'dynamic_content'
+        ).order_by('created_at', 'id')
+        return Response(ContentListSerializer(contents, many=True).data, status=status.HTTP_201_CREATED)
+
 # Revision Content by Topic
-class RevisionContentView(StudentAuthorizationMixin, generics.ListAPIView):
+class RevisionContentView(StudentReadMixin, ConditionalListMixin, CachedListMixin, generics.ListAPIView):
     serializer_class = RevisionContentSerializer
+    cache_scope = 'topic'
+    # Each item embeds its topic
+    validator_fields = ('updated_at', 'topic__updated_at')
+
+    def get_cache_scope_id(self):
+        return self.kwargs['topic_id']
 
     def get_queryset(self):
         topic_id = self.kwargs['topic_id']
-        return RevisionContent.objects.filter(topic_id=topic_id)
+        return RevisionContent.objects.filter(topic_id=topic_id).select_related('topic')
 
 
 
@@ -169,10 +267,63 @@ class RevisionContentCreateView(StudentAuthorizationMixin, generics.CreateAPIVie
         file = self.request.FILES.get('file')
         if file:
             # Store the file on the server
-            fs = FileSystemStorage(location=os.path.join(settings.MEDIA_ROOT, 'revisions'))
-            filename = fs.save(file.name, file)
-            file_url = fs.url(os.path.join('revisions', filename))
+            file_url = save_media_file(file)
             # Save the URL in the database
             serializer.save(video_url=file_url)
         else:
             serializer.save()
+
+
+# Chunked Upload: start a session for a large video, web page or revision file
+class UploadSessionCreateView(StudentAuthorizationMixin, generics.CreateAPIView):
+    serializer_class = UploadSessionSerializer
+
+    def perform_create(self, serializer):
+        # Validate the row-to-be now rather than after gigabytes have arrived
+        data = serializer.validated_data
+        metadata = uploads.metadata_serializer(data['kind'], data.get('metadata', {}))
+        if not metadata.is_valid():
+            raise serializers.ValidationError({"metadata": metadata.errors})
+
+        session = serializer.save(user_id=self.request.user.pk)
+        uploads.start_session(session)
+
+
+# Chunked Upload: offset lookup (GET), byte-range append (PUT) and abort (DELETE)
+class UploadSessionDetailView(StudentAuthorizationMixin, APIView):
+
+    def get_session(self, request, upload_id):
+        return get_object_or_404(UploadSession, pk=upload_id, user_id=request.user.pk)
+
+    def get(self, request, upload_id):
+        session = self.get_session(request, upload_id)
+        return Response(UploadSessionSerializer(session).data, status=status.HTTP_200_OK)
+
+    def put(self, request, upload_id):
+        session = self.get_session(request, upload_id)
+        start, length = uploads.parse_content_range(request.headers.get('Content-Range'), session.size)
+        if int(request.META.get('CONTENT_LENGTH') or 0) != length:
+            raise serializers.ValidationError({"Content-Length": "Must equal the length of Content-Range."})
+
+        # Stream the body straight to disk; request.data is never touched
+        session = uploads.write_chunk(
+            session.pk, request.stream, start, length, request.headers.get('X-Chunk-SHA256')
+        )
+        return Response(UploadSessionSerializer(session).data, status=status.HTTP_200_OK)
+
+    def delete(self, request, upload_id):
+        uploads.discard_session(self.get_session(request, upload_id))
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+# Chunked Upload: verify the whole file and create the content row
+class UploadSessionCompleteView(StudentAuthorizationMixin, APIView):
+
+    def post(self, request, upload_id):
+        session = get_object_or_404(UploadSession, pk=upload_id, user_id=request.user.pk)
+        instance = uploads.complete_session(session)
+        if session.kind == UploadKind.REVISION:
+            data = RevisionContentSerializer(instance).data
+        else:
+            data = ContentListSerializer(instance).data
+        return Response(data, status=status.HTTP_201_CREATED)
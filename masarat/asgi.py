@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'masarat.settings')
 
 application = get_asgi_application()
+
+# Each worker starts with the token blacklist loaded
+from users.blacklist import warm_blacklist_index  # noqa: E402
+
+warm_blacklist_index()
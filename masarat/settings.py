@@ -43,6 +43,8 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
+    "DEFAULT_PAGINATION_CLASS": "content_management.pagination.KeysetPagination",
+    "PAGE_SIZE": 50,
 }
 
 SIMPLE_JWT = {
@@ -53,6 +55,10 @@ SIMPLE_JWT = {
     'ALGORITHM': 'HS256',
     'SIGNING_KEY': settings.SECRET_KEY,
     'AUTH_HEADER_TYPES': ('Bearer',),
+    # Tokens carry the student's academic_year and learning_type
+    'TOKEN_OBTAIN_SERIALIZER': 'users.tokens.StudentTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'users.tokens.StudentTokenRefreshSerializer',
+    'TOKEN_BLACKLIST_SERIALIZER': 'users.tokens.IndexedTokenBlacklistSerializer',
 }
 # Application definition
 
@@ -68,10 +74,13 @@ INSTALLED_APPS = [
     "corsheaders",
     'rest_framework_simplejwt.token_blacklist',
     'content_management',
+    'progress',
     'drf_yasg'
 ]
 
 MIDDLEWARE = [
+    'utils.timing.ServerTimingMiddleware',
+    'utils.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -120,6 +129,26 @@ DATABASES = {
 }
 
 
+# Cache
+# The shared tier of the content cache; point CACHE_BACKEND at Redis or
+# Memcached in production so every worker sees the same versions.
+
+# The default locmem cache is private to each process. Run more than one
+# worker process and CACHE_BACKEND must be shared (memcached, redis), or
+# profile changes made mid-token (users.tokens.publish_claims_override),
+# profiler rules and the content cache versions only reach one worker.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='masarat'),
+    }
+}
+
+CMS_CACHE_ALIAS = 'default'
+CMS_CACHE_LOCAL_MAXSIZE = config('CMS_CACHE_LOCAL_MAXSIZE', default=2048, cast=int)
+CMS_CACHE_SHARED_TIMEOUT = config('CMS_CACHE_SHARED_TIMEOUT', default=60 * 60, cast=int)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -169,6 +198,60 @@ CORS_ALLOWS_CREDENTIALS = True
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Uploads are hashed while they stream in, for the content-addressed media store
+FILE_UPLOAD_HANDLERS = [
+    'content_management.storage.HashingMemoryFileUploadHandler',
+    'content_management.storage.HashingTemporaryFileUploadHandler',
+]
+
+# Hand media bytes to the front-end server after the auth check: 'nginx'
+# (X-Accel-Redirect to an internal location) or 'apache' (X-Sendfile).
+# Empty means Django streams the file itself.
+MEDIA_SENDFILE_BACKEND = config('MEDIA_SENDFILE_BACKEND', default='')
+MEDIA_ACCEL_REDIRECT_PREFIX = config('MEDIA_ACCEL_REDIRECT_PREFIX', default='/protected-media/')
+# Lifetime of the signed media URLs handed to <video>/<iframe> clients
+MEDIA_TOKEN_LIFETIME = config('MEDIA_TOKEN_LIFETIME', default=2 * 60 * 60, cast=int)  # seconds
+
+# Background video post-processing (probe, poster, thumbnail strip)
+VIDEO_PROCESSING_ENABLED = config('VIDEO_PROCESSING_ENABLED', default=True, cast=bool)
+VIDEO_PROCESSING_WORKERS = config('VIDEO_PROCESSING_WORKERS', default=2, cast=int)
+FFPROBE_BINARY = config('FFPROBE_BINARY', default='ffprobe')
+FFMPEG_BINARY = config('FFMPEG_BINARY', default='ffmpeg')
+
+# Chunked uploads are assembled here (outside MEDIA_ROOT) until finalized
+UPLOAD_SESSION_ROOT = config('UPLOAD_SESSION_ROOT', default=os.path.join(BASE_DIR, 'upload_sessions'))
+CHUNKED_UPLOAD_MAX_SIZE = config('CHUNKED_UPLOAD_MAX_SIZE', default=20 * 1024 ** 3, cast=int)
+# A chunk still being written after this long is taken to be abandoned
+CHUNKED_UPLOAD_WRITE_TIMEOUT = config('CHUNKED_UPLOAD_WRITE_TIMEOUT', default=600, cast=int)  # seconds
+
+# Zip course packages for dynamic content, unpacked under MEDIA_ROOT/packages
+CONTENT_PACKAGE_MAX_SIZE = config('CONTENT_PACKAGE_MAX_SIZE', default=2 * 1024 ** 3, cast=int)  # unpacked bytes
+CONTENT_PACKAGE_MAX_FILES = config('CONTENT_PACKAGE_MAX_FILES', default=10000, cast=int)
+CONTENT_PACKAGE_WORKERS = config('CONTENT_PACKAGE_WORKERS', default=4, cast=int)
+
+# Video heartbeats are coalesced in memory and written in batches
+PROGRESS_FLUSH_INTERVAL = config('PROGRESS_FLUSH_INTERVAL', default=5, cast=float)  # seconds; 0 = no flusher thread
+PROGRESS_FLUSH_SIZE = config('PROGRESS_FLUSH_SIZE', default=5000, cast=int)  # pending keys that trigger a flush
+PROGRESS_COMPLETE_RATIO = config('PROGRESS_COMPLETE_RATIO', default=0.9, cast=float)
+
+# Largest batch the bulk create/upsert endpoints accept in one request
+CMS_BULK_MAX_ITEMS = config('CMS_BULK_MAX_ITEMS', default=1000, cast=int)
+
+# Per-request SQL/serializer/render timing: a Server-Timing header and histograms on /metrics
+SERVER_TIMING_HEADER = config('SERVER_TIMING_HEADER', default=True, cast=bool)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')  # bearer token the scraper must send; empty = open
+METRICS_DIR = config('METRICS_DIR', default='')  # shared by worker processes; empty = this process only
+METRICS_WRITE_INTERVAL = config('METRICS_WRITE_INTERVAL', default=10, cast=float)  # seconds
+
+# On-demand profiling of live requests, switched on by admins at /profiler/.
+# Rules are kept in the default cache: with more than one worker process,
+# set CACHE_BACKEND to a shared cache or each worker only sees its own rules.
+PROFILER_DIR = config('PROFILER_DIR', default=os.path.join(BASE_DIR, 'profiles'))
+PROFILER_MAX_CAPTURES = config('PROFILER_MAX_CAPTURES', default=200, cast=int)  # oldest are deleted first
+PROFILER_MAX_BYTES = config('PROFILER_MAX_BYTES', default=200 * 1024 ** 2, cast=int)
+PROFILER_SYNC_SECONDS = config('PROFILER_SYNC_SECONDS', default=5, cast=float)  # how soon processes see rule changes
+PROFILER_SAMPLE_INTERVAL = config('PROFILER_SAMPLE_INTERVAL', default=0.005, cast=float)  # seconds, stack sampling mode
+
 
 
 EMAIL_BACKEND = config('EMAIL_BACKEND')
@@ -178,3 +261,16 @@ EMAIL_USE_TLS = config('EMAIL_USE_TLS', cast=bool)  # Cast to bool
 EMAIL_HOST_USER = config('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL')
+
+# Email outbox: views queue mail, `manage.py send_outbox` delivers it
+EMAIL_OUTBOX_BATCH_SIZE = config('EMAIL_OUTBOX_BATCH_SIZE', default=100, cast=int)
+EMAIL_OUTBOX_MAX_ATTEMPTS = config('EMAIL_OUTBOX_MAX_ATTEMPTS', default=6, cast=int)
+EMAIL_OUTBOX_RETRY_DELAY = config('EMAIL_OUTBOX_RETRY_DELAY', default=30, cast=int)  # seconds, doubled per attempt
+EMAIL_OUTBOX_LEASE_SECONDS = config('EMAIL_OUTBOX_LEASE_SECONDS', default=300, cast=int)
+EMAIL_OUTBOX_DEDUPE_SECONDS = config('EMAIL_OUTBOX_DEDUPE_SECONDS', default=300, cast=int)
+
+# Upper bound on how stale a process's in-memory token blacklist index may get
+TOKEN_BLACKLIST_SYNC_SECONDS = config('TOKEN_BLACKLIST_SYNC_SECONDS', default=30, cast=int)
+# Each sync re-reads rows blacklisted this long before the previous one, to
+# catch transactions that committed late
+TOKEN_BLACKLIST_SYNC_OVERLAP = config('TOKEN_BLACKLIST_SYNC_OVERLAP', default=300, cast=int)  # seconds
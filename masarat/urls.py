@@ -14,13 +14,16 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
 from django.contrib import admin
 from django.conf import settings
-from django.conf.urls.static import static
-from django.urls import path, include
+from django.urls import path, re_path, include
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 from rest_framework import permissions
+from content_management.media import MediaView
+from utils.metrics import MetricsView
+from utils.profiling import ProfilerCaptureView, ProfilerView
 
 # Schema view for Swagger and Redoc
 schema_view = get_schema_view(
@@ -40,8 +43,19 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('users/', include('users.urls')),  # Include the users app URLs
     path('cms/', include('content_management.urls')),  # Includes all URLs from your LMS app
+    path('progress/', include('progress.urls')),
+
+    # Prometheus scrape endpoint: per-URL-name latency, SQL and DRF histograms
+    path('metrics', MetricsView.as_view(), name='metrics'),
+
+    # On-demand request profiling (admin only)
+    path('profiler/', ProfilerView.as_view(), name='profiler'),
+    path('profiler/captures/<str:filename>', ProfilerCaptureView.as_view(), name='profiler-capture'),
 
     # Swagger and Redoc URLs
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+
+    # Media files (authenticated, with Range support)
+    re_path(r'^%s(?P<path>.*)$' % re.escape(settings.MEDIA_URL.lstrip('/')), MediaView.as_view(), name='media'),
+]
\ No newline at end of file
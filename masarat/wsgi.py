@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'masarat.settings')
 
 application = get_wsgi_application()
+
+# Each worker starts with the token blacklist loaded
+from users.blacklist import warm_blacklist_index  # noqa: E402
+
+warm_blacklist_index()
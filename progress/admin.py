@@ -0,0 +1,7 @@
+from django.contrib import admin
+from .models import ContentProgress, LessonRollup, SubjectRollup, YearRollup
+
+admin.site.register(ContentProgress)
+admin.site.register(LessonRollup)
+admin.site.register(SubjectRollup)
+admin.site.register(YearRollup)
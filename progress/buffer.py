@@ -0,0 +1,230 @@
+# progress/buffer.py
+#
+# Video players report progress every few seconds. Each heartbeat only
+# updates an entry in this process's buffer, keyed on (user, content), so a
+# student watching one video for ten minutes costs one row write per flush
+# rather than a couple of hundred. A background thread writes the whole
+# buffer with one locked read and one upsert every PROGRESS_FLUSH_INTERVAL
+# seconds, or as soon as PROGRESS_FLUSH_SIZE keys are waiting. The same
+# transaction adds what changed to the completion rollups.
+import atexit
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.utils import timezone
+
+from content_management.models import BaseContent
+from users.models import StudentProfile
+
+from . import rollups
+from .models import ContentProgress
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_FIELDS = (
+    'position_seconds', 'furthest_seconds', 'duration_seconds', 'completed', 'completed_at', 'last_seen_at',
+)
+
+
+def merge(older, newer):
+    # Position follows whichever report was seen last, which is not always
+    # the one that arrived last; how far the student got, and whether they
+    # finished, never go back
+    latest = older if older['last_seen_at'] > newer['last_seen_at'] else newer
+    merged = dict(newer)
+    merged['position_seconds'] = latest['position_seconds']
+    merged['furthest_seconds'] = max(older['furthest_seconds'], newer['furthest_seconds'])
+    merged['duration_seconds'] = newer['duration_seconds'] or older['duration_seconds']
+    if older['completed']:
+        merged['completed'], merged['completed_at'] = True, older['completed_at']
+    merged['last_seen_at'] = max(older['last_seen_at'], newer['last_seen_at'])
+    return merged
+
+
+def heartbeat_entry(content_id, position, duration=None, completed=False, seen_at=None):
+    seen_at = seen_at or timezone.now()
+    completed = completed or bool(duration and position >= duration * settings.PROGRESS_COMPLETE_RATIO)
+    return {
+        'content_id': content_id,
+        'position_seconds': position,
+        'furthest_seconds': position,
+        'duration_seconds': duration,
+        'completed': completed,
+        'completed_at': seen_at if completed else None,
+        'last_seen_at': seen_at,
+    }
+
+
+def student_profiles(user_ids):
+    # Token users carry the id as it was encoded in the JWT, maybe a string
+    return {
+        str(user_id): (pk, academic_year) for user_id, pk, academic_year in StudentProfile.objects.filter(
+            user_id__in=user_ids
+        ).values_list('user_id', 'pk', 'academic_year')
+    }
+
+
+def content_lessons(content_ids):
+    return {
+        pk: (lesson_id, subject_id) for pk, lesson_id, subject_id in BaseContent.objects.filter(
+            pk__in=content_ids
+        ).values_list('pk', 'lesson_id', 'lesson__subject_id')
+    }
+
+
+def write_progress(entries):
+    # Upserts {(user_id, content_id): entry}; returns the saved rows.
+    # Heartbeats for unknown students or content are dropped here, so the
+    # request path never has to look them up.
+    profiles = student_profiles({user_id for user_id, _ in entries})
+    lessons = content_lessons({content_id for _, content_id in entries})
+    try:
+        return _upsert(entries, profiles, lessons)
+    except IntegrityError:
+        pass
+    # A student or content row was deleted after the lookup. Write one entry
+    # at a time and drop the ones that still fail, rather than have the
+    # buffer retry the whole batch forever.
+    rows = []
+    for key, entry in entries.items():
+        try:
+            rows += _upsert({key: entry}, profiles, lessons)
+        except IntegrityError:
+            logger.warning('Dropped progress for user %s on content %s: no longer exists', *key)
+    return rows
+
+
+def _upsert(entries, profiles, lessons):
+    with transaction.atomic():
+        existing = {
+            (row.student_id, row.content_id): row
+            for row in ContentProgress.objects.select_for_update().filter(
+                student_id__in=[pk for pk, _ in profiles.values()], content_id__in=lessons
+            )
+        }
+        rows = []
+        deltas = rollups.Deltas()
+        for (user_id, content_id), entry in entries.items():
+            if str(user_id) not in profiles or content_id not in lessons:
+                continue
+            student_id, academic_year = profiles[str(user_id)]
+            lesson_id, subject_id = lessons[content_id]
+            stored = existing.get((student_id, content_id))
+            if stored is not None:
+                entry = merge({field: getattr(stored, field) for field in PROGRESS_FIELDS}, entry)
+            deltas.add(
+                academic_year, lesson_id, subject_id,
+                started=int(stored is None),
+                completed=int(entry['completed'] and not (stored is not None and stored.completed)),
+            )
+            rows.append(ContentProgress(
+                student_id=student_id, content_id=content_id, lesson_id=lesson_id,
+                **{field: entry[field] for field in PROGRESS_FIELDS},
+            ))
+        ContentProgress.objects.bulk_create(
+            rows, update_conflicts=True, unique_fields=['student', 'content'],
+            update_fields=list(PROGRESS_FIELDS),
+        )
+        deltas.apply()
+        # Foreign keys are only checked at commit, which may be an outer
+        # transaction's; check them here, where the failure can be handled
+        connection.check_constraints(table_names=[ContentProgress._meta.db_table])
+    return rows
+
+
+class HeartbeatBuffer:
+    def __init__(self):
+        self._pending = {}
+        self._by_user = defaultdict(set)
+        # Entries being written by a flush, still served to readers meanwhile
+        self._flushing = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def add(self, user_id, entry):
+        key = (user_id, entry['content_id'])
+        with self._lock:
+            older = self._pending.get(key)
+            self._pending[key] = merge(older, entry) if older else entry
+            self._by_user[user_id].add(entry['content_id'])
+            size = len(self._pending)
+        if settings.PROGRESS_FLUSH_INTERVAL <= 0:
+            # No flusher thread: write inline once the buffer is full
+            if size >= settings.PROGRESS_FLUSH_SIZE:
+                self.flush()
+            return
+        self.start()
+        if size >= settings.PROGRESS_FLUSH_SIZE:
+            self._wake.set()
+
+    def _lookup(self, key):
+        pending, flushing = self._pending.get(key), self._flushing.get(key)
+        if pending and flushing:
+            return merge(flushing, pending)
+        return dict(pending or flushing) if pending or flushing else None
+
+    def get(self, user_id, content_id):
+        with self._lock:
+            return self._lookup((user_id, content_id))
+
+    def latest(self, user_id):
+        # The user's most recently reported item not yet written
+        with self._lock:
+            content_ids = self._by_user.get(user_id, set()) | {
+                content_id for key_user, content_id in self._flushing if key_user == user_id
+            }
+            entries = [self._lookup((user_id, content_id)) for content_id in content_ids]
+        return max(entries, key=lambda entry: entry['last_seen_at']) if entries else None
+
+    def __len__(self):
+        return len(self._pending)
+
+    def flush(self):
+        with self._lock:
+            if self._flushing:
+                return 0  # another thread is writing
+            entries, self._pending, self._by_user = self._pending, {}, defaultdict(set)
+            self._flushing = entries
+        if not entries:
+            return 0
+        try:
+            write_progress(entries)
+        except Exception:
+            # Put the entries back under anything newer, to retry next flush
+            with self._lock:
+                for key, entry in entries.items():
+                    newer = self._pending.get(key)
+                    self._pending[key] = merge(entry, newer) if newer else entry
+                    self._by_user[key[0]].add(key[1])
+            raise
+        finally:
+            with self._lock:
+                self._flushing = {}
+        return len(entries)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='progress-flush', daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self._wake.wait(settings.PROGRESS_FLUSH_INTERVAL)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Writing buffered progress failed')
+            finally:
+                close_old_connections()
+
+
+progress_buffer = HeartbeatBuffer()
@@ -0,0 +1,15 @@
+# progress/management/commands/reconcile_rollups.py
+#
+# Run nightly (e.g. from cron) to correct any drift in the completion rollups
+from django.core.management.base import BaseCommand
+
+from progress import rollups
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the lesson, subject and academic year completion rollups from the stored progress'
+
+    def handle(self, *args, **options):
+        for model, count in rollups.reconcile().items():
+            self.stdout.write(f'{model}: {count} row(s)')
+        self.stdout.write(self.style.SUCCESS('Rollups reconciled'))
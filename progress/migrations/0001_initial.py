@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:49
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('content_management', '0008_lesson_feed'),
+        ('users', '0002_email_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContentProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position_seconds', models.PositiveIntegerField(default=0)),
+                ('furthest_seconds', models.PositiveIntegerField(default=0)),
+                ('duration_seconds', models.PositiveIntegerField(blank=True, null=True)),
+                ('completed', models.BooleanField(default=False)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('last_seen_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('content', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='progress', to='content_management.basecontent')),
+                ('lesson', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='content_progress', to='content_management.lesson')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='content_progress', to='users.studentprofile')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['student', '-last_seen_at'], name='progress_student_recent_idx')],
+                'constraints': [models.UniqueConstraint(fields=('student', 'content'), name='content_progress_uniq')],
+            },
+        ),
+    ]
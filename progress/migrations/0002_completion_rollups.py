@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content_management', '0008_lesson_feed'),
+        ('progress', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='YearRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('academic_year', models.CharField(choices=[('Primary 1', 'Primary Year 1'), ('Primary 2', 'Primary Year 2'), ('Primary 3', 'Primary Year 3'), ('Primary 4', 'Primary Year 4'), ('Primary 5', 'Primary Year 5'), ('Primary 6', 'Primary Year 6'), ('Prep 1', 'Prep Year 1'), ('Prep 2', 'Prep Year 2'), ('Prep 3', 'Prep Year 3'), ('Secondary 1', 'Secondary Year 1'), ('Secondary 2', 'Secondary Year 2'), ('Secondary 3', 'Secondary Year 3')], max_length=20)),
+                ('started_count', models.PositiveIntegerField(default=0)),
+                ('completed_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('academic_year',), name='year_rollup_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='LessonRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('academic_year', models.CharField(choices=[('Primary 1', 'Primary Year 1'), ('Primary 2', 'Primary Year 2'), ('Primary 3', 'Primary Year 3'), ('Primary 4', 'Primary Year 4'), ('Primary 5', 'Primary Year 5'), ('Primary 6', 'Primary Year 6'), ('Prep 1', 'Prep Year 1'), ('Prep 2', 'Prep Year 2'), ('Prep 3', 'Prep Year 3'), ('Secondary 1', 'Secondary Year 1'), ('Secondary 2', 'Secondary Year 2'), ('Secondary 3', 'Secondary Year 3')], max_length=20)),
+                ('started_count', models.PositiveIntegerField(default=0)),
+                ('completed_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('lesson', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='content_management.lesson')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('lesson', 'academic_year'), name='lesson_rollup_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SubjectRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('academic_year', models.CharField(choices=[('Primary 1', 'Primary Year 1'), ('Primary 2', 'Primary Year 2'), ('Primary 3', 'Primary Year 3'), ('Primary 4', 'Primary Year 4'), ('Primary 5', 'Primary Year 5'), ('Primary 6', 'Primary Year 6'), ('Prep 1', 'Prep Year 1'), ('Prep 2', 'Prep Year 2'), ('Prep 3', 'Prep Year 3'), ('Secondary 1', 'Secondary Year 1'), ('Secondary 2', 'Secondary Year 2'), ('Secondary 3', 'Secondary Year 3')], max_length=20)),
+                ('started_count', models.PositiveIntegerField(default=0)),
+                ('completed_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='content_management.subject')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('subject', 'academic_year'), name='subject_rollup_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,71 @@
+from django.db import models
+from django.utils import timezone
+
+from content_management.models import BaseContent, Lesson, Subject
+from users.models import AcademicYear, StudentProfile
+
+
+class ContentProgress(models.Model):
+    # How far one student has got through one content item. Rows are written
+    # in batches by the heartbeat buffer (see buffer.py), never per request.
+    student = models.ForeignKey(StudentProfile, on_delete=models.CASCADE, related_name='content_progress')
+    content = models.ForeignKey(BaseContent, on_delete=models.CASCADE, related_name='progress')
+    # Copied from the content so per-lesson reads need no join
+    lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, related_name='content_progress')
+    position_seconds = models.PositiveIntegerField(default=0)
+    furthest_seconds = models.PositiveIntegerField(default=0)
+    duration_seconds = models.PositiveIntegerField(null=True, blank=True)
+    completed = models.BooleanField(default=False)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    last_seen_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'content'], name='content_progress_uniq'),
+        ]
+        indexes = [
+            # "Continue where you left off": a student's most recent item
+            models.Index(fields=['student', '-last_seen_at'], name='progress_student_recent_idx'),
+        ]
+
+    def __str__(self):
+        return f"Progress of {self.student_id} on {self.content_id}"
+
+
+class RollupCounts(models.Model):
+    # Per-cohort counters kept up to date by progress flushes (as deltas)
+    # and recomputed exactly by reconcile_rollups
+    academic_year = models.CharField(max_length=20, choices=AcademicYear.choices)
+    started_count = models.PositiveIntegerField(default=0)
+    completed_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        abstract = True
+
+
+class LessonRollup(RollupCounts):
+    lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, related_name='rollups')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['lesson', 'academic_year'], name='lesson_rollup_uniq'),
+        ]
+
+
+class SubjectRollup(RollupCounts):
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='rollups')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['subject', 'academic_year'], name='subject_rollup_uniq'),
+        ]
+
+
+class YearRollup(RollupCounts):
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['academic_year'], name='year_rollup_uniq'),
+        ]
@@ -0,0 +1,191 @@
+# progress/rollups.py
+#
+# Completion counts per lesson, subject and academic year cohort. Each flush
+# of the heartbeat buffer adds what it changed (items started, items newly
+# completed) to the rollup rows in the same transaction, so a dashboard reads
+# a handful of rows instead of grouping every student's progress. Counts can
+# drift when progress or content is deleted; reconcile() recomputes them all.
+from collections import Counter
+from urllib.parse import quote
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from content_management.models import BaseContent, Lesson
+from users.models import StudentProfile
+
+from .models import ContentProgress, LessonRollup, SubjectRollup, YearRollup
+
+# Cohort sizes are counted at most this often per year
+COHORT_SIZE_TIMEOUT = 300
+
+# model -> the fields a row is keyed on, besides academic_year
+ROLLUP_KEYS = (
+    (LessonRollup, ('lesson_id',)),
+    (SubjectRollup, ('subject_id',)),
+    (YearRollup, ()),
+)
+
+
+class Deltas:
+    def __init__(self):
+        self.started = {model: Counter() for model, _ in ROLLUP_KEYS}
+        self.completed = {model: Counter() for model, _ in ROLLUP_KEYS}
+
+    def add(self, academic_year, lesson_id, subject_id, started, completed):
+        keys = {
+            LessonRollup: (lesson_id, academic_year),
+            SubjectRollup: (subject_id, academic_year),
+            YearRollup: (academic_year,),
+        }
+        for model, key in keys.items():
+            self.started[model][key] += started
+            self.completed[model][key] += completed
+
+    def apply(self):
+        # Must run inside the transaction that saved the progress. Missing rows
+        # are inserted first so every row can be locked before it's added to.
+        now = timezone.now()
+        for model, fields in ROLLUP_KEYS:
+            keys = set(+self.started[model]) | set(+self.completed[model])
+            if not keys:
+                continue
+            fields = (*fields, 'academic_year')
+            model.objects.bulk_create(
+                [model(**dict(zip(fields, key))) for key in keys], ignore_conflicts=True,
+            )
+            rows = model.objects.select_for_update().filter(
+                academic_year__in={key[-1] for key in keys},
+                **({f'{fields[0]}__in': {key[0] for key in keys}} if len(fields) > 1 else {}),
+            )
+            changed = []
+            for row in rows:
+                key = tuple(getattr(row, field) for field in fields)
+                if key in keys:
+                    row.started_count += self.started[model][key]
+                    row.completed_count += self.completed[model][key]
+                    # bulk_update bypasses auto_now
+                    row.updated_at = now
+                    changed.append(row)
+            model.objects.bulk_update(changed, ['started_count', 'completed_count', 'updated_at'])
+
+
+def cohort_size(academic_year):
+    return cache.get_or_set(
+        f'progress:cohort:{quote(academic_year)}',
+        lambda: StudentProfile.objects.filter(academic_year=academic_year).count(),
+        COHORT_SIZE_TIMEOUT,
+    )
+
+
+def completion(started, completed, students, items):
+    possible = students * items
+    return {
+        'students': students,
+        'items': items,
+        'started_count': started,
+        'completed_count': completed,
+        'completion_percent': round(100 * completed / possible, 1) if possible else None,
+    }
+
+
+def subject_dashboard(subject):
+    # One row per cohort with progress in the subject, then per lesson
+    items = dict(
+        BaseContent.objects.filter(lesson__subject=subject).values('lesson_id')
+        .annotate(count=Count('id')).values_list('lesson_id', 'count')
+    )
+    total_items = sum(items.values())
+    lessons = list(Lesson.objects.filter(subject=subject).order_by('order').values('id', 'title', 'order'))
+    by_lesson = {}
+    for row in LessonRollup.objects.filter(lesson__subject=subject):
+        by_lesson.setdefault(row.lesson_id, []).append(row)
+
+    cohorts = []
+    for row in SubjectRollup.objects.filter(subject=subject).order_by('academic_year'):
+        cohorts.append({
+            'academic_year': row.academic_year,
+            **completion(row.started_count, row.completed_count, cohort_size(row.academic_year), total_items),
+        })
+    return {
+        'subject': subject.pk,
+        'cohorts': cohorts,
+        'lessons': [
+            {
+                'lesson': lesson['id'], 'title': lesson['title'], 'order': lesson['order'],
+                'cohorts': [
+                    {
+                        'academic_year': row.academic_year,
+                        **completion(
+                            row.started_count, row.completed_count,
+                            cohort_size(row.academic_year), items.get(lesson['id'], 0),
+                        ),
+                    }
+                    for row in sorted(by_lesson.get(lesson['id'], []), key=lambda row: row.academic_year)
+                ],
+            }
+            for lesson in lessons
+        ],
+    }
+
+
+def year_dashboard(academic_year):
+    # The cohort overall, then per subject it has progress in
+    students = cohort_size(academic_year)
+    rows = list(
+        SubjectRollup.objects.filter(academic_year=academic_year).select_related('subject')
+        .order_by('subject__name')
+    )
+    items = dict(
+        BaseContent.objects.filter(lesson__subject__in=[row.subject_id for row in rows]).values('lesson__subject')
+        .annotate(count=Count('id')).values_list('lesson__subject', 'count')
+    )
+    year = YearRollup.objects.filter(academic_year=academic_year).first()
+    return {
+        'academic_year': academic_year,
+        'students': students,
+        'started_count': year.started_count if year else 0,
+        'completed_count': year.completed_count if year else 0,
+        'subjects': [
+            {
+                'subject': row.subject_id, 'name': row.subject.name,
+                **completion(row.started_count, row.completed_count, students, items.get(row.subject_id, 0)),
+            }
+            for row in rows
+        ],
+    }
+
+
+def reconcile():
+    # Rebuilds every rollup from ContentProgress. Flushes wait on the table
+    # locks until it commits, so no delta lands on a half-rebuilt table.
+    # Returns the number of rows written per model.
+    started = Count('id')
+    completed = Count('id', filter=Q(completed=True))
+    groupings = {
+        LessonRollup: ('lesson_id', 'student__academic_year'),
+        SubjectRollup: ('lesson__subject_id', 'student__academic_year'),
+        YearRollup: ('student__academic_year',),
+    }
+    written = {}
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                for model, _ in ROLLUP_KEYS:
+                    cursor.execute(f'LOCK TABLE {model._meta.db_table} IN EXCLUSIVE MODE')
+        for model, fields in ROLLUP_KEYS:
+            grouping = groupings[model]
+            counts = ContentProgress.objects.order_by().values(*grouping).annotate(started=started, completed=completed)
+            rows = [
+                model(
+                    **dict(zip((*fields, 'academic_year'), [row[field] for field in grouping])),
+                    started_count=row['started'], completed_count=row['completed'],
+                )
+                for row in counts
+            ]
+            model.objects.all().delete()
+            model.objects.bulk_create(rows, batch_size=1000)
+            written[model.__name__] = len(rows)
+    return written
@@ -0,0 +1,20 @@
+from rest_framework import serializers
+
+
+# A video player's progress report
+class HeartbeatSerializer(serializers.Serializer):
+    content = serializers.UUIDField()
+    position = serializers.IntegerField(min_value=0)
+    duration = serializers.IntegerField(min_value=1, required=False)
+    completed = serializers.BooleanField(default=False)
+
+
+# A progress entry, from the buffer or from ContentProgress
+class ProgressSerializer(serializers.Serializer):
+    content_id = serializers.UUIDField()
+    position_seconds = serializers.IntegerField()
+    furthest_seconds = serializers.IntegerField()
+    duration_seconds = serializers.IntegerField(allow_null=True)
+    completed = serializers.BooleanField()
+    completed_at = serializers.DateTimeField(allow_null=True)
+    last_seen_at = serializers.DateTimeField()
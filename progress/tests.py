@@ -0,0 +1,167 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from content_management.models import BaseContent, ContentType, LearningType, Lesson, Subject
+from users.models import StudentProfile
+
+from . import buffer, rollups
+from .buffer import heartbeat_entry, progress_buffer, write_progress
+from .models import ContentProgress, LessonRollup, SubjectRollup, YearRollup
+
+
+# No flusher thread: the tests flush by hand
+@override_settings(PROGRESS_FLUSH_INTERVAL=0, PROGRESS_FLUSH_SIZE=1000)
+class HeartbeatTests(APITestCase):
+    def setUp(self):
+        progress_buffer.flush()
+        user = User.objects.create_user(username='student', password='secret123')
+        StudentProfile.objects.create(user=user, academic_year='Prep 1', learning_type=LearningType.VISUAL)
+        subject = Subject.objects.create(name='Maths', code='MATH-1', description='-', academic_year='Prep 1')
+        lesson = Lesson.objects.create(
+            subject=subject, title='Lesson', description='-', order=1, duration=timedelta(minutes=30),
+        )
+        self.videos = [
+            BaseContent.objects.create(
+                lesson=lesson, learning_type=LearningType.VISUAL, content_type=ContentType.VIDEO, description=f'{index}',
+            )
+            for index in range(2)
+        ]
+        tokens = self.client.post(reverse('login'), {'username': 'student', 'password': 'secret123'}).json()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+
+    def beat(self, content, position, **extra):
+        response = self.client.post(reverse('progress-heartbeat'), {
+            'content': str(content.id), 'position': position, 'duration': 600, **extra,
+        }, format='json')
+        self.assertEqual(response.status_code, 202)
+
+    def test_heartbeats_coalesce_into_one_row(self):
+        with self.assertNumQueries(0):
+            for position in range(0, 300, 10):
+                self.beat(self.videos[0], position)
+        self.assertEqual(len(progress_buffer), 1)
+
+        # Served from the buffer before anything is written
+        response = self.client.get(reverse('content-progress', kwargs={'content_id': self.videos[0].id}))
+        self.assertEqual(response.json()['position_seconds'], 290)
+        self.assertFalse(ContentProgress.objects.exists())
+
+        progress_buffer.flush()
+        row = ContentProgress.objects.get()
+        self.assertEqual((row.position_seconds, row.furthest_seconds, row.completed), (290, 290, False))
+
+        # Seeking back keeps the furthest point; passing 90% completes it for good
+        self.beat(self.videos[0], 560)
+        self.beat(self.videos[0], 100)
+        progress_buffer.flush()
+        row.refresh_from_db()
+        self.assertEqual((row.position_seconds, row.furthest_seconds, row.completed), (100, 560, True))
+
+    def test_continue_prefers_the_newer_buffered_item(self):
+        self.beat(self.videos[0], 120)
+        progress_buffer.flush()
+        self.beat(self.videos[1], 30)
+        response = self.client.get(reverse('progress-continue'))
+        self.assertEqual(response.json()['content_id'], str(self.videos[1].id))
+
+        progress_buffer.flush()
+        self.assertEqual(ContentProgress.objects.count(), 2)
+        response = self.client.get(reverse('progress-continue'))
+        self.assertEqual((response.json()['content_id'], response.json()['position_seconds']), (str(self.videos[1].id), 30))
+
+    def test_a_late_report_does_not_move_the_position_back(self):
+        user = User.objects.get(username='student')
+        now = timezone.now()
+        write_progress({(user.id, self.videos[0].id): heartbeat_entry(self.videos[0].id, 300, 600, seen_at=now)})
+        stale = heartbeat_entry(self.videos[0].id, 100, 600, seen_at=now - timedelta(minutes=1))
+        write_progress({(user.id, self.videos[0].id): stale})
+        row = ContentProgress.objects.get()
+        self.assertEqual((row.position_seconds, row.last_seen_at), (300, now))
+
+    def test_progress_for_deleted_content_is_dropped(self):
+        self.beat(self.videos[0], 120)
+        self.beat(self.videos[1], 30)
+        lookup = buffer.content_lessons
+
+        def delete_after_lookup(content_ids):
+            lessons = lookup(content_ids)
+            BaseContent.objects.filter(pk=self.videos[1].pk).delete()
+            return lessons
+
+        with mock.patch.object(buffer, 'content_lessons', delete_after_lookup), self.assertLogs(buffer.logger, 'WARNING'):
+            progress_buffer.flush()
+        self.assertEqual(len(progress_buffer), 0)
+        self.assertEqual(list(ContentProgress.objects.values_list('content_id', flat=True)), [self.videos[0].id])
+
+
+class RollupTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.students = []
+        for index in range(4):
+            user = User.objects.create_user(username=f'student{index}', password='secret123')
+            StudentProfile.objects.create(user=user, academic_year='Prep 1', learning_type=LearningType.VISUAL)
+            self.students.append(user)
+        self.subject = Subject.objects.create(name='Maths', code='MATH-1', description='-', academic_year='Prep 1')
+        self.lesson = Lesson.objects.create(
+            subject=self.subject, title='Lesson', description='-', order=1, duration=timedelta(minutes=30),
+        )
+        self.videos = [
+            BaseContent.objects.create(
+                lesson=self.lesson, learning_type=LearningType.VISUAL, content_type=ContentType.VIDEO,
+                description=f'{index}',
+            )
+            for index in range(2)
+        ]
+
+    def write(self, user, content, position):
+        write_progress({(user.id, content.id): heartbeat_entry(content.id, position, 600)})
+
+    def counts(self):
+        return [
+            (row.started_count, row.completed_count)
+            for row in (LessonRollup.objects.get(), SubjectRollup.objects.get(), YearRollup.objects.get())
+        ]
+
+    def test_flushes_add_only_what_changed(self):
+        self.write(self.students[0], self.videos[0], 100)
+        self.write(self.students[0], self.videos[0], 200)
+        self.write(self.students[0], self.videos[0], 590)
+        self.write(self.students[0], self.videos[0], 20)
+        self.write(self.students[1], self.videos[1], 600)
+        self.assertEqual(self.counts(), [(2, 2)] * 3)
+
+        # Drift from deleted progress is corrected by the nightly rebuild
+        ContentProgress.objects.filter(content=self.videos[1]).delete()
+        rollups.reconcile()
+        self.assertEqual(self.counts(), [(1, 1)] * 3)
+
+    def test_dashboard_reads_the_rollups(self):
+        self.write(self.students[0], self.videos[0], 600)
+        self.write(self.students[1], self.videos[0], 30)
+        admin = User.objects.create_superuser(username='admin', password='secret123')
+        self.client.force_authenticate(admin)
+        rollups.cohort_size('Prep 1')
+
+        # No progress rows are read, however many students there are
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('subject-rollup', kwargs={'subject_id': self.subject.id}))
+        cohort = response.json()['cohorts'][0]
+        self.assertEqual(
+            (cohort['students'], cohort['items'], cohort['started_count'], cohort['completed_count']), (4, 2, 2, 1),
+        )
+        self.assertEqual(cohort['completion_percent'], 12.5)
+        self.assertEqual(response.json()['lessons'][0]['cohorts'][0]['completion_percent'], 12.5)
+
+        response = self.client.get(reverse('year-rollup', kwargs={'academic_year': 'Prep 1'}))
+        self.assertEqual(response.json()['subjects'][0]['completion_percent'], 12.5)
+        self.client.force_authenticate(self.students[0])
+        response = self.client.get(reverse('year-rollup', kwargs={'academic_year': 'Prep 1'}))
+        self.assertEqual(response.status_code, 403)
@@ -0,0 +1,10 @@
+from django.urls import path
+from .views import HeartbeatView, ContinueView, ContentProgressView, SubjectRollupView, YearRollupView
+
+urlpatterns = [
+    path('heartbeat/', HeartbeatView.as_view(), name='progress-heartbeat'),
+    path('continue/', ContinueView.as_view(), name='progress-continue'),
+    path('contents/<uuid:content_id>/', ContentProgressView.as_view(), name='content-progress'),
+    path('rollups/subjects/<uuid:subject_id>/', SubjectRollupView.as_view(), name='subject-rollup'),
+    path('rollups/years/<str:academic_year>/', YearRollupView.as_view(), name='year-rollup'),
+]
@@ -0,0 +1,81 @@
+from django.shortcuts import get_object_or_404
+from rest_framework import status
+from rest_framework.exceptions import NotFound
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+
+from content_management.models import Subject
+from users.models import AcademicYear
+
+from . import rollups
+from .buffer import PROGRESS_FIELDS, heartbeat_entry, merge, progress_buffer
+from .models import ContentProgress
+from .serializers import HeartbeatSerializer, ProgressSerializer
+
+
+class ProgressViewMixin:
+    # The user is built from the token alone; no User or profile query
+    authentication_classes = [JWTStatelessUserAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def newest(self, stored, buffered):
+        # The buffer holds what hasn't been written yet; it wins when newer
+        if stored is not None:
+            stored = {'content_id': stored.content_id, **{field: getattr(stored, field) for field in PROGRESS_FIELDS}}
+        if stored and buffered and stored['content_id'] == buffered['content_id']:
+            entry = merge(stored, buffered)
+        else:
+            candidates = [entry for entry in (stored, buffered) if entry is not None]
+            if not candidates:
+                raise NotFound("No progress recorded yet.")
+            entry = max(candidates, key=lambda entry: entry['last_seen_at'])
+        return Response(ProgressSerializer(entry).data)
+
+
+# Video heartbeat: buffered in memory and written in batches
+class HeartbeatView(ProgressViewMixin, APIView):
+
+    def post(self, request):
+        serializer = HeartbeatSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        progress_buffer.add(request.user.id, heartbeat_entry(
+            data['content'], data['position'], data.get('duration'), data['completed'],
+        ))
+        return Response(status=status.HTTP_202_ACCEPTED)
+
+
+# Continue where you left off: the student's most recently watched item
+class ContinueView(ProgressViewMixin, APIView):
+
+    def get(self, request):
+        stored = ContentProgress.objects.filter(student__user_id=request.user.id).order_by('-last_seen_at').first()
+        return self.newest(stored, progress_buffer.latest(request.user.id))
+
+
+# Resume position for one content item
+class ContentProgressView(ProgressViewMixin, APIView):
+
+    def get(self, request, content_id):
+        stored = ContentProgress.objects.filter(student__user_id=request.user.id, content_id=content_id).first()
+        return self.newest(stored, progress_buffer.get(request.user.id, content_id))
+
+
+# Completion dashboards for staff, read from the rollups
+class SubjectRollupView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, subject_id):
+        subject = get_object_or_404(Subject, pk=subject_id)
+        return Response(rollups.subject_dashboard(subject))
+
+
+class YearRollupView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, academic_year):
+        if academic_year not in AcademicYear.values:
+            raise NotFound("Unknown academic year.")
+        return Response(rollups.year_dashboard(academic_year))
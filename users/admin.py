@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import User  # Import the User model
-from .models import StudentProfile, Parent  # Import multiple models
+from .models import EmailOutbox, RosterImportJob, StudentProfile, Parent  # Import multiple models
 
 class StudentProfileInline(admin.StackedInline):
     model = StudentProfile
@@ -19,3 +19,5 @@ admin.site.register(User, CustomUserAdmin)
 # Register your models with the admin site
 admin.site.register(StudentProfile)
 admin.site.register(Parent)
+admin.site.register(EmailOutbox)
+admin.site.register(RosterImportJob)
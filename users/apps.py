@@ -4,5 +4,5 @@ class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
 
-    # def ready(self):
-    #     import users.signals  # Import the signals module to trigger the signal
+    def ready(self):
+        import users.signals  # Import the signals module to trigger the signal
@@ -0,0 +1,110 @@
+# users/blacklist.py
+#
+# Per-process index of blacklisted refresh-token JTIs, so that rotation and
+# logout do not probe token_blacklist on every request. Each worker loads the
+# whole (unexpired) blacklist when it starts (see wsgi.py / asgi.py) and then
+# only reads rows blacklisted since its last sync, less
+# TOKEN_BLACKLIST_SYNC_OVERLAP: ids and timestamps are assigned before commit,
+# so a row can become visible after rows newer than it. It catches up when
+# another process bumps the shared generation counter, and at least every
+# TOKEN_BLACKLIST_SYNC_SECONDS regardless.
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+logger = logging.getLogger(__name__)
+
+GENERATION_KEY = 'token-blacklist:generation'
+
+
+class BlacklistIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._expiry = {}  # jti -> expires_at
+        self._since = None  # when the last sync started
+        self._generation = None
+        self._synced_at = 0.0
+
+    def __contains__(self, jti):
+        self.sync()
+        return jti in self._expiry
+
+    def __len__(self):
+        return len(self._expiry)
+
+    def add(self, jti, expires_at):
+        with self._lock:
+            self._expiry[jti] = expires_at
+
+    def reset(self):
+        with self._lock:
+            self._expiry, self._since, self._generation, self._synced_at = {}, None, None, 0.0
+
+    def sync(self, force=False):
+        generation = cache.get(GENERATION_KEY)
+        fresh = time.monotonic() - self._synced_at < settings.TOKEN_BLACKLIST_SYNC_SECONDS
+        if not force and self._since is not None and generation == self._generation and fresh:
+            return
+        with self._lock:
+            now = timezone.now()
+            rows = BlacklistedToken.objects.filter(token__expires_at__gt=now)
+            if self._since is not None:
+                since = self._since - timedelta(seconds=settings.TOKEN_BLACKLIST_SYNC_OVERLAP)
+                rows = rows.filter(blacklisted_at__gte=since)
+            for jti, expires_at in rows.values_list('token__jti', 'token__expires_at'):
+                self._expiry[jti] = expires_at
+            self._since = now
+            # Expired tokens fail verification on their own; stop tracking them
+            self._expiry = {jti: expires_at for jti, expires_at in self._expiry.items() if expires_at > now}
+            self._generation = generation
+            self._synced_at = time.monotonic()
+
+
+blacklist_index = BlacklistIndex()
+
+
+def warm_blacklist_index():
+    # Called once as the server starts. A failure (no database yet, tables
+    # not migrated) leaves the index to load on first use instead.
+    try:
+        blacklist_index.sync(force=True)
+    except Exception:
+        logger.exception('Could not load the token blacklist index')
+    finally:
+        # Don't hand this connection to forked workers
+        connections.close_all()
+
+
+def bump_generation():
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 1, timeout=None)
+
+
+class IndexedBlacklistMixin:
+    """
+    For refresh token classes: checks the blacklist against the in-memory
+    index. The index may lag another process by a moment, so blacklist()
+    treats "this token was already blacklisted" as a failure too; the
+    unique row in token_blacklist stays the final word on reuse.
+    """
+
+    def check_blacklist(self):
+        if self.payload[api_settings.JTI_CLAIM] in blacklist_index:
+            raise TokenError("Token is blacklisted")
+
+    def blacklist(self):
+        blacklisted, created = super().blacklist()
+        if not created:
+            raise TokenError("Token is blacklisted")
+        return blacklisted, created
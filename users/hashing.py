@@ -0,0 +1,28 @@
+# users/hashing.py
+#
+# Password hashing for process pool workers. Spawned workers import this
+# module before Django is set up, so it must not import any models.
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+
+
+def _init_worker():
+    django.setup()
+
+
+def hash_password(password):
+    from django.contrib.auth.hashers import make_password
+
+    return make_password(password)
+
+
+def get_executor(workers=None):
+    # spawn: hashing workers must not inherit the parent's DB connections
+    return ProcessPoolExecutor(
+        max_workers=workers or os.cpu_count(),
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_worker,
+    )
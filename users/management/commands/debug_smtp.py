@@ -0,0 +1,88 @@
+# users/management/commands/debug_smtp.py
+#
+# A local SMTP sink for development: point EMAIL_HOST/EMAIL_PORT at it (with
+# EMAIL_USE_TLS=False) and every message the outbox worker sends is printed
+# here instead of being delivered.
+import asyncio
+from email import message_from_bytes, policy
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Runs a debugging SMTP server that prints the messages it receives'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=1025)
+
+    def handle(self, *args, **options):
+        try:
+            asyncio.run(self.serve(options['host'], options['port']))
+        except KeyboardInterrupt:
+            pass
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.session, host, port)
+        self.stdout.write(f'Debugging SMTP server listening on {host}:{port}')
+        async with server:
+            await server.serve_forever()
+
+    async def session(self, reader, writer):
+        def reply(line):
+            writer.write(f'{line}\r\n'.encode())
+
+        reply('220 localhost debugging SMTP server')
+        sender, recipients = None, []
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            command = line.decode(errors='replace').strip()
+            verb = command[:4].upper()
+            if verb == 'EHLO':
+                reply('250-localhost')
+                reply('250 8BITMIME')
+            elif verb == 'HELO':
+                reply('250 localhost')
+            elif verb == 'MAIL':
+                sender, recipients = command.partition(':')[2].strip(), []
+                reply('250 OK')
+            elif verb == 'RCPT':
+                recipients.append(command.partition(':')[2].strip())
+                reply('250 OK')
+            elif verb == 'DATA':
+                reply('354 End data with <CR><LF>.<CR><LF>')
+                await writer.drain()
+                self.print_message(sender, recipients, await self.read_data(reader))
+                reply('250 OK')
+            elif verb in ('RSET', 'NOOP'):
+                if verb == 'RSET':
+                    sender, recipients = None, []
+                reply('250 OK')
+            elif verb == 'QUIT':
+                reply('221 Bye')
+                await writer.drain()
+                break
+            else:
+                reply('502 Command not implemented')
+            await writer.drain()
+        writer.close()
+
+    async def read_data(self, reader):
+        lines = []
+        while True:
+            line = await reader.readline()
+            if not line or line in (b'.\r\n', b'.\n'):
+                break
+            # Undo dot-stuffing
+            lines.append(line[1:] if line.startswith(b'..') else line)
+        return b''.join(lines)
+
+    def print_message(self, sender, recipients, data):
+        message = message_from_bytes(data, policy=policy.default)
+        self.stdout.write('-' * 60)
+        self.stdout.write(f'From: {sender}  To: {", ".join(recipients)}')
+        self.stdout.write(f'Subject: {message["Subject"]}')
+        body = message.get_body(preferencelist=('plain', 'html'))
+        self.stdout.write(body.get_content() if body is not None else data.decode(errors='replace'))
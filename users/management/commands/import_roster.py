@@ -0,0 +1,42 @@
+# users/management/commands/import_roster.py
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users import roster
+
+
+class Command(BaseCommand):
+    help = 'Imports students (and their parents) from a CSV or JSONL roster file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Roster file, or '-' for stdin")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Defaults to the file extension')
+        parser.add_argument('--workers', type=int, default=None, help='Password hashing processes (default: all cores)')
+        parser.add_argument('--chunk-size', type=int, default=roster.CHUNK_SIZE, help='Rows written per transaction')
+        parser.add_argument('--report', help='Write the full report, with every row error, to this JSON file')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or roster.guess_format(path)
+        started = time.monotonic()
+        try:
+            stream = sys.stdin.buffer if path == '-' else open(path, 'rb')
+        except OSError as error:
+            raise CommandError(f'Cannot open {path}: {error}')
+        with stream:
+            report = roster.import_roster(stream, file_format, options['workers'], options['chunk_size'])
+
+        if options['report']:
+            with open(options['report'], 'w') as output:
+                json.dump(report, output, indent=2, default=str)
+        for error in report['errors'][:20]:
+            self.stderr.write(f"line {error['line']}: {json.dumps(error['errors'], default=str)}")
+        if len(report['errors']) > 20:
+            self.stderr.write(f"... and {len(report['errors']) - 20} more")
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {report['users_created']} student(s) and {report['parents_created']} parent(s), "
+            f"{len(report['errors'])} row error(s), in {time.monotonic() - started:.1f}s"
+        ))
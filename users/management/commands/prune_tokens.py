@@ -0,0 +1,36 @@
+# users/management/commands/prune_tokens.py
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+
+class Command(BaseCommand):
+    help = 'Deletes expired outstanding and blacklisted tokens in small batches (run it from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows deleted per transaction')
+        parser.add_argument('--pause', type=float, default=0.0, help='Seconds to sleep between batches')
+
+    def handle(self, *args, **options):
+        # Unlike flushexpiredtokens' single DELETE, short batches keep locks
+        # brief while refreshes keep writing to the same tables
+        cutoff = timezone.now()
+        outstanding = blacklisted = 0
+        while True:
+            ids = list(
+                OutstandingToken.objects.filter(expires_at__lte=cutoff)
+                .order_by('id').values_list('id', flat=True)[:options['batch_size']]
+            )
+            if not ids:
+                break
+            with transaction.atomic():
+                blacklisted += BlacklistedToken.objects.filter(token_id__in=ids).delete()[0]
+                outstanding += OutstandingToken.objects.filter(id__in=ids).delete()[0]
+            if options['pause']:
+                time.sleep(options['pause'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {outstanding} outstanding and {blacklisted} blacklisted expired token(s)'
+        ))
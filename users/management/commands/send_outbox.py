@@ -0,0 +1,31 @@
+# users/management/commands/send_outbox.py
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from users.outbox import deliver_batch
+
+
+class Command(BaseCommand):
+    help = 'Delivers queued outbox emails in batches over a reused SMTP connection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Emails per batch (default EMAIL_OUTBOX_BATCH_SIZE)')
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new emails instead of exiting once drained')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds to sleep between polls when idle')
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+        while True:
+            close_old_connections()
+            sent, failed = deliver_batch(options['batch_size'])
+            total_sent += sent
+            total_failed += failed
+            if sent or failed:
+                self.stdout.write(f'Sent {sent}, failed {failed}')
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(f'Sent {total_sent} email(s), {total_failed} failure(s)'))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_roster_import_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emailoutbox',
+            name='body_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+    ]
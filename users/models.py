@@ -1,5 +1,8 @@
+import uuid
+
 from django.contrib.auth.models import User
 from django.db import models
+from django.utils import timezone
 
 # Enum choices for the academic year, learning type, and major
 class AcademicYear(models.TextChoices):
@@ -56,3 +59,58 @@ class StudentProfile(models.Model):
 
     def __str__(self):
         return f"{self.user.username}'s Profile"
+
+
+class EmailStatus(models.TextChoices):
+    PENDING = 'Pending', 'Pending'
+    SENT = 'Sent', 'Sent'
+    FAILED = 'Failed', 'Failed'
+
+
+# Mail written by request handlers and delivered later by the send_outbox worker
+class EmailOutbox(models.Model):
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    # SHA-256 of body and html_body, to spot duplicates without comparing them
+    body_hash = models.CharField(max_length=64, blank=True, editable=False)
+    from_email = models.CharField(max_length=254)
+    recipients = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=EmailStatus.choices, default=EmailStatus.PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The worker's "what is due" query
+            models.Index(
+                fields=['next_attempt_at'], name='email_outbox_due_idx',
+                condition=models.Q(status='Pending'),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.recipients)}"
+
+
+class ImportStatus(models.TextChoices):
+    RUNNING = 'running', 'Running'
+    DONE = 'done', 'Done'
+    FAILED = 'failed', 'Failed'
+
+
+# A background roster import started from the admin endpoint; stored in the
+# database so any worker can answer the status URL
+class RosterImportJob(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    status = models.CharField(max_length=10, choices=ImportStatus.choices, default=ImportStatus.RUNNING)
+    report = models.JSONField(default=dict)
+    detail = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Roster import {self.id} ({self.status})"
@@ -0,0 +1,173 @@
+# users/outbox.py
+#
+# Transactional email outbox. Request handlers only insert a row; the
+# send_outbox worker claims due rows in batches and delivers them over one
+# SMTP connection, retrying failures with exponential backoff.
+import hashlib
+import logging
+import smtplib
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import EmailOutbox, EmailStatus
+
+logger = logging.getLogger(__name__)
+
+MARK_SENT_ATTEMPTS = 3
+
+# Emails the server accepted whose sent state could not be saved, by id.
+# This process never claims them again; it saves their state before it
+# claims its next batch.
+unrecorded = {}
+
+
+def body_hash(body, html_body):
+    return hashlib.sha256(f'{body}\0{html_body}'.encode()).hexdigest()
+
+
+def enqueue_email(subject, message, recipient_list, from_email=None, html_message=''):
+    # An identical message still waiting for delivery is not queued twice,
+    # so repeated submissions of a form cannot flood a mailbox. Messages that
+    # share a subject but not a body (two different reset links) both go out.
+    recipients = sorted(recipient_list)
+    html_message = html_message or ''
+    digest = body_hash(message, html_message)
+    window = timezone.now() - timedelta(seconds=settings.EMAIL_OUTBOX_DEDUPE_SECONDS)
+    duplicate = EmailOutbox.objects.filter(
+        status=EmailStatus.PENDING, subject=subject, recipients=recipients, body_hash=digest, created_at__gte=window
+    ).first()
+    if duplicate is not None:
+        return duplicate
+    return EmailOutbox.objects.create(
+        subject=subject,
+        body=message,
+        html_body=html_message,
+        body_hash=digest,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        recipients=recipients,
+    )
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=settings.EMAIL_OUTBOX_RETRY_DELAY * 2 ** (attempts - 1))
+
+
+def claim_batch(batch_size):
+    # Lease due rows by pushing their next attempt into the future. A worker
+    # that dies mid-batch leaves them to be picked up again once it expires;
+    # skip_locked lets several workers drain the table side by side.
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            EmailOutbox.objects.select_for_update(skip_locked=True)
+            .filter(status=EmailStatus.PENDING, sent_at__isnull=True, next_attempt_at__lte=now)
+            .exclude(id__in=list(unrecorded))
+            .order_by('next_attempt_at', 'id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        EmailOutbox.objects.filter(id__in=ids).update(
+            attempts=F('attempts') + 1,
+            next_attempt_at=now + timedelta(seconds=settings.EMAIL_OUTBOX_LEASE_SECONDS),
+        )
+    return list(EmailOutbox.objects.filter(id__in=ids).order_by('next_attempt_at', 'id'))
+
+
+def build_message(email, connection):
+    message = EmailMultiAlternatives(
+        email.subject, email.body, email.from_email, email.recipients, connection=connection
+    )
+    if email.html_body:
+        message.attach_alternative(email.html_body, 'text/html')
+    return message
+
+
+def mark_sent(email):
+    # Committed on its own as soon as the server accepts the message, so
+    # nothing that goes wrong later in the batch can queue it again
+    with transaction.atomic():
+        email.save(update_fields=['status', 'sent_at', 'last_error'])
+
+
+def record_sent(email):
+    email.status = EmailStatus.SENT
+    email.sent_at = timezone.now()
+    email.last_error = ''
+    for attempt in range(MARK_SENT_ATTEMPTS):
+        try:
+            mark_sent(email)
+            return
+        except Exception:
+            logger.exception('Could not record outbox email %s as sent', email.pk)
+            if attempt + 1 < MARK_SENT_ATTEMPTS:
+                time.sleep(0.1 * 2 ** attempt)
+    unrecorded[email.pk] = email
+
+
+def record_unrecorded():
+    for email_id, email in list(unrecorded.items()):
+        try:
+            mark_sent(email)
+        except Exception:
+            logger.exception('Could not record outbox email %s as sent', email_id)
+            return
+        del unrecorded[email_id]
+
+
+def mark_failed(email, error):
+    email.last_error = f'{type(error).__name__}: {error}'
+    if email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+        email.status = EmailStatus.FAILED
+    else:
+        email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+    email.save(update_fields=['status', 'next_attempt_at', 'last_error'])
+
+
+def deliver_batch(batch_size=None, connection=None):
+    """
+    Sends one batch of due emails and returns (sent, failed). The SMTP
+    connection is opened once for the whole batch, and reopened only when
+    the server drops it.
+    """
+    record_unrecorded()
+    emails = claim_batch(batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE)
+    if not emails:
+        return 0, 0
+
+    connection = connection or get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as error:
+        # Could not reach the server at all: the batch waits for its
+        # backoff like any other failure
+        logger.warning('Could not connect to the mail server: %s', error)
+        for email in emails:
+            mark_failed(email, error)
+        return 0, len(emails)
+
+    sent = failed = 0
+    try:
+        for email in emails:
+            try:
+                try:
+                    connection.send_messages([build_message(email, connection)])
+                except smtplib.SMTPServerDisconnected:
+                    connection.close()
+                    connection.open()
+                    connection.send_messages([build_message(email, connection)])
+            except Exception as error:
+                logger.warning('Sending outbox email %s failed: %s', email.pk, error)
+                mark_failed(email, error)
+                failed += 1
+                continue
+            sent += 1
+            # Delivered: retried, or kept in `unrecorded`, but never marked failed
+            record_sent(email)
+    finally:
+        connection.close()
+    return sent, failed
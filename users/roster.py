@@ -0,0 +1,283 @@
+# users/roster.py
+#
+# Bulk roster import: stream a CSV or JSONL file of students (and their
+# parents), hash the passwords on a process pool, and bulk_create users,
+# parents and profiles one chunk per transaction. Rows that fail are
+# reported by line number; the rest of the file still goes in.
+import csv
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+
+from django.contrib.auth.base_user import BaseUserManager
+from django.contrib.auth.models import User
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from .hashing import get_executor, hash_password
+from .models import AcademicYear, ImportStatus, LearningType, Major, Parent, RosterImportJob, StudentProfile
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 500
+HASH_CHUNKSIZE = 16
+
+PROFILE_FIELDS = ('academic_year', 'learning_type', 'phone_number', 'gender', 'date_of_birth', 'major')
+USER_FIELDS = ('username', 'email', 'first_name', 'last_name')
+
+
+class RosterRowSerializer(serializers.Serializer):
+    # Field-level checks only; uniqueness is checked per chunk in one query
+    username = serializers.CharField(max_length=150, validators=[UnicodeUsernameValidator()])
+    password = serializers.CharField(max_length=128)
+    email = serializers.EmailField(required=False, allow_blank=True, default='')
+    first_name = serializers.CharField(max_length=150, required=False, allow_blank=True, default='')
+    last_name = serializers.CharField(max_length=150, required=False, allow_blank=True, default='')
+    academic_year = serializers.ChoiceField(choices=AcademicYear.choices)
+    learning_type = serializers.ChoiceField(choices=LearningType.choices)
+    phone_number = serializers.CharField(max_length=15, required=False, allow_null=True, default=None)
+    gender = serializers.ChoiceField(choices=['Male', 'Female'], required=False, allow_null=True, default=None)
+    date_of_birth = serializers.DateField(required=False, allow_null=True, default=None)
+    major = serializers.ChoiceField(choices=Major.choices, required=False, allow_null=True, default=None)
+    parent_email = serializers.EmailField(required=False, allow_null=True, default=None)
+    parent_phone_number = serializers.CharField(max_length=15, required=False, allow_null=True, default=None)
+    parent_password = serializers.CharField(max_length=128, required=False, allow_null=True, default=None)
+
+    def to_internal_value(self, data):
+        # Normalised as create_user() does, before validation and the
+        # duplicate checks, so imported accounts match registered ones
+        data = dict(data)
+        if isinstance(data.get('username'), str):
+            data['username'] = User.normalize_username(data['username'])
+        if isinstance(data.get('email'), str):
+            data['email'] = BaseUserManager.normalize_email(data['email'])
+        return super().to_internal_value(data)
+
+
+def read_rows(stream, file_format):
+    """
+    Yields (line, row) from a binary stream; row is a dict, or the error
+    message when the line cannot be parsed at all.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if file_format == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line, raw in enumerate(text, start=1):
+        if not raw.strip():
+            continue
+        try:
+            row = json.loads(raw)
+        except ValueError as error:
+            yield line, f'Invalid JSON: {error}'
+            continue
+        yield line, row if isinstance(row, dict) else 'Expected a JSON object.'
+
+
+def guess_format(name):
+    return 'jsonl' if os.path.splitext(name)[1].lower() in ('.jsonl', '.ndjson', '.json') else 'csv'
+
+
+def _clean(row):
+    # CSV has no null: an empty cell means "not given"
+    return {key: value.strip() if isinstance(value, str) else value
+            for key, value in row.items() if key and value not in ('', None)}
+
+
+class RosterImport:
+    def __init__(self, executor, chunk_size=CHUNK_SIZE):
+        self.executor = executor
+        self.chunk_size = chunk_size
+        self.users_created = 0
+        self.parents_created = 0
+        self.errors = []
+        # Parent email -> password hash
+        self.parent_passwords = {}
+
+    def report(self):
+        return {
+            'users_created': self.users_created,
+            'parents_created': self.parents_created,
+            'errors': self.errors,
+        }
+
+    def error(self, line, row, detail):
+        username = row.get('username') if isinstance(row, dict) else None
+        self.errors.append({'line': line, 'username': username, 'errors': detail})
+
+    def run(self, rows):
+        # Chunk N+1's passwords hash on the pool while chunk N is written
+        pending, parent_emails = None, set()
+        for chunk in self.valid_chunks(rows):
+            if not chunk:
+                continue
+            passwords = [row['password'] for _, row in chunk]
+            # A parent shared by several students is only hashed once, and
+            # the hash is kept by email for whichever row ends up creating it
+            new_parents = {}
+            for _, row in chunk:
+                email = row['parent_email']
+                if email and email not in parent_emails and new_parents.get(email) is None:
+                    new_parents[email] = row['parent_password']
+            parent_emails.update(new_parents)
+            hashed = (
+                self.executor.map(hash_password, passwords, chunksize=HASH_CHUNKSIZE),
+                list(new_parents),
+                self.executor.map(hash_password, new_parents.values(), chunksize=HASH_CHUNKSIZE),
+            )
+            if pending is not None:
+                self.save_chunk(*pending)
+            pending = (chunk, hashed)
+        if pending is not None:
+            self.save_chunk(*pending)
+        return self.report()
+
+    def valid_chunks(self, rows):
+        chunk, usernames = [], set()
+        for line, row in rows:
+            if not isinstance(row, dict):
+                self.error(line, row, {'row': [row]})
+                continue
+            serializer = RosterRowSerializer(data=_clean(row))
+            if not serializer.is_valid():
+                self.error(line, row, serializer.errors)
+                continue
+            data = serializer.validated_data
+            if data['username'] in usernames:
+                self.error(line, row, {'username': ['Duplicate username in this file.']})
+                continue
+            usernames.add(data['username'])
+            chunk.append((line, data))
+            if len(chunk) >= self.chunk_size:
+                yield self.drop_existing(chunk)
+                chunk = []
+        if chunk:
+            yield self.drop_existing(chunk)
+
+    def drop_existing(self, chunk):
+        existing = set(User.objects.filter(
+            username__in=[row['username'] for _, row in chunk]
+        ).values_list('username', flat=True))
+        kept = []
+        for line, row in chunk:
+            if row['username'] in existing:
+                self.error(line, row, {'username': ['A user with that username already exists.']})
+            else:
+                kept.append((line, row))
+        return kept
+
+    def save_chunk(self, chunk, hashed):
+        passwords, parent_emails, parent_passwords = hashed
+        passwords = list(passwords)
+        self.parent_passwords.update(zip(parent_emails, parent_passwords))
+        try:
+            with transaction.atomic():
+                counts = self.bulk_save(chunk, passwords)
+            self.count(*counts)
+        except IntegrityError:
+            # Someone registered one of these usernames meanwhile: retry the
+            # chunk a row at a time so only the offending rows are rejected
+            for index, (line, row) in enumerate(chunk):
+                try:
+                    with transaction.atomic():
+                        counts = self.bulk_save([(line, row)], [passwords[index]])
+                except IntegrityError as error:
+                    self.error(line, row, {'row': [str(error)]})
+                else:
+                    self.count(*counts)
+
+    def count(self, users, parents):
+        self.users_created += users
+        self.parents_created += parents
+
+    def bulk_save(self, chunk, passwords):
+        parents, parents_created = self.save_parents(chunk)
+        users = User.objects.bulk_create([
+            User(password=password, **{field: row[field] for field in USER_FIELDS})
+            for (_, row), password in zip(chunk, passwords)
+        ])
+        if any(user.pk is None for user in users):
+            # Backends that cannot return ids from a bulk insert
+            ids = dict(User.objects.filter(username__in=[user.username for user in users]).values_list('username', 'id'))
+            for user in users:
+                user.pk = ids[user.username]
+        StudentProfile.objects.bulk_create([
+            StudentProfile(
+                user_id=user.pk,
+                parent=parents.get(row['parent_email']),
+                **{field: row[field] for field in PROFILE_FIELDS},
+            )
+            for (_, row), user in zip(chunk, users)
+        ])
+        return len(users), parents_created
+
+    def save_parents(self, chunk):
+        # One Parent per email, whether it is already stored or repeated in the file
+        emails = {row['parent_email'] for _, row in chunk if row['parent_email']}
+        parents = {parent.email: parent for parent in Parent.objects.filter(email__in=emails)}
+        new_parents = {}
+        for _, row in chunk:
+            email = row['parent_email']
+            if email and email not in parents and email not in new_parents:
+                new_parents[email] = Parent(
+                    email=email, phone_number=row['parent_phone_number'], password=self.parent_passwords[email],
+                )
+        if new_parents:
+            Parent.objects.bulk_create(new_parents.values())
+            parents.update({parent.email: parent for parent in Parent.objects.filter(email__in=new_parents)})
+        return parents, len(new_parents)
+
+
+def import_roster(stream, file_format, workers=None, chunk_size=CHUNK_SIZE):
+    with get_executor(workers) as executor:
+        return RosterImport(executor, chunk_size).run(read_rows(stream, file_format))
+
+
+# Background jobs for the admin endpoint; status and report are kept in
+# RosterImportJob so the status URL works on every worker
+
+def get_import_job(job_id):
+    job = RosterImportJob.objects.filter(pk=job_id).first()
+    if job is None:
+        return None
+    report = {'id': str(job.id), 'status': job.status, **job.report}
+    if job.detail:
+        report['detail'] = job.detail
+    return report
+
+
+def start_import_job(uploaded_file):
+    fd, path = tempfile.mkstemp(suffix='.roster')
+    with os.fdopen(fd, 'wb') as staged:
+        for chunk in uploaded_file.chunks():
+            staged.write(chunk)
+    job = RosterImportJob.objects.create()
+    file_format = guess_format(uploaded_file.name)
+    # Started once the job row is visible to whoever polls for it
+    transaction.on_commit(
+        lambda: threading.Thread(target=_run_job, args=(job.id, path, file_format), daemon=True).start()
+    )
+    return job.id
+
+
+def _run_job(job_id, path, file_format):
+    fields = {'status': ImportStatus.DONE}
+    try:
+        with open(path, 'rb') as stream:
+            fields['report'] = import_roster(stream, file_format)
+    except Exception as error:
+        logger.exception('Roster import %s failed', job_id)
+        fields.update(status=ImportStatus.FAILED, detail=str(error))
+    finally:
+        os.remove(path)
+    try:
+        RosterImportJob.objects.filter(pk=job_id).update(updated_at=timezone.now(), **fields)
+    finally:
+        connection.close()
@@ -0,0 +1,30 @@
+# users/signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from .blacklist import blacklist_index, bump_generation
+from .models import StudentProfile
+from .tokens import STUDENT_CLAIMS, publish_claims_override
+
+
+# Outstanding access tokens still carry the old claims; override them until
+# they expire (refreshed tokens re-read the profile anyway)
+@receiver(post_save, sender=StudentProfile)
+def override_claims_on_save(sender, instance, **kwargs):
+    claims = {claim: getattr(instance, claim) for claim in STUDENT_CLAIMS}
+    transaction.on_commit(lambda: publish_claims_override(instance.user_id, claims))
+
+
+@receiver(post_delete, sender=StudentProfile)
+def override_claims_on_delete(sender, instance, **kwargs):
+    transaction.on_commit(lambda: publish_claims_override(instance.user_id, {}))
+
+
+# Keep this process's blacklist index current and tell the others to catch up
+@receiver(post_save, sender=BlacklistedToken)
+def index_blacklisted_token(sender, instance, created, **kwargs):
+    if created:
+        blacklist_index.add(instance.token.jti, instance.token.expires_at)
+        transaction.on_commit(bump_generation)
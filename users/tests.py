@@ -0,0 +1,276 @@
+import io
+import smtplib
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.hashers import check_password
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from .blacklist import blacklist_index, warm_blacklist_index
+from . import outbox, roster
+from .models import EmailOutbox, EmailStatus, Parent, RosterImportJob, StudentProfile
+from .roster import RosterImport, read_rows
+from .outbox import deliver_batch, enqueue_email
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class EmailOutboxTests(TestCase):
+    def setUp(self):
+        outbox.unrecorded.clear()
+        self.client = APIClient()
+        User.objects.create_user(username='student', email='student@example.com', password='pass12345')
+
+    def request_reset(self):
+        return self.client.post(reverse('forgot-password'), {'email': 'student@example.com'}, format='json')
+
+    def test_forgot_password_queues_instead_of_sending(self):
+        response = self.request_reset()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(mail.outbox), 0)
+        email = EmailOutbox.objects.get()
+        self.assertEqual(email.recipients, ['student@example.com'])
+        self.assertEqual(email.status, EmailStatus.PENDING)
+
+    def test_repeated_requests_are_queued_once(self):
+        self.request_reset()
+        self.request_reset()
+
+        self.assertEqual(EmailOutbox.objects.count(), 1)
+
+    def test_messages_with_different_bodies_are_both_queued(self):
+        enqueue_email('Reset your password', 'Link one', ['student@example.com'])
+        enqueue_email('Reset your password', 'Link one', ['student@example.com'])
+        enqueue_email('Reset your password', 'Link two', ['student@example.com'])
+        enqueue_email('Reset your password', 'Link two', ['student@example.com'], html_message='<a>Link two</a>')
+
+        self.assertEqual(EmailOutbox.objects.count(), 3)
+
+    def test_batch_is_sent_over_one_connection(self):
+        for index in range(3):
+            EmailOutbox.objects.create(
+                subject=f'Message {index}', body='Hello', from_email='noreply@example.com',
+                recipients=[f'user{index}@example.com'],
+            )
+
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.open') as opened:
+            self.assertEqual(deliver_batch(), (3, 0))
+
+        self.assertEqual(opened.call_count, 1)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertFalse(EmailOutbox.objects.exclude(status=EmailStatus.SENT).exists())
+
+    def test_a_sent_message_is_not_sent_again_when_marking_fails(self):
+        for index in range(2):
+            EmailOutbox.objects.create(
+                subject=f'Message {index}', body='Hello', from_email='noreply@example.com',
+                recipients=[f'user{index}@example.com'],
+            )
+        first = EmailOutbox.objects.get(subject='Message 0')
+        mark_sent = outbox.mark_sent
+
+        def fail_first(email):
+            if email.pk == first.pk:
+                raise DatabaseError('connection lost')
+            mark_sent(email)
+
+        with mock.patch.object(outbox, 'mark_sent', fail_first), mock.patch.object(outbox.time, 'sleep'), \
+                self.assertLogs('users.outbox', 'ERROR'):
+            self.assertEqual(deliver_batch(), (2, 0))
+            first.refresh_from_db()
+            self.assertEqual(first.status, EmailStatus.PENDING)
+            self.assertEqual(EmailOutbox.objects.get(subject='Message 1').status, EmailStatus.SENT)
+
+            # Not claimed again even once the lease has run out
+            EmailOutbox.objects.update(next_attempt_at=timezone.now())
+            self.assertEqual(deliver_batch(), (0, 0))
+
+        # Recorded as soon as the database takes writes again
+        self.assertEqual(deliver_batch(), (0, 0))
+        first.refresh_from_db()
+        self.assertEqual(first.status, EmailStatus.SENT)
+        self.assertEqual(outbox.unrecorded, {})
+        self.assertEqual(len(mail.outbox), 2)
+
+    @override_settings(EMAIL_OUTBOX_MAX_ATTEMPTS=2, EMAIL_OUTBOX_RETRY_DELAY=60)
+    def test_failures_back_off_then_give_up(self):
+        email = EmailOutbox.objects.create(
+            subject='Hello', body='Hello', from_email='noreply@example.com', recipients=['a@example.com']
+        )
+        failure = smtplib.SMTPRecipientsRefused({'a@example.com': (550, b'No such user')})
+
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=failure), \
+                self.assertLogs('users.outbox', 'WARNING'):
+            self.assertEqual(deliver_batch(), (0, 1))
+            email.refresh_from_db()
+            self.assertEqual(email.status, EmailStatus.PENDING)
+            self.assertGreater(email.next_attempt_at, timezone.now() + timedelta(seconds=30))
+
+            # Not due yet
+            self.assertEqual(deliver_batch(), (0, 0))
+
+            EmailOutbox.objects.update(next_attempt_at=timezone.now())
+            self.assertEqual(deliver_batch(), (0, 1))
+
+        email.refresh_from_db()
+        self.assertEqual(email.status, EmailStatus.FAILED)
+        self.assertEqual(email.attempts, 2)
+        self.assertIn('SMTPRecipientsRefused', email.last_error)
+
+
+class TokenBlacklistIndexTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        blacklist_index.reset()
+        self.client = APIClient()
+        User.objects.create_user(username='student', password='pass12345')
+        self.refresh = self.client.post(
+            reverse('login'), {'username': 'student', 'password': 'pass12345'}, format='json'
+        ).json()['refresh']
+
+    def rotate(self, refresh):
+        return self.client.post(reverse('token_refresh'), {'refresh': refresh}, format='json')
+
+    def test_reused_refresh_token_is_rejected_from_the_index(self):
+        self.assertEqual(self.rotate(self.refresh).status_code, 200)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.rotate(self.refresh)
+
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse([query for query in queries if 'blacklistedtoken' in query['sql']])
+
+    def test_reuse_is_caught_even_when_the_index_lags(self):
+        self.assertEqual(self.rotate(self.refresh).status_code, 200)
+
+        with mock.patch.object(type(blacklist_index), '__contains__', return_value=False):
+            self.assertEqual(self.rotate(self.refresh).status_code, 401)
+
+    def test_rows_that_commit_late_are_still_picked_up(self):
+        self.assertEqual(self.rotate(self.refresh).status_code, 200)
+        blacklist_index.reset()
+        blacklist_index.sync()
+        # A row stamped before the last sync but committed after it
+        token = OutstandingToken.objects.create(
+            jti='late', token='-', expires_at=timezone.now() + timedelta(days=1),
+        )
+        BlacklistedToken.objects.create(token=token)
+        BlacklistedToken.objects.filter(token=token).update(blacklisted_at=timezone.now() - timedelta(seconds=30))
+
+        blacklist_index.sync(force=True)
+        self.assertIn('late', blacklist_index)
+
+    def test_index_is_warmed_before_the_first_request(self):
+        self.assertEqual(self.rotate(self.refresh).status_code, 200)
+        blacklist_index.reset()
+
+        # Closing the connection would end the test's transaction
+        with mock.patch('users.blacklist.connections') as connections:
+            warm_blacklist_index()
+        connections.close_all.assert_called_once()
+        self.assertEqual(len(blacklist_index), 1)
+
+    def test_prune_deletes_only_expired_rows(self):
+        self.rotate(self.rotate(self.refresh).json()['refresh'])
+        OutstandingToken.objects.filter(
+            id__in=BlacklistedToken.objects.values('token_id')[:1]
+        ).update(expires_at=timezone.now() - timedelta(minutes=1))
+
+        call_command('prune_tokens', batch_size=1, stdout=mock.MagicMock())
+
+        self.assertEqual(BlacklistedToken.objects.count(), 1)
+        self.assertFalse(OutstandingToken.objects.filter(expires_at__lte=timezone.now()).exists())
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class RosterImportTests(TestCase):
+    ROSTER = (
+        'username,password,email,academic_year,learning_type,parent_email,parent_password\n'
+        'amal,pass1,amal@example.com,Prep 1,Visual,mother@example.com,secret\n'
+        'badr,pass2,,Prep 2,Auditory,mother@example.com,secret\n'
+        'carim,pass3,,Prep 9,Visual,,\n'
+        'amal,pass4,,Prep 1,Visual,,\n'
+        'dina,pass5,,Prep 1,Kinesthetic,existing@example.com,\n'
+        'taken,pass6,,Prep 1,Visual,,\n'
+    )
+
+    def test_import_creates_rows_and_reports_bad_ones(self):
+        User.objects.create_user(username='taken', password='x')
+        Parent.objects.create(email='existing@example.com', password='x')
+
+        with ThreadPoolExecutor(2) as executor:
+            report = RosterImport(executor, chunk_size=2).run(read_rows(io.BytesIO(self.ROSTER.encode()), 'csv'))
+
+        self.assertEqual(report['users_created'], 3)
+        self.assertEqual(report['parents_created'], 1)
+        self.assertEqual(
+            [(error['line'], error['username'], list(error['errors'])) for error in report['errors']],
+            [(4, 'carim', ['academic_year']), (5, 'amal', ['username']), (7, 'taken', ['username'])],
+        )
+        amal = User.objects.get(username='amal')
+        self.assertTrue(amal.check_password('pass1'))
+        self.assertEqual(amal.student_profile.parent.email, 'mother@example.com')
+        self.assertEqual(
+            StudentProfile.objects.get(user__username='badr').parent_id, amal.student_profile.parent_id
+        )
+        self.assertEqual(StudentProfile.objects.get(user__username='dina').parent.email, 'existing@example.com')
+
+    def test_usernames_and_emails_are_normalized_like_registration(self):
+        User.objects.create_user(username='elma', password='x')
+        roster = (
+            'username,password,email,academic_year,learning_type\n'
+            # Full-width letters, which normalise to the existing 'elma'
+            'ｅｌｍａ,pass1,,Prep 1,Visual\n'
+            'farid,pass2,Farid@EXAMPLE.Com,Prep 1,Visual\n'
+        )
+        with ThreadPoolExecutor(1) as executor:
+            report = RosterImport(executor).run(read_rows(io.BytesIO(roster.encode()), 'csv'))
+
+        self.assertEqual([(error['line'], list(error['errors'])) for error in report['errors']], [(2, ['username'])])
+        self.assertEqual(User.objects.get(username='farid').email, 'Farid@example.com')
+
+    def test_parent_is_created_by_whichever_row_succeeds(self):
+        def rows():
+            yield 2, {'username': 'amal', 'password': 'pass1', 'academic_year': 'Prep 1', 'learning_type': 'Visual',
+                      'parent_email': 'mother@example.com', 'parent_password': 'secret'}
+            yield 3, {'username': 'badr', 'password': 'pass2', 'academic_year': 'Prep 1', 'learning_type': 'Visual',
+                      'parent_email': 'mother@example.com'}
+            # Registered elsewhere while the chunk was being hashed
+            User.objects.create_user(username='amal', password='x')
+
+        with ThreadPoolExecutor(2) as executor:
+            report = RosterImport(executor, chunk_size=2).run(rows())
+
+        self.assertEqual([error['username'] for error in report['errors']], ['amal'])
+        parent = StudentProfile.objects.get(user__username='badr').parent
+        self.assertTrue(check_password('secret', parent.password))
+
+    def test_job_status_is_read_from_the_database(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_superuser(username='admin', password='x'))
+        roster_file = SimpleUploadedFile('roster.csv', self.ROSTER.encode())
+        response = client.post(reverse('roster-import'), {'file': roster_file}, format='multipart')
+        self.assertEqual(response.status_code, 202)
+        job = RosterImportJob.objects.get(pk=response.json()['id'])
+        self.assertEqual(client.get(response.json()['status_url']).json()['status'], 'running')
+
+        report = {'users_created': 3, 'parents_created': 1, 'errors': []}
+        with mock.patch.object(roster, 'import_roster', return_value=report), mock.patch.object(roster, 'connection'):
+            roster._run_job(job.id, tempfile.mkstemp()[1], 'csv')
+        self.assertEqual(
+            client.get(reverse('roster-import-status', kwargs={'job_id': job.id})).json(),
+            {'id': str(job.id), 'status': 'done', **report},
+        )
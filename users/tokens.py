@@ -0,0 +1,121 @@
+# users/tokens.py
+#
+# Student claims (academic_year, learning_type) carried in the JWTs, so the
+# content endpoints can authenticate a stateless TokenUser and scope their
+# queries without loading the User or StudentProfile rows.
+from django.core.cache import cache
+from rest_framework.exceptions import PermissionDenied
+from rest_framework_simplejwt.serializers import (
+    TokenBlacklistSerializer, TokenObtainPairSerializer, TokenRefreshSerializer
+)
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from utils.async_views import acache_call
+
+from .blacklist import IndexedBlacklistMixin
+from .models import StudentProfile
+
+STUDENT_CLAIMS = ('academic_year', 'learning_type')
+
+
+def load_student_claims(user_id):
+    profile = StudentProfile.objects.filter(user_id=user_id).values(*STUDENT_CLAIMS).first()
+    return profile or {}
+
+
+def set_student_claims(token, claims):
+    for claim in STUDENT_CLAIMS:
+        if claims.get(claim):
+            token[claim] = claims[claim]
+        elif claim in token:
+            del token[claim]
+
+
+class IndexedRefreshToken(IndexedBlacklistMixin, RefreshToken):
+    pass
+
+
+class StudentRefreshToken(IndexedRefreshToken):
+    """
+    A refresh token that carries the student claims. Access tokens copy
+    them when they are minted. A token parsed from a client (during
+    rotation) re-reads the profile, so every rotation picks up changes.
+    """
+
+    def __init__(self, token=None, verify=True):
+        super().__init__(token, verify)
+        if token is not None:
+            set_student_claims(self, load_student_claims(self[api_settings.USER_ID_CLAIM]))
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        set_student_claims(token, load_student_claims(user.pk))
+        return token
+
+
+class StudentTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = StudentRefreshToken
+
+
+class StudentTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = StudentRefreshToken
+
+
+class IndexedTokenBlacklistSerializer(TokenBlacklistSerializer):
+    token_class = IndexedRefreshToken
+
+
+# Profile changes made while an access token is still live are published
+# here, in the default cache, for as long as such a token can exist. Every
+# worker must share that cache (see CACHES in settings) to see them.
+def claims_override_key(user_id):
+    return f'student-claims:{user_id}'
+
+
+def publish_claims_override(user_id, claims):
+    timeout = api_settings.ACCESS_TOKEN_LIFETIME.total_seconds()
+    cache.set(claims_override_key(user_id), claims, timeout=timeout)
+
+
+def _claims_from_token(token):
+    if token is not None and all(claim in token for claim in STUDENT_CLAIMS):
+        return {claim: token[claim] for claim in STUDENT_CLAIMS}
+    return None
+
+
+def _remember_claims(request, claims):
+    if not claims:
+        raise PermissionDenied("A student profile is required.")
+    request._student_claims = claims
+    return claims
+
+
+def get_student_claims(request):
+    """
+    Claims for the authenticated student: a pending override first, then
+    the access token, and for tokens issued before the claims existed (or
+    a session-authenticated user) the profile row.
+    """
+    if hasattr(request, '_student_claims'):
+        return request._student_claims
+    user_id = request.user.pk
+    claims = cache.get(claims_override_key(user_id))
+    if claims is None:
+        claims = _claims_from_token(request.auth)
+    if claims is None:
+        claims = load_student_claims(user_id)
+    return _remember_claims(request, claims)
+
+
+async def aget_student_claims(request):
+    if hasattr(request, '_student_claims'):
+        return request._student_claims
+    user_id = request.user.pk
+    claims = await acache_call(cache, 'get', claims_override_key(user_id))
+    if claims is None:
+        claims = _claims_from_token(request.auth)
+    if claims is None:
+        claims = await StudentProfile.objects.filter(user_id=user_id).values(*STUDENT_CLAIMS).afirst() or {}
+    return _remember_claims(request, claims)
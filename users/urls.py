@@ -1,7 +1,8 @@
 from django.urls import path
 from .views import (
-    RegisterView, LoginView, LogoutView, UserDetailView,
-    ForgotPasswordView, ResetPasswordConfirmView, ChangePasswordView
+    RegisterView, LoginView, LogoutView, UserDetailView, AsyncUserDetailView,
+    ForgotPasswordView, ResetPasswordConfirmView, ChangePasswordView,
+    RosterImportView, RosterImportStatusView
 )
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView , TokenBlacklistView
 
@@ -10,10 +11,13 @@ urlpatterns = [
     path('login/', LoginView.as_view(), name='login'),
     path('logout/', LogoutView.as_view(), name='logout'),
     path('user/', UserDetailView.as_view(), name='user-detail'),
+    path('async/user/', AsyncUserDetailView.as_view(), name='async-user-detail'),
     path('forgot-password/', ForgotPasswordView.as_view(), name='forgot-password'),
     path('reset-password/<uidb64>/<token>/', ResetPasswordConfirmView.as_view(), name='reset-password-confirm'),
     path('change-password/', ChangePasswordView.as_view(), name='change-password'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('token/blacklist/', TokenBlacklistView.as_view(), name='token_blacklist'),  # For logging out
+    path('roster-import/', RosterImportView.as_view(), name='roster-import'),
+    path('roster-import/<uuid:job_id>/', RosterImportStatusView.as_view(), name='roster-import-status'),
 
 ]
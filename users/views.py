@@ -2,16 +2,21 @@ from django.contrib.auth.models import User
 from django.contrib.auth.tokens import default_token_generator
 from django.utils.encoding import force_bytes, force_str
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
-from django.core.mail import send_mail
 from django.template.loader import render_to_string
+from django.urls import reverse
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.permissions import IsAuthenticated, AllowAny
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from rest_framework_simplejwt.views import TokenObtainPairView
+from . import roster
 from .models import Parent, StudentProfile
 from .serializers import UserSerializer, RegisterSerializer, ChangePasswordSerializer
+from .tokens import IndexedRefreshToken
+from utils.async_views import AsyncAPIView
+from utils.email_utils import send_reset_password_email
 
 # Register View
 class RegisterView(APIView):
@@ -41,7 +46,7 @@ class LogoutView(APIView):
 
         try:
             # Create a RefreshToken object
-            token = RefreshToken(refresh_token)
+            token = IndexedRefreshToken(refresh_token)
             # Blacklist the token
             token.blacklist()
 
@@ -57,6 +62,17 @@ class UserDetailView(APIView):
         serializer = UserSerializer(request.user)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+# Async User Detail View: stateless token auth and one query for the user and profile
+class AsyncUserDetailView(AsyncAPIView):
+
+    async def respond(self, request):
+        user = await User.objects.select_related('student_profile').filter(
+            pk=request.user.pk, is_active=True
+        ).afirst()
+        if user is None:
+            raise AuthenticationFailed("User not found.")
+        return self.render(UserSerializer(user).data)
+
 # Forgot Password View
 class ForgotPasswordView(APIView):
     permission_classes = [AllowAny]
@@ -75,11 +91,11 @@ class ForgotPasswordView(APIView):
         uid = urlsafe_base64_encode(force_bytes(user.pk))
         token = default_token_generator.make_token(user)
 
-        # Send password reset email
+        # Queue the password reset email; the send_outbox worker delivers it
         reset_link = f"{request.build_absolute_uri('/users/reset-password/')}{uid}/{token}/"
         mail_subject = "Password Reset Request"
         message = render_to_string('reset_password_email.html', {'reset_link': reset_link, 'username': user.username})
-        send_mail(mail_subject, message, 'no-reply@example.com', [email])
+        send_reset_password_email(mail_subject, message, [email])
 
         return Response({"message": "Password reset email sent."}, status=status.HTTP_200_OK)
 
@@ -123,3 +139,28 @@ class ChangePasswordView(APIView):
             request.user.save()
             return Response({"message": "Password changed successfully."}, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+# Roster Import Views (staff only): the import runs in the background and
+# its report is polled from the status URL
+class RosterImportView(APIView):
+    permission_classes = [IsAdminUser]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        roster_file = request.FILES.get('file')
+        if not roster_file:
+            return Response({"error": "A CSV or JSONL roster file is required."}, status=status.HTTP_400_BAD_REQUEST)
+        job_id = roster.start_import_job(roster_file)
+        status_url = request.build_absolute_uri(reverse('roster-import-status', kwargs={'job_id': job_id}))
+        return Response({"id": str(job_id), "status_url": status_url}, status=status.HTTP_202_ACCEPTED)
+
+
+class RosterImportStatusView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, job_id):
+        job = roster.get_import_job(job_id)
+        if job is None:
+            return Response({"error": "Unknown import."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(job, status=status.HTTP_200_OK)
@@ -0,0 +1,60 @@
+# utils/async_views.py
+#
+# Base for native async read endpoints. DRF views are synchronous (under
+# ASGI each request is handed to a thread), so these are plain Django async
+# views that keep DRF's wire format: the same JWT authentication (stateless,
+# no database), APIException error bodies and JSONRenderer output.
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import HttpResponse
+from django.views import View
+from rest_framework import exceptions
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+
+from .timing import timed
+
+
+async def acache_call(cache, method, *args, **kwargs):
+    # Django's cache backends implement the async API as sync_to_async
+    # wrappers. For in-process backends there is no I/O to wait for, so the
+    # thread hop is pure overhead and the sync method is called directly.
+    if isinstance(cache, (LocMemCache, DummyCache)):
+        return getattr(cache, method)(*args, **kwargs)
+    return await getattr(cache, f'a{method}')(*args, **kwargs)
+
+
+class AsyncAPIView(View):
+    http_method_names = ['get', 'head', 'options']
+    authentication_class = JWTStatelessUserAuthentication
+
+    async def get(self, request, *args, **kwargs):
+        authentication = self.authentication_class()
+        try:
+            self.authenticate(request, authentication)
+            # DRF's Request wrapper gives paginators query_params
+            self.request = Request(request)
+            self.request.user, self.request.auth = request.user, request.auth
+            return await self.respond(self.request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+            response = self.render(data, status=exc.status_code)
+            if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+                response.status_code = 401
+                response['WWW-Authenticate'] = authentication.authenticate_header(request)
+            return response
+
+    def authenticate(self, request, authentication):
+        result = authentication.authenticate(request)
+        if result is None:
+            raise exceptions.NotAuthenticated()
+        request.user, request.auth = result
+
+    async def respond(self, request, *args, **kwargs):
+        raise NotImplementedError("AsyncAPIView subclasses must define respond()")
+
+    def render(self, data, status=200):
+        with timed('render'):
+            content = JSONRenderer().render(data)
+        return HttpResponse(content, content_type='application/json', status=status)
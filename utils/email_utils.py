@@ -1,13 +1,7 @@
 # utils/email_utils.py
 
-from django.core.mail import send_mail
-from django.conf import settings
+def send_reset_password_email(subject, message, recipient_list, html_message=''):
+    # Queued in the outbox; the send_outbox worker does the SMTP round trip
+    from users.outbox import enqueue_email
 
-def send_reset_password_email(subject, message, recipient_list):
-    send_mail(
-        subject,
-        message,
-        settings.DEFAULT_FROM_EMAIL,
-        recipient_list,
-        fail_silently=False,
-    )
+    return enqueue_email(subject, message, recipient_list, html_message=html_message)
@@ -0,0 +1,266 @@
+# utils/metrics.py
+#
+# Histograms and counters in the Prometheus text format, without the client
+# library. Each process keeps its own in memory. Under a pre-forking server
+# (gunicorn), set METRICS_DIR: every worker then writes its values there
+# every METRICS_WRITE_INTERVAL seconds and /metrics adds up all the files, so
+# a scrape sees the whole server whichever worker answers it. Files are named
+# by pid and start time, so a new worker given a dead one's pid can't
+# overwrite it. A scrape folds the files of workers that have exited into
+# compacted.json: the totals never go backwards and the directory doesn't
+# grow with every worker restart.
+import bisect
+import contextlib
+import glob
+import hmac
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.views import View
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+COMPACTED = 'compacted.json'
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def merge_snapshots(snapshots):
+    # Adds up {metric name: {label key: value}} snapshots
+    merged = {}
+    for snapshot in snapshots:
+        for name, values in snapshot.items():
+            totals = merged.setdefault(name, {})
+            for key, value in values.items():
+                total = totals.get(key)
+                totals[key] = value if total is None else [a + b for a, b in zip(total, value)]
+    return merged
+
+
+def _read_json(path):
+    try:
+        with open(path) as snapshot:
+            return json.load(snapshot)
+    except (OSError, ValueError):
+        return None  # removed or replaced while reading
+
+
+def _write_json(path, data):
+    fd, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'w') as output:
+        json.dump(data, output)
+    os.replace(temporary, path)
+
+
+def _pid_exited(path):
+    try:
+        pid = int(os.path.basename(path).split('-')[0].removesuffix('.json'))
+        os.kill(pid, 0)
+    except ValueError:
+        return False
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass  # alive, under another user
+    return False
+
+
+def _number(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def snapshot(self):
+        with self._lock:
+            return {json.dumps(key): list(value) for key, value in self.values.items()}
+
+    def header(self):
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            value = self.values.setdefault(labels, [0])
+            value[0] += amount
+
+    def expose(self, values):
+        lines = self.header()
+        for labels, (total,) in sorted(values.items()):
+            lines.append(f'{self.name}_total{_labels(self.label_names, labels)} {_number(total)}')
+        return lines
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels, buckets):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, labels, amount):
+        # Stored per bucket (not cumulative), then the sum and the count
+        index = bisect.bisect_left(self.buckets, amount)
+        with self._lock:
+            value = self.values.get(labels)
+            if value is None:
+                value = self.values[labels] = [0] * (len(self.buckets) + 3)
+            value[index] += 1
+            value[-2] += amount
+            value[-1] += 1
+
+    def expose(self, values):
+        lines = self.header()
+        for labels, value in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), value):
+                cumulative += count
+                lines.append(
+                    f'{self.name}_bucket{_labels(self.label_names, labels, [("le", _number(bound))])} {cumulative}'
+                )
+            lines.append(f'{self.name}_sum{_labels(self.label_names, labels)} {_number(value[-2])}')
+            lines.append(f'{self.name}_count{_labels(self.label_names, labels)} {value[-1]}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self._written_at = 0.0
+        self._write_lock = threading.Lock()
+        self._pid = self._started = None
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def snapshot(self):
+        return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+    def snapshot_path(self):
+        # Start time set per process: a forked worker doesn't inherit its parent's
+        pid = os.getpid()
+        if self._pid != pid:
+            self._pid, self._started = pid, time.time_ns()
+        return os.path.join(settings.METRICS_DIR, f'{pid}-{self._started}.json')
+
+    def write_snapshot(self):
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        _write_json(self.snapshot_path(), self.snapshot())
+
+    def maybe_write_snapshot(self):
+        # Called after every request; cheap unless a write is due
+        if not settings.METRICS_DIR or time.monotonic() - self._written_at < settings.METRICS_WRITE_INTERVAL:
+            return
+        if self._write_lock.acquire(blocking=False):
+            try:
+                self._written_at = time.monotonic()
+                self.write_snapshot()
+            finally:
+                self._write_lock.release()
+
+    @contextlib.contextmanager
+    def _directory_lock(self):
+        # Serializes scrapes across processes, so a compaction is never half
+        # seen. Only used with METRICS_DIR, under a POSIX pre-forking server.
+        import fcntl
+
+        with open(os.path.join(settings.METRICS_DIR, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def compact(self):
+        # Folds the snapshots of exited processes into compacted.json and
+        # returns its totals. It names the files it has absorbed, so a crash
+        # before they are removed can't count them twice.
+        compacted_path = os.path.join(settings.METRICS_DIR, COMPACTED)
+        compacted = _read_json(compacted_path) or {'sources': [], 'metrics': {}}
+        paths = {
+            os.path.basename(path): path for path in glob.glob(os.path.join(settings.METRICS_DIR, '*.json'))
+            if path != compacted_path
+        }
+        absorbed = set(compacted['sources'])
+        exited = {name for name, path in paths.items() if name not in absorbed and _pid_exited(path)}
+        if exited:
+            snapshots = [_read_json(paths[name]) for name in sorted(exited)]
+            compacted = {
+                # Absorbed files already removed are forgotten
+                'sources': sorted(exited | absorbed.intersection(paths)),
+                'metrics': merge_snapshots([compacted['metrics'], *filter(None, snapshots)]),
+            }
+            _write_json(compacted_path, compacted)
+        for name in absorbed.union(exited).intersection(paths):
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(paths[name])
+        return compacted['metrics']
+
+    def collect(self):
+        # {metric name: {label values: value}}, over every process sharing METRICS_DIR
+        if not settings.METRICS_DIR:
+            snapshots = [self.snapshot()]
+        else:
+            self.write_snapshot()
+            with self._directory_lock():
+                snapshots = [self.compact()]
+                compacted_path = os.path.join(settings.METRICS_DIR, COMPACTED)
+                for path in glob.glob(os.path.join(settings.METRICS_DIR, '*.json')):
+                    if path != compacted_path and (snapshot := _read_json(path)) is not None:
+                        snapshots.append(snapshot)
+        merged = {name: {} for name in self.metrics}
+        for name, values in merge_snapshots(snapshots).items():
+            if name in merged:
+                merged[name] = {tuple(json.loads(key)): value for key, value in values.items()}
+        return merged
+
+    def expose(self):
+        collected = self.collect()
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.extend(metric.expose(collected[name]))
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+# Prometheus scrape endpoint. With METRICS_TOKEN set, the scraper must send
+# it as a bearer token.
+class MetricsView(View):
+    http_method_names = ['get']
+
+    def get(self, request):
+        if settings.METRICS_TOKEN:
+            supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+            if not hmac.compare_digest(supplied.encode(), settings.METRICS_TOKEN.encode()):
+                return HttpResponseForbidden()
+        return HttpResponse(registry.expose(), content_type=CONTENT_TYPE)
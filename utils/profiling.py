@@ -0,0 +1,397 @@
+# utils/profiling.py
+#
+# On-demand profiling of live requests. An admin adds a rule through
+# /profiler/ (a URL name, a user, a sampled fraction of requests, or a mix)
+# and, for a limited time and number of captures, matching requests are run
+# under cProfile or a stack sampler with their SQL recorded. Each capture is
+# written to PROFILER_DIR, which is rotated to PROFILER_MAX_CAPTURES and
+# PROFILER_MAX_BYTES:
+#
+#   <name>.prof    cProfile stats (pstats, snakeviz, flameprof)
+#   <name>.folded  sampled stacks in the collapsed format (flamegraph.pl, speedscope)
+#   <name>.json    the request, its timing and every SQL statement run
+#
+# Rules live in the default cache. Each process re-reads them at most every
+# PROFILER_SYNC_SECONDS; while there are none, the middleware does nothing
+# but that check. With several worker processes the cache must be shared
+# (memcached, redis): a locmem cache only holds the rules POSTed to that
+# process. One cProfile capture runs at a time per process; requests that
+# match meanwhile are not captured. SQL is recorded on the request's thread,
+# so under ASGI queries that sync views run on a worker thread are not
+# included.
+import cProfile
+import glob
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, models
+from django.http import FileResponse, Http404
+from django.urls import Resolver404, resolve
+from django.utils import timezone
+from rest_framework import serializers, status
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+logger = logging.getLogger(__name__)
+
+RULES_KEY = 'profiler:rules'
+CAPTURE_SUFFIXES = ('.prof', '.folded', '.json')
+CAPTURE_NAME = re.compile(r'^[\w.-]+$')
+
+
+class ProfilerMode(models.TextChoices):
+    CPROFILE = 'cprofile', 'cProfile'
+    SAMPLE = 'sample', 'Stack sampling'
+
+
+# Held while a cProfile capture runs, in whichever thread
+cprofile_lock = threading.Lock()
+
+
+def captured_key(rule_id):
+    return f'profiler:captured:{rule_id}'
+
+
+# Rules
+
+def get_rules():
+    now = time.time()
+    return [rule for rule in cache.get(RULES_KEY, []) if rule['expires_at'] > now]
+
+
+def save_rules(rules):
+    timeout = max((rule['expires_at'] for rule in rules), default=time.time()) - time.time()
+    if rules:
+        cache.set(RULES_KEY, rules, timeout=max(int(timeout) + 1, 1))
+    else:
+        cache.delete(RULES_KEY)
+    profiler_switch.sync(force=True)
+
+
+class ProfilerSwitch:
+    def __init__(self):
+        self.rules = []
+        self._synced_at = None
+
+    def sync(self, force=False):
+        if force or self._synced_at is None or time.monotonic() - self._synced_at >= settings.PROFILER_SYNC_SECONDS:
+            self.rules = get_rules()
+            self._synced_at = time.monotonic()
+        return self.rules
+
+    def match(self, request):
+        # The rule this request should be captured under, if any
+        now = time.time()
+        for rule in self.rules:
+            if rule['expires_at'] <= now:
+                continue
+            if rule['url_name'] and rule['url_name'] != url_name_of(request):
+                continue
+            if rule['user_id'] is not None and rule['user_id'] != user_id_of(request):
+                continue
+            if random.random() >= rule['sample_rate']:
+                continue
+            if _count_capture(rule) > rule['max_captures']:
+                continue
+            return rule
+        return None
+
+
+profiler_switch = ProfilerSwitch()
+
+
+def _count_capture(rule):
+    try:
+        return cache.incr(captured_key(rule['id']))
+    except ValueError:
+        cache.add(captured_key(rule['id']), 0, timeout=max(int(rule['expires_at'] - time.time()), 1))
+        return cache.incr(captured_key(rule['id']))
+
+
+def url_name_of(request):
+    # Middleware runs before URL resolution
+    try:
+        return resolve(request.path_info).url_name
+    except Resolver404:
+        return None
+
+
+def user_id_of(request):
+    # JWT clients are only authenticated inside the view; read the token
+    try:
+        result = JWTStatelessUserAuthentication().authenticate(request)
+    except (InvalidToken, TokenError):
+        return None
+    return str(result[0].id) if result else None
+
+
+# Capturing
+
+def frame_name(frame):
+    code = frame.f_code
+    filename = os.path.relpath(code.co_filename, settings.BASE_DIR) if code.co_filename.startswith(
+        str(settings.BASE_DIR)
+    ) else os.path.basename(code.co_filename)
+    return f'{code.co_name} ({filename}:{code.co_firstlineno})'.replace(';', ':')
+
+
+class StackSampler:
+    """
+    Samples one thread's stack every PROFILER_SAMPLE_INTERVAL seconds and
+    counts each distinct stack, root first, in the collapsed format.
+    """
+
+    def __init__(self, thread_id):
+        self.thread_id = thread_id
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiler-sampler', daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(settings.PROFILER_SAMPLE_INTERVAL):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame_name(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def folded(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+class SQLRecorder:
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'alias': context['connection'].alias, 'sql': sql, 'many': many,
+                'ms': round((time.perf_counter() - started) * 1000, 3),
+            })
+
+
+class Capture:
+    def __init__(self, rule, request):
+        self.rule = rule
+        self.request = request
+        self.sql = SQLRecorder()
+        self.profile = cProfile.Profile() if rule['mode'] == ProfilerMode.CPROFILE else None
+        self.sampler = StackSampler(threading.get_ident()) if rule['mode'] == ProfilerMode.SAMPLE else None
+        self._stack = ExitStack()
+
+    def start(self):
+        if self.profile is not None:
+            # Only one cProfile profiler can be active: a second one would
+            # replace the first (3.11) or fail to enable (3.12+)
+            if not cprofile_lock.acquire(blocking=False):
+                return False
+            self._stack.callback(cprofile_lock.release)
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self.sql))
+        if self.sampler is not None:
+            self._stack.enter_context(self.sampler)
+        self.started = time.perf_counter()
+        if self.profile is not None:
+            self.profile.enable()
+            self._stack.callback(self.profile.disable)
+        return True
+
+    def stop(self):
+        self.seconds = time.perf_counter() - self.started
+        self._stack.close()
+
+    def save(self, response):
+        os.makedirs(settings.PROFILER_DIR, exist_ok=True)
+        url_name = url_name_of(self.request) or 'unmatched'
+        name = f"{timezone.now():%Y%m%dT%H%M%S.%f}-{url_name}-{uuid.uuid4().hex[:8]}"
+        path = os.path.join(settings.PROFILER_DIR, name)
+        if self.profile is not None:
+            self.profile.dump_stats(f'{path}.prof')
+        else:
+            with open(f'{path}.folded', 'w') as output:
+                output.write(self.sampler.folded())
+        with open(f'{path}.json', 'w') as output:
+            json.dump({
+                'rule': self.rule['id'], 'mode': self.rule['mode'],
+                'method': self.request.method, 'path': self.request.get_full_path(), 'url_name': url_name,
+                'user_id': user_id_of(self.request), 'status': response.status_code,
+                'ms': round(self.seconds * 1000, 3),
+                'sql_count': len(self.sql.queries),
+                'sql_ms': round(sum(query['ms'] for query in self.sql.queries), 3),
+                'sql': self.sql.queries,
+            }, output, indent=2)
+        rotate()
+        return name
+
+
+def list_captures():
+    # Newest first: [{name, files, bytes, modified}]
+    captures = {}
+    for path in glob.glob(os.path.join(settings.PROFILER_DIR, '*')):
+        stem, suffix = os.path.splitext(os.path.basename(path))
+        if suffix not in CAPTURE_SUFFIXES:
+            continue
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        capture = captures.setdefault(stem, {'name': stem, 'files': [], 'bytes': 0, 'modified': 0.0})
+        capture['files'].append(os.path.basename(path))
+        capture['bytes'] += stat.st_size
+        capture['modified'] = max(capture['modified'], stat.st_mtime)
+    return sorted(captures.values(), key=lambda capture: (capture['modified'], capture['name']), reverse=True)
+
+
+def rotate():
+    # Drop the oldest captures past the count and size bounds
+    kept, total = 0, 0
+    for capture in list_captures():
+        kept += 1
+        total += capture['bytes']
+        if kept > settings.PROFILER_MAX_CAPTURES or total > settings.PROFILER_MAX_BYTES:
+            for filename in capture['files']:
+                try:
+                    os.remove(os.path.join(settings.PROFILER_DIR, filename))
+                except FileNotFoundError:
+                    pass
+
+
+def start_capture(request):
+    # None unless the request is to be captured and capturing could start
+    rule = profiler_switch.match(request)
+    if rule is None:
+        return None
+    capture = Capture(rule, request)
+    try:
+        if capture.start():
+            return capture
+    except Exception:
+        logger.exception('Could not start profiling %s', request.path)
+    capture._stack.close()
+    return None
+
+
+def finish_capture(capture, response):
+    # Profiling never fails the request it was watching
+    try:
+        capture.save(response)
+    except Exception:
+        logger.exception('Could not save the profile of %s', capture.request.path)
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        capture = start_capture(request) if profiler_switch.sync() else None
+        if capture is None:
+            return self.get_response(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            capture.stop()
+        finish_capture(capture, response)
+        return response
+
+    async def __acall__(self, request):
+        capture = start_capture(request) if profiler_switch.sync() else None
+        if capture is None:
+            return await self.get_response(request)
+        # Profiles the event loop thread, and so anything else it runs meanwhile
+        try:
+            response = await self.get_response(request)
+        finally:
+            capture.stop()
+        finish_capture(capture, response)
+        return response
+
+
+# Admin API
+
+class ProfilerRuleSerializer(serializers.Serializer):
+    url_name = serializers.CharField(required=False, allow_null=True, default=None)
+    user_id = serializers.CharField(required=False, allow_null=True, default=None)
+    sample_rate = serializers.FloatField(min_value=0.0001, max_value=1.0, default=1.0)
+    mode = serializers.ChoiceField(choices=ProfilerMode.choices, default=ProfilerMode.CPROFILE)
+    duration = serializers.IntegerField(min_value=1, max_value=24 * 60 * 60, default=10 * 60)  # seconds
+    max_captures = serializers.IntegerField(min_value=1, max_value=10000, default=50)
+
+    def validate(self, data):
+        if not data['url_name'] and data['user_id'] is None and data['sample_rate'] == 1.0:
+            raise serializers.ValidationError(
+                "Give a url_name, a user_id or a sample_rate below 1; profiling every request is not allowed."
+            )
+        return data
+
+
+# Profiling rules: list them with recent captures (GET), add one (POST), stop all (DELETE)
+class ProfilerView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({"rules": get_rules(), "captures": list_captures()[:100]}, status=status.HTTP_200_OK)
+
+    def post(self, request):
+        serializer = ProfilerRuleSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = dict(serializer.validated_data)
+        rule = {
+            'id': uuid.uuid4().hex, 'expires_at': time.time() + data.pop('duration'), **data,
+        }
+        save_rules(get_rules() + [rule])
+        return Response(rule, status=status.HTTP_201_CREATED)
+
+    def delete(self, request):
+        save_rules([])
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+# Download one capture file
+class ProfilerCaptureView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, filename):
+        if not CAPTURE_NAME.match(filename) or os.path.splitext(filename)[1] not in CAPTURE_SUFFIXES:
+            raise Http404
+        path = os.path.join(settings.PROFILER_DIR, filename)
+        if not os.path.isfile(path):
+            raise Http404
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=filename)
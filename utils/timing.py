@@ -0,0 +1,176 @@
+# utils/timing.py
+#
+# Where a request's time went: SQL (queries and time), DRF serialization and
+# rendering, next to the total. ServerTimingMiddleware sends them to the
+# client in a Server-Timing header and records them per URL name in the
+# histograms /metrics serves.
+#
+# DRF has no hook around serializer.data or Response rendering, so
+# instrument_drf() wraps those two properties once, when the middleware is
+# loaded. Outside a request (management commands, workers) every hook finds
+# no timings and costs a context variable lookup.
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from .metrics import QUERY_BUCKETS, SECONDS_BUCKETS, Counter, Histogram, registry
+
+PHASES = ('serialize', 'render')
+
+current_timings = ContextVar('current_timings', default=None)
+
+LABELS = ('url_name', 'method')
+# Anything else is recorded as "other", so made-up methods can't add series
+METHODS = frozenset(('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'))
+requests_total = registry.register(Counter(
+    'http_requests', 'Requests by URL name, method and status', ('url_name', 'method', 'status'),
+))
+request_seconds = registry.register(Histogram(
+    'http_request_duration_seconds', 'Time to produce the response', LABELS, SECONDS_BUCKETS,
+))
+sql_seconds = registry.register(Histogram(
+    'http_request_sql_seconds', 'Time spent running SQL', LABELS, SECONDS_BUCKETS,
+))
+sql_queries = registry.register(Histogram(
+    'http_request_sql_queries', 'SQL queries run', LABELS, QUERY_BUCKETS,
+))
+phase_seconds = {
+    'serialize': registry.register(Histogram(
+        'http_request_serialize_seconds', 'Time spent in DRF serializer.data', LABELS, SECONDS_BUCKETS,
+    )),
+    'render': registry.register(Histogram(
+        'http_request_render_seconds', 'Time spent rendering the response body', LABELS, SECONDS_BUCKETS,
+    )),
+}
+
+
+class Timings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_queries = 0
+        self.sql_seconds = 0.0
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        # Phases being timed; nested calls are already inside the outer one
+        self.active = set()
+
+    def header(self, total):
+        entries = [
+            f'sql;dur={self.sql_seconds * 1000:.2f};desc="{self.sql_queries} queries"',
+            *(f'{phase};dur={self.seconds[phase] * 1000:.2f}' for phase in PHASES),
+            f'total;dur={total * 1000:.2f}',
+        ]
+        return ', '.join(entries)
+
+
+@contextmanager
+def timed(phase):
+    timings = current_timings.get()
+    if timings is None or phase in timings.active:
+        yield
+        return
+    timings.active.add(phase)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.seconds[phase] += time.perf_counter() - started
+        timings.active.discard(phase)
+
+
+def record_query(execute, sql, params, many, context):
+    timings = current_timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.sql_seconds += time.perf_counter() - started
+        timings.sql_queries += 1
+
+
+def install_query_recorder(connection):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+@receiver(connection_created)
+def record_queries_on_new_connection(sender, connection, **kwargs):
+    install_query_recorder(connection)
+
+
+def _timed_property(prop, phase):
+    def fget(self):
+        with timed(phase):
+            return prop.fget(self)
+    fget.timed = True
+    return property(fget)
+
+
+def instrument_drf():
+    for cls in (serializers.Serializer, serializers.ListSerializer):
+        if not getattr(cls.data.fget, 'timed', False):
+            cls.data = _timed_property(cls.data, 'serialize')
+    if not getattr(Response.rendered_content.fget, 'timed', False):
+        Response.rendered_content = _timed_property(Response.rendered_content, 'render')
+
+
+class ServerTimingMiddleware:
+    # Goes first in MIDDLEWARE, so the total covers the other middleware too
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        instrument_drf()
+        # Connections opened before this middleware was loaded
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        timings = Timings()
+        token = current_timings.set(timings)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        return self.finish(request, response, timings)
+
+    async def __acall__(self, request):
+        timings = Timings()
+        token = current_timings.set(timings)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        return self.finish(request, response, timings)
+
+    def finish(self, request, response, timings):
+        total = time.perf_counter() - timings.started
+        if settings.SERVER_TIMING_HEADER:
+            response['Server-Timing'] = timings.header(total)
+
+        match = request.resolver_match
+        method = request.method if request.method in METHODS else 'other'
+        labels = (match.url_name or match.view_name if match else '<unmatched>', method)
+        requests_total.inc((*labels, str(response.status_code)))
+        request_seconds.observe(labels, total)
+        sql_seconds.observe(labels, timings.sql_seconds)
+        sql_queries.observe(labels, timings.sql_queries)
+        for phase in PHASES:
+            phase_seconds[phase].observe(labels, timings.seconds[phase])
+        registry.maybe_write_snapshot()
+        return response